@@ -15,28 +15,82 @@ API:
   POST /api/bot/start       → Start auto-betting bot
   POST /api/bot/stop        → Stop auto-betting bot
   GET  /api/market/status   → Round info, strike price, pools, AI signal
-  GET  /api/price           → Get real BTC price
+  GET  /api/stream          → SSE push: market, round, price (+ bot events for ?player=)
+  GET  /api/history         → Player bet history (local chain index)
+  GET  /api/rounds          → Round results (local chain index)
+  GET  /api/vault/balance   → Player Vault402 balance (local chain index)
+  GET  /api/leaderboard     → Materialized ranking (?top=K or ?offset=&limit=)
+  GET  /metrics             → Prometheus scrape: RPC/price/AI/LLM/tx latency, HTTP routes
+  GET  /api/rpc/status      → RPC endpoint pool health (latency score, errors, cooldown)
+  GET  /api/traces          → Round transition traces (expiry → resolve → new round → bets mined), ?market=
+  GET  /api/price           → Price of ?asset= (btc, eth, sui) from the shared price cache
   POST /api/ai/predict      → Get ML model prediction
   GET  /api/ai/models       → List available AI models
   GET  /api/ai/status       → Workflow deployment status
 """
 
 import os
+from pathlib import Path
+from dotenv import load_dotenv, dotenv_values
+
+# SERVER_MODE=gevent serves the API from gevent's WSGI server. Sockets, threads
+# and sleeps must be patched before requests/web3/threading are imported.
+SERVER_MODE = os.getenv("SERVER_MODE") or dotenv_values(Path(__file__).parent / ".env").get("SERVER_MODE") or "dev"
+if SERVER_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
 import time
+_T0 = time.perf_counter()   # startup clock: imports below (web3 mostly) are the first phase
+import sys
+import copy
 import json
+import hmac
+import hashlib
+import queue
+import signal
+import socket
+import sqlite3
 import logging
+import math
+import itertools
+import collections
+import gc
+import weakref
 import threading
+import functools
 import traceback
+import importlib
 import numpy as np
 import requests
-from pathlib import Path
-from dotenv import load_dotenv
 
-import opengradient as og
 from web3 import Web3
+from web3.providers import JSONBaseProvider
+from web3.exceptions import BlockNotFound, TimeExhausted, TransactionNotFound
+from hexbytes import HexBytes
 from eth_account import Account
-from flask import Flask, request, jsonify
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    The OpenGradient SDK takes seconds to import and is only needed once the
+    AI oracle deploys or runs a workflow, so it stays off the startup path.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+og = _LazyModule("opengradient")
 
 # ──── Environment ────
 load_dotenv(Path(__file__).parent / ".env")
@@ -44,33 +98,126 @@ load_dotenv(Path(__file__).parent / ".env")
 PRIVATE_KEY       = os.getenv("PRIVATE_KEY", "")
 CONTRACT_ADDRESS  = os.getenv("CONTRACT_ADDRESS", "")
 VAULT_ADDRESS     = os.getenv("VAULT_ADDRESS", "")
-RPC_URL           = "https://ogevmdevnet.opengradient.ai"
-CHAIN_ID          = 10740
+RPC_URL           = os.getenv("RPC_URL", "https://ogevmdevnet.opengradient.ai")
+CHAIN_ID          = int(os.getenv("CHAIN_ID", "10740"))
+API_HOST          = os.getenv("API_HOST", "127.0.0.1")
 API_PORT          = int(os.getenv("API_PORT", "3402"))
+RPC_TIMEOUT_SEC   = float(os.getenv("RPC_TIMEOUT_SEC", "10"))
+
+# ──── RPC pool (RPC_URLS=url1,url2,...; RPC_URL alone keeps the single-node behaviour) ────
+RPC_URLS             = [u.strip() for u in os.getenv("RPC_URLS", RPC_URL).split(",") if u.strip()]
+RPC_POOL_SIZE        = int(os.getenv("RPC_POOL_SIZE", "20"))            # keep-alive connections per endpoint
+RPC_HEDGE_AFTER_MS   = float(os.getenv("RPC_HEDGE_AFTER_MS", "150"))    # duplicate a hedged read after this
+RPC_HEDGE_WINDOW_SEC = float(os.getenv("RPC_HEDGE_WINDOW_SEC", "10"))   # hedge resolver reads this close to round end
+PRICE_TICK_SEC    = float(os.getenv("PRICE_TICK_SEC", "2"))
+ROUND_TRACE_FILE  = os.getenv("ROUND_TRACE_FILE", str(Path(__file__).parent / "round_traces.jsonl"))
+TX_JOURNAL_FILE   = os.getenv("TX_JOURNAL_FILE", str(Path(__file__).parent / "tx_journal.jsonl"))
+AI_WORKFLOWS_FILE   = os.getenv("AI_WORKFLOWS_FILE", str(Path(__file__).parent / "workflows.json"))
+AI_PREDICTIONS_FILE = os.getenv("AI_PREDICTIONS_FILE", str(Path(__file__).parent / "ai_predictions.json"))
 DEFAULT_MODEL     = os.getenv("DEFAULT_MODEL", "gemini-2.5-flash")
+# Deposit wallet balances: refreshed per block for wallets read in the last BALANCE_ACTIVE_SEC
+BALANCE_CACHE_SEC  = float(os.getenv("BALANCE_CACHE_SEC", "30"))     # request path re-reads older entries itself
+BALANCE_POLL_SEC   = float(os.getenv("BALANCE_POLL_SEC", "2"))
+BALANCE_ACTIVE_SEC = float(os.getenv("BALANCE_ACTIVE_SEC", "900"))
+NICKNAME_CACHE_SEC = float(os.getenv("NICKNAME_CACHE_SEC", "300"))
+NICKNAME_CACHE_SIZE = int(os.getenv("NICKNAME_CACHE_SIZE", "10000"))
+
+# ──── LLM ensemble (Ask Oracle with model="ensemble") ────
+LLM_ENSEMBLE_MODELS       = [m.strip() for m in os.getenv(
+    "LLM_ENSEMBLE_MODELS", "gemini-2.5-flash,gpt-4-1,claude-sonnet").split(",") if m.strip()]
+LLM_ENSEMBLE_MODE         = os.getenv("LLM_ENSEMBLE_MODE", "vote")       # vote | first
+LLM_ENSEMBLE_DEADLINE_SEC = float(os.getenv("LLM_ENSEMBLE_DEADLINE_SEC", "8"))
+LLM_ENSEMBLE_WORKERS      = int(os.getenv("LLM_ENSEMBLE_WORKERS", "16"))
 
 OUSDC_ADDRESS = "0x48515A4b24f17cadcD6109a9D85a57ba55a619a6"
 
+# ──── Markets (one round engine per contract) ────
+# BTC keeps CONTRACT_ADDRESS / VAULT_ADDRESS; other assets read
+# <ASSET>_CONTRACT_ADDRESS / <ASSET>_VAULT_ADDRESS. <ASSET>_AI_MODEL picks the
+# AI_MODELS key its bots follow (default: first model for that asset).
+MARKET_ASSETS  = [a.strip().lower() for a in os.getenv("MARKETS", "btc").split(",") if a.strip()]
+DEFAULT_MARKET = os.getenv("DEFAULT_MARKET", MARKET_ASSETS[0] if MARKET_ASSETS else "btc").lower()
+BOT_BATCH_MAX_USERS = int(os.getenv("BOT_BATCH_MAX_USERS", "100"))   # players per placeBetBatch tx
+SETTLE_BACKLOG_ROUNDS = int(os.getenv("SETTLE_BACKLOG_ROUNDS", "288"))  # rounds settled after downtime, at most
+
+# ──── Gas / fees (keeper transactions) ────
+GAS_PRICE_TTL_SEC     = float(os.getenv("GAS_PRICE_TTL_SEC", "3"))       # fee market read at most this often
+GAS_URGENT_MULTIPLIER = float(os.getenv("GAS_URGENT_MULTIPLIER", "1.2"))  # tip / gas price factor for round txs
+GAS_MIN_TIP_GWEI      = float(os.getenv("GAS_MIN_TIP_GWEI", "0.01"))
+GAS_MAX_FEE_GWEI      = float(os.getenv("GAS_MAX_FEE_GWEI", "0"))         # 0 = no cap
+GAS_LIMIT_HEADROOM    = float(os.getenv("GAS_LIMIT_HEADROOM", "1.3"))     # learned limit = fit x headroom
+GAS_REPLACE_AFTER_SEC = float(os.getenv("GAS_REPLACE_AFTER_SEC", "6"))    # round txs pending this long get bumped
+GAS_REPLACE_BUMP      = float(os.getenv("GAS_REPLACE_BUMP", "1.15"))
+GAS_MAX_REPLACEMENTS  = int(os.getenv("GAS_MAX_REPLACEMENTS", "3"))
+ROLLOVER_PREP_SEC     = float(os.getenv("ROLLOVER_PREP_SEC", "10"))       # pre-sign rollover txs this close to round end
+ROLLOVER_VARIANTS     = int(os.getenv("ROLLOVER_VARIANTS", "3"))          # signed prices kept per round
+ROLLOVER_BET_MARGIN   = int(os.getenv("ROLLOVER_BET_MARGIN", "5"))        # late bets the resolve gas limit leaves room for
+
+# ──── AI workflow lifecycle (OpenGradient scheduled workflows) ────
+WORKFLOW_TTL_HOURS          = float(os.getenv("WORKFLOW_TTL_HOURS", "24"))           # scheduler duration per deploy
+WORKFLOW_RENEW_BEFORE_SEC   = float(os.getenv("WORKFLOW_RENEW_BEFORE_SEC", "3600"))  # redeploy this long before expiry
+WORKFLOW_DEPLOY_CONCURRENCY = int(os.getenv("WORKFLOW_DEPLOY_CONCURRENCY", "4"))
+WORKFLOW_VERIFY_TIMEOUT_SEC = float(os.getenv("WORKFLOW_VERIFY_TIMEOUT_SEC", "600"))  # new workflow must answer within
+WORKFLOW_CHECK_SEC          = float(os.getenv("WORKFLOW_CHECK_SEC", "60"))
+
+# ──── Production server (SERVER_MODE=gevent) ────
+REQUEST_TIMEOUT_SEC = float(os.getenv("REQUEST_TIMEOUT_SEC", "15"))
+SHUTDOWN_GRACE_SEC  = float(os.getenv("SHUTDOWN_GRACE_SEC", "20"))
+
+# ──── Admission control (expensive endpoints) ────
+ADMISSION_ENABLED         = os.getenv("ADMISSION_ENABLED", "1") != "0"
+ADMISSION_QUEUE_WAIT_SEC  = float(os.getenv("ADMISSION_QUEUE_WAIT_SEC", "5"))    # longest wait for a worker slot
+ADMISSION_PRIORITY_LEAD_SEC = float(os.getenv("ADMISSION_PRIORITY_LEAD_SEC", "10"))  # keeper priority before round end
+ADMISSION_PRIORITY_MAX_SEC  = float(os.getenv("ADMISSION_PRIORITY_MAX_SEC", "60"))   # ... and at most this long after
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))   # reverse proxies in front (nginx: 1); client IP from X-Forwarded-For
+
+# ──── Profiling (admin endpoints need ADMIN_TOKEN) ────
+ADMIN_TOKEN     = os.getenv("ADMIN_TOKEN", "")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))   # capture stacks of requests slower than this (0 = off)
+SLOW_ROUND_MS   = float(os.getenv("SLOW_ROUND_MS", "3000"))     # ... and of round phases (resolver tick, resolve, bets)
+SLOW_SAMPLE_MS  = float(os.getenv("SLOW_SAMPLE_MS", "20"))      # sampling interval once an operation is slow
+SLOW_CAPTURES   = int(os.getenv("SLOW_CAPTURES", "50"))         # slow captures kept in memory
+
+# ──── Process role (split API workers / elected keeper) ────
+# all:    one process serves HTTP and runs the keeper (default)
+# api:    serves HTTP only; state comes from SHARED_STATE_DB
+# keeper: serves HTTP and runs the keeper while it holds the lease
+ROLE             = os.getenv("ROLE", "all")
+SHARED_STATE_DB  = os.getenv("SHARED_STATE_DB", str(Path(__file__).parent / "shared_state.db"))
+SHARED_POLL_SEC  = float(os.getenv("SHARED_POLL_SEC", "0.25"))
+KEEPER_LEASE_SEC = float(os.getenv("KEEPER_LEASE_SEC", "15"))
+NODE_ID          = f"{socket.gethostname()}:{os.getpid()}"
+if ROLE not in ("all", "api", "keeper"):
+    raise SystemExit(f"ROLE must be all, api or keeper (got {ROLE!r})")
+
+# ──── Chain indexer ────
+INDEXER_DB              = os.getenv("INDEXER_DB", str(Path(__file__).parent / "indexer.db"))
+INDEXER_CONFIRMATIONS   = int(os.getenv("INDEXER_CONFIRMATIONS", "2"))
+INDEXER_START_BLOCK     = os.getenv("INDEXER_START_BLOCK")          # default: contract deployment block
+INDEXER_BACKFILL_BLOCKS = int(os.getenv("INDEXER_BACKFILL_BLOCKS", "20000"))  # ... if that can't be found
+INDEXER_POLL_SEC        = float(os.getenv("INDEXER_POLL_SEC", "2"))
+
 PRICE_URLS_BINANCE = {
     "btc": "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT",
     "eth": "https://api.binance.com/api/v3/ticker/price?symbol=ETHUSDT",
     "sui": "https://api.binance.com/api/v3/ticker/price?symbol=SUIUSDT",
 }
 
+# name → og.TEE_LLM member (resolved when a completion is requested)
 AVAILABLE_MODELS = {
     # OpenAI
-    "gpt-4o":            og.TEE_LLM.GPT_4O,
-    "gpt-4-1":           og.TEE_LLM.GPT_4_1_2025_04_14,
-    "o4-mini":           og.TEE_LLM.O4_MINI,
+    "gpt-4o":            "GPT_4O",
+    "gpt-4-1":           "GPT_4_1_2025_04_14",
+    "o4-mini":           "O4_MINI",
     # Anthropic
-    "claude-sonnet":     og.TEE_LLM.CLAUDE_4_0_SONNET,
-    "claude-haiku":      og.TEE_LLM.CLAUDE_3_5_HAIKU,
+    "claude-sonnet":     "CLAUDE_4_0_SONNET",
+    "claude-haiku":      "CLAUDE_3_5_HAIKU",
     # Google
-    "gemini-2.5-flash":  og.TEE_LLM.GEMINI_2_5_FLASH,
-    "gemini-2.5-pro":    og.TEE_LLM.GEMINI_2_5_PRO,
+    "gemini-2.5-flash":  "GEMINI_2_5_FLASH",
+    "gemini-2.5-pro":    "GEMINI_2_5_PRO",
     # xAI
-    "grok-3":            og.TEE_LLM.GROK_3_BETA,
-    "grok-4-1":          og.TEE_LLM.GROK_4_1_FAST,
+    "grok-3":            "GROK_3_BETA",
+    "grok-4-1":          "GROK_4_1_FAST",
 }
 
 AI_MODELS = {
@@ -84,7 +231,7 @@ AI_MODELS = {
         "candle_duration": 60,
         "total_candles": 24,
         "input_tensor": "input",
-        "candle_types": [og.CandleType.CLOSE, og.CandleType.HIGH, og.CandleType.LOW, og.CandleType.OPEN, og.CandleType.VOLUME],
+        "candle_types": ["CLOSE", "HIGH", "LOW", "OPEN", "VOLUME"],   # og.CandleType members
         "scheduler_frequency": 300,
     },
 }
@@ -112,17 +259,706 @@ PREDICT_ABI = [
     {"inputs": [], "name": "totalPool", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [{"name": "", "type": "address"}], "name": "nicknames", "outputs": [{"name": "", "type": "string"}], "stateMutability": "view", "type": "function"},
     {"inputs": [{"name": "_roundId", "type": "uint256"}], "name": "getRoundInfo", "outputs": [{"components": [{"name": "startTime", "type": "uint256"}, {"name": "endTime", "type": "uint256"}, {"name": "strikePrice", "type": "uint256"}, {"name": "closingPrice", "type": "uint256"}, {"name": "upPool", "type": "uint256"}, {"name": "downPool", "type": "uint256"}, {"name": "totalPool", "type": "uint256"}, {"name": "upShares", "type": "uint256"}, {"name": "downShares", "type": "uint256"}, {"name": "totalBets", "type": "uint256"}, {"name": "resolved", "type": "bool"}, {"name": "upWon", "type": "bool"}, {"name": "proofHash", "type": "string"}], "name": "", "type": "tuple"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "_roundId", "type": "uint256"}], "name": "getBets", "outputs": [{"components": [{"name": "player", "type": "address"}, {"name": "isUp", "type": "bool"}, {"name": "amount", "type": "uint256"}, {"name": "shares", "type": "uint256"}, {"name": "nickname", "type": "string"}, {"name": "usedAiPrediction", "type": "bool"}, {"name": "fromVault", "type": "bool"}], "name": "", "type": "tuple[]"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "distributeDevFee", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
     {"inputs": [], "name": "accruedFees", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "timeUntilNextDevFee", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    # Events
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "player", "type": "address"}, {"indexed": True, "name": "roundId", "type": "uint256"}, {"indexed": False, "name": "isUp", "type": "bool"}, {"indexed": False, "name": "amount", "type": "uint256"}, {"indexed": False, "name": "nickname", "type": "string"}, {"indexed": False, "name": "usedAi", "type": "bool"}], "name": "BetPlaced", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "roundId", "type": "uint256"}, {"indexed": False, "name": "strikePrice", "type": "uint256"}, {"indexed": False, "name": "startTime", "type": "uint256"}, {"indexed": False, "name": "endTime", "type": "uint256"}], "name": "RoundStarted", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "roundId", "type": "uint256"}, {"indexed": False, "name": "upWon", "type": "bool"}, {"indexed": False, "name": "closingPrice", "type": "uint256"}, {"indexed": False, "name": "upPool", "type": "uint256"}, {"indexed": False, "name": "downPool", "type": "uint256"}, {"indexed": False, "name": "totalPool", "type": "uint256"}], "name": "RoundResolved", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "player", "type": "address"}, {"indexed": False, "name": "amount", "type": "uint256"}], "name": "Payout", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "player", "type": "address"}, {"indexed": False, "name": "nickname", "type": "string"}], "name": "NicknameRegistered", "type": "event"},
 ]
 
 VAULT_ABI = [
     {"inputs": [{"name": "_users", "type": "address[]"}, {"name": "_amounts", "type": "uint256[]"}, {"name": "_isUp", "type": "bool"}], "name": "placeBetBatch", "outputs": [], "stateMutability": "nonpayable", "type": "function"},
     {"inputs": [{"name": "_user", "type": "address"}], "name": "getBalance", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "deposit", "outputs": [], "stateMutability": "payable", "type": "function"},
+    # Events
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "user", "type": "address"}, {"indexed": False, "name": "amount", "type": "uint256"}], "name": "Deposited", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "user", "type": "address"}, {"indexed": False, "name": "amount", "type": "uint256"}], "name": "Withdrawn", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "user", "type": "address"}, {"indexed": False, "name": "isUp", "type": "bool"}, {"indexed": False, "name": "amount", "type": "uint256"}, {"indexed": False, "name": "gasFee", "type": "uint256"}], "name": "BetPlacedFor", "type": "event"},
+    {"anonymous": False, "inputs": [{"indexed": True, "name": "user", "type": "address"}, {"indexed": False, "name": "amount", "type": "uint256"}], "name": "WinningsReceived", "type": "event"},
 ]
 
+def _signed_eth(wei: int) -> float:
+    """from_wei for PnL-style values that can be negative."""
+    eth = float(Web3.from_wei(abs(wei), 'ether'))
+    return eth if wei >= 0 else -eth
+
+# ═══════════════════════════════════════════════════
+#  Metrics (counters + latency histograms, Prometheus text format)
+# ═══════════════════════════════════════════════════
+
+class Metrics:
+    """Process-local counters and histograms, rendered for a Prometheus scrape.
+
+    Series are keyed by (name, sorted labels). Histograms use fixed buckets
+    tuned for network calls (5 ms … 60 s) unless set_buckets() overrides
+    them for a metric.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self._counters: dict[tuple, float] = {}
+        self._hists: dict[tuple, list] = {}   # key → [bucket counts..., sum, count]
+        self._help: dict[str, str] = {}
+        self._buckets: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def set_buckets(self, name: str, bounds: tuple):
+        """Use `bounds` instead of BUCKETS for histogram `name` (call before its first observation)."""
+        self._buckets[name] = tuple(bounds)
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            buckets = self._buckets.get(name, self.BUCKETS)
+            h = self._hists.get(key)
+            if h is None:
+                h = self._hists[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def count(self, name: str, by: str | None = None, **labels):
+        """Counter value, or histogram observation count, summed over series matching `labels`.
+
+        With by="<label>" returns {label value: count} instead of a single total.
+        """
+        want = {k: str(v) for k, v in labels.items()}
+        totals = collections.defaultdict(float)
+        with self._lock:
+            for (n, lbls), value in itertools.chain(self._counters.items(), self._hists.items()):
+                lbls = dict(lbls)
+                if n == name and all(lbls.get(k) == v for k, v in want.items()):
+                    totals[lbls.get(by, "") if by else ""] += value[-1] if isinstance(value, list) else value
+        return dict(totals) if by else totals[""]
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block; adds outcome="ok"|"error" to the labels."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+    def timed(self, name: str, **labels):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+        items = labels + extra
+        if not items:
+            return ""
+        esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            hists = sorted((k, list(v)) for k, v in self._hists.items())
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._fmt_labels(labels)} {value:g}")
+        for (name, labels), h in hists:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(self._buckets.get(name, self.BUCKETS), h):
+                lines.append(f"{name}_bucket{self._fmt_labels(labels, (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{name}_bucket{self._fmt_labels(labels, (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{name}_sum{self._fmt_labels(labels)} {h[-2]:.6f}")
+            lines.append(f"{name}_count{self._fmt_labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class StartupTimer:
+    """Startup phase breakdown: mark() closes the phase running since the previous mark.
+
+    Sequential phases and background warmup tasks (which overlap) are kept
+    apart; both are exported as `startup_phase_seconds{phase}` and the
+    report is logged once the API port is open.
+    """
+
+    def __init__(self, t0: float):
+        self.t0 = self._last = t0
+        self.phases: list[tuple[str, float]] = []
+        self.tasks: list[tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        metrics.observe("startup_phase_seconds", now - self._last, phase=phase)
+        self._last = now
+
+    def task(self, name: str, seconds: float):
+        self.tasks.append((name, seconds))
+        metrics.observe("startup_phase_seconds", seconds, phase=f"warm:{name}")
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def report(self) -> str:
+        return " | ".join(f"{name} {sec * 1000:.0f}ms" for name, sec in self.phases)
+
+startup = StartupTimer(_T0)
+startup.mark("imports")
+
+# ═══════════════════════════════════════════════════
+#  Profiler (sampled stacks: on demand + slow-path capture)
+# ═══════════════════════════════════════════════════
+
+def _folded_stack(frame) -> str:
+    """Root-first "func (file:line);..." of a frame, one line of the folded (flamegraph) format."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+# The profiler samples from real OS threads with real locks and sleeps: under
+# gevent a greenlet sampler would only run once the greenlet it watches yields.
+if SERVER_MODE == "gevent":
+    import greenlet
+    _native_get_ident, _native_lock, _native_start = monkey.get_original(
+        "_thread", ["get_ident", "allocate_lock", "start_new_thread"])
+    _native_sleep = monkey.get_original("time", "sleep")
+else:
+    import _thread
+    _native_get_ident, _native_lock, _native_start = _thread.get_ident, _thread.allocate_lock, _thread.start_new_thread
+    _native_sleep = time.sleep
+
+
+class Profiler:
+    """Stack sampling of the live process via sys._current_frames().
+
+    profile() samples every OS thread for a while and returns folded stacks
+    ("thread;frame;frame count" lines) for flamegraph.pl / speedscope. Only
+    the sampler thread runs meanwhile, so the overhead is one stack walk
+    per thread per interval.
+
+    watch() marks an operation (request, round phase) running on the
+    current thread. A watchdog starts sampling that thread once the
+    operation exceeds its threshold, and when a slow operation ends its
+    stacks are kept in `captures` (newest last).
+
+    With greenlets=True (SERVER_MODE=gevent) the sampler and the watchdog
+    are native threads, profile() also folds every suspended greenlet's
+    stack (gr_frame; the set is read from gc once per profile, then kept
+    up to date from greenlet switches) and
+    watch() follows the calling greenlet: its gr_frame while it waits, the
+    OS thread's frame while it runs. Profiler errors are logged and never
+    reach the watched code.
+    """
+
+    def __init__(self, greenlets: bool = False):
+        self.greenlets = greenlets
+        self.captures: collections.deque = collections.deque(maxlen=SLOW_CAPTURES)
+        self._watched: dict[int, dict] = {}   # op id → {label, thread, greenlet, start, threshold, stacks}
+        self._ids = itertools.count(1)
+        self._lock = _native_lock()           # shared with the native watchdog: ops and their stacks
+        self._session = _native_lock()
+        self._watchdog = False
+        self._greenlets: dict[int, weakref.ref] = {}   # id → greenlet, while a profile runs
+
+    def _track_greenlets(self):
+        """Collect the live greenlets (one gc walk), then add each one switched to; returns the previous tracer.
+
+        Call from the hub's thread: greenlet.settrace is per thread.
+        """
+        self._greenlets = {id(o): weakref.ref(o) for o in gc.get_objects() if isinstance(o, greenlet.greenlet)}
+        previous = None
+
+        def trace(event, args):
+            if event in ("switch", "throw"):
+                target = args[1]
+                ref = self._greenlets.get(id(target))
+                if ref is None or ref() is not target:
+                    self._greenlets[id(target)] = weakref.ref(target)
+            if previous is not None:
+                previous(event, args)
+
+        previous = greenlet.settrace(trace)
+        return previous
+
+    def _greenlet_list(self) -> list:
+        return [glet for ref in list(self._greenlets.values()) if (glet := ref()) is not None]
+
+    def _stacks(self, skip: set[int]) -> list[tuple[str, object]]:
+        """(name, frame) of every OS thread and, with greenlets, every suspended greenlet not in `skip`."""
+        # threading._active, not enumerate(): under gevent its lock is a greenlet lock
+        names = {t.ident: t.name for t in list(threading._active.values())}
+        stacks = [(names.get(ident, f"thread-{ident}"), frame)
+                  for ident, frame in sys._current_frames().items() if ident not in skip]
+        if self.greenlets:
+            for glet in self._greenlet_list():
+                frame = glet.gr_frame
+                if frame is not None and id(glet) not in skip:
+                    stacks.append((names.get(id(glet)) or getattr(glet, "name", None) or f"greenlet-{id(glet)}",
+                                   frame))
+        return stacks
+
+    def _sample(self, seconds: float, interval: float, thread_filter: str, skip: set[int]) -> tuple[str, int]:
+        skip = skip | {_native_get_ident()}
+        stacks: collections.Counter = collections.Counter()
+        samples = 0
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            for name, frame in self._stacks(skip):
+                if thread_filter in name:
+                    stacks[f"{name};{_folded_stack(frame)}"] += 1
+            samples += 1
+            _native_sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()), samples
+
+    def profile(self, seconds: float, interval: float = 0.01, thread_filter: str = "") -> tuple[str, int]:
+        """Sample all threads (names containing `thread_filter`) for `seconds`; returns (folded text, samples).
+
+        Raises RuntimeError if another profile is running.
+        """
+        if not self._session.acquire(False):
+            raise RuntimeError("A profile is already running")
+        try:
+            if self.greenlets:
+                import gevent
+                previous = self._track_greenlets()
+                try:
+                    # The calling greenlet waits cooperatively while a pool thread samples
+                    folded, samples = gevent.get_hub().threadpool.apply(
+                        self._sample, (seconds, interval, thread_filter, {id(greenlet.getcurrent())}))
+                finally:
+                    greenlet.settrace(previous)
+                    self._greenlets = {}
+            else:
+                folded, samples = self._sample(seconds, interval, thread_filter, set())
+            metrics.inc("profiler_samples_total", samples)
+            return folded, samples
+        finally:
+            self._session.release()
+
+    @contextmanager
+    def watch(self, label: str, threshold_ms: float):
+        """Capture stacks of this block if it runs longer than `threshold_ms` (0 = don't watch)."""
+        if threshold_ms <= 0:
+            yield
+            return
+        op = None
+        try:
+            op = {"id": next(self._ids), "label": label, "thread": _native_get_ident(),
+                  "greenlet": greenlet.getcurrent() if self.greenlets else None, "start": time.perf_counter(),
+                  "threshold": threshold_ms / 1000, "stacks": collections.Counter()}
+            with self._lock:
+                self._watched[op["id"]] = op
+                if not self._watchdog:
+                    _native_start(self._watch_loop, ())
+                    self._watchdog = True
+        except Exception as e:
+            log.warning(f"[PROFILE] Not watching {label}: {e}")
+            op = None
+        try:
+            yield
+        finally:
+            if op is not None:
+                try:
+                    with self._lock:
+                        self._watched.pop(op["id"], None)
+                        stacks = dict(op["stacks"])
+                    elapsed = time.perf_counter() - op["start"]
+                    if elapsed >= op["threshold"]:
+                        self._capture(op, elapsed, stacks)
+                except Exception as e:
+                    log.warning(f"[PROFILE] Capture of {label} failed: {e}")
+
+    def _capture(self, op: dict, elapsed: float, stacks: dict):
+        top = max(stacks.items(), key=lambda item: item[1], default=None)
+        self.captures.append({
+            "id": op["id"], "label": op["label"], "at": time.time(), "duration_ms": round(elapsed * 1000),
+            "threshold_ms": round(op["threshold"] * 1000), "thread": threading.current_thread().name,
+            "samples": sum(stacks.values()), "stacks": stacks,
+        })
+        metrics.inc("slow_captures_total", kind=op["label"].split(" ", 1)[0].split(":", 1)[0])
+        hot = top[0].rsplit(";", 1)[-1] if top else "no samples"
+        log.warning(f"[PROFILE] Slow {op['label']}: {elapsed * 1000:.0f}ms (> {op['threshold'] * 1000:.0f}ms), "
+                    f"hottest frame: {hot}")
+
+    @staticmethod
+    def _op_frame(op: dict, frames: dict):
+        # A greenlet's gr_frame is None while it runs: then its stack is its OS thread's
+        glet = op["greenlet"]
+        frame = glet.gr_frame if glet is not None else None
+        return frame if frame is not None else frames.get(op["thread"])
+
+    def _watch_loop(self):
+        """Native thread: sample every watched op past its threshold each SLOW_SAMPLE_MS."""
+        interval = SLOW_SAMPLE_MS / 1000
+        while True:
+            _native_sleep(interval)
+            try:
+                now = time.perf_counter()
+                with self._lock:
+                    slow = [op for op in self._watched.values() if now - op["start"] >= op["threshold"]]
+                if not slow:
+                    continue
+                frames = sys._current_frames()
+                sampled = [(op, _folded_stack(frame)) for op in slow
+                           if (frame := self._op_frame(op, frames)) is not None]
+                with self._lock:
+                    for op, stack in sampled:
+                        op["stacks"][stack] += 1
+            except Exception:
+                pass   # sampling is best effort; the watchdog must outlive any one bad frame
+
+    def slow(self, limit: int = 20) -> list[dict]:
+        return list(self.captures)[-limit:]
+
+profiler = Profiler(greenlets=SERVER_MODE == "gevent")
+
+# The resolver sleeps 1s per tick, so its period needs resolution just above 1s
+metrics.set_buckets("resolver_loop_period_seconds",
+                    (1.0, 1.05, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0))
+# Workflow renewal = deploy + waiting for the first scheduled result: minutes
+metrics.set_buckets("ai_workflow_renewal_seconds", (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0))
+# One vectorized pass over all bots of a market: sub-millisecond to a few ms
+metrics.set_buckets("bot_decision_seconds", (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1))
+# Round expiry → rollover tx handed to the RPC pool: target well under 50ms
+metrics.set_buckets("tx_broadcast_lag_seconds", (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.5, 5.0))
+
+# 4-byte selector → contract function name, so eth_call latency is broken down per view
+_SELECTOR_NAMES = {
+    Web3.to_hex(Web3.keccak(text=f"{f['name']}({','.join(i['type'] for i in f['inputs'])})"))[:10]: f["name"]
+    for f in PREDICT_ABI + VAULT_ABI + ERC20_ABI if f.get("type") == "function"
+}
+
+class InstrumentedHTTPProvider(Web3.HTTPProvider):
+    """HTTPProvider that records every JSON-RPC round trip in `rpc_request_seconds`."""
+
+    def make_request(self, method, params):
+        fn = ""
+        if method in ("eth_call", "eth_estimateGas") and params and isinstance(params[0], dict):
+            data = params[0].get("data") or params[0].get("input") or ""
+            data = data if isinstance(data, str) else Web3.to_hex(data)
+            fn = _SELECTOR_NAMES.get(data[:10], data[:10])
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = super().make_request(method, params)
+            outcome = "rpc_error" if isinstance(response, dict) and response.get("error") else "ok"
+            return response
+        finally:
+            metrics.observe("rpc_request_seconds", time.perf_counter() - start,
+                            method=method, fn=fn, outcome=outcome, endpoint=urlparse(str(self.endpoint_uri)).netloc)
+
+    def make_batch_request(self, batch_requests):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = super().make_batch_request(batch_requests)
+            outcome = "ok" if isinstance(response, list) else "rpc_error"   # a rejected batch is one error object
+            return response
+        finally:
+            metrics.observe("rpc_request_seconds", time.perf_counter() - start,
+                            method="batch", fn="", outcome=outcome, endpoint=urlparse(str(self.endpoint_uri)).netloc)
+
+# ═══════════════════════════════════════════════════
+#  RPC Endpoint Pool (scoring, failover, hedged reads)
+# ═══════════════════════════════════════════════════
+
+class RPCEndpoint:
+    """One RPC URL: its provider (own keep-alive session) and health score."""
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, url: str, pool_size: int, retry: bool):
+        self.url = url
+        self.name = urlparse(url).netloc or url      # never expose the path (API keys live there)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        kwargs = {} if retry else {"exception_retry_configuration": None}
+        self.provider = InstrumentedHTTPProvider(url, request_kwargs={"timeout": RPC_TIMEOUT_SEC},
+                                                 session=session, **kwargs)
+        self.latency = 0.1          # EWMA seconds, optimistic start
+        self.errors = 0             # consecutive transport errors
+        self.down_until = 0.0
+
+    @property
+    def score(self) -> float:
+        return self.latency * (1 + self.errors)
+
+    def ok(self, seconds: float):
+        self.latency += self.EWMA_ALPHA * (seconds - self.latency)
+        self.errors = 0
+        self.down_until = 0.0
+
+    def failed(self):
+        self.errors += 1
+        self.down_until = time.monotonic() + min(30.0, 2.0 ** self.errors)
+
+    def status(self) -> dict:
+        return {"endpoint": self.name, "latency_ms": round(self.latency * 1000, 1), "errors": self.errors,
+                "down_for_sec": round(max(0.0, self.down_until - time.monotonic()), 1)}
+
+
+class RPCPool(JSONBaseProvider):
+    """JSON-RPC provider over several endpoints (RPC_URLS).
+
+    - Reads go to the best healthy endpoint (EWMA latency, scaled by recent
+      errors) and fail over to the next one on transport errors. A failing
+      endpoint sits out an exponential cooldown (capped at 30s). JSON-RPC
+      error replies (reverts etc.) are answers, not endpoint failures.
+    - Inside `with rpc_pool.hedged():` a read still pending after
+      RPC_HEDGE_AFTER_MS is duplicated to the next-best endpoint and the
+      first good answer wins; the straggler finishes in the background and
+      still feeds the scores.
+    - eth_sendRawTransaction goes to every live endpoint at once. The signed
+      tx has one hash, so duplicates are harmless: success if any endpoint
+      accepted it, the first error otherwise.
+    """
+
+    WRITE_METHODS = {"eth_sendRawTransaction"}
+
+    def __init__(self, urls: list[str], pool_size: int = 20, hedge_after: float = 0.15):
+        super().__init__()
+        self.endpoints = [RPCEndpoint(u, pool_size, retry=len(urls) == 1) for u in urls]
+        self.hedge_after = hedge_after
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.endpoints), thread_name_prefix="rpc")
+        self._local = threading.local()
+
+    @contextmanager
+    def hedged(self):
+        """Hedge reads made by this thread inside the block (no-op with a single endpoint)."""
+        prev = getattr(self._local, "hedged", False)
+        self._local.hedged = len(self.endpoints) > 1
+        try:
+            yield
+        finally:
+            self._local.hedged = prev
+
+    def ranked(self) -> list[RPCEndpoint]:
+        """Live endpoints best-first, then endpoints in cooldown (soonest back first)."""
+        now = time.monotonic()
+        live = sorted((e for e in self.endpoints if e.down_until <= now), key=lambda e: e.score)
+        down = sorted((e for e in self.endpoints if e.down_until > now), key=lambda e: e.down_until)
+        return live + down
+
+    def _call(self, endpoint: RPCEndpoint, method, params):
+        start = time.perf_counter()
+        try:
+            response = endpoint.provider.make_request(method, params)
+        except Exception:
+            endpoint.failed()
+            metrics.inc("rpc_endpoint_errors_total", endpoint=endpoint.name)
+            raise
+        endpoint.ok(time.perf_counter() - start)
+        return response
+
+    def probe(self, endpoint: RPCEndpoint):
+        """One eth_blockNumber on `endpoint`: opens its keep-alive connection and seeds its score."""
+        return self._call(endpoint, "eth_blockNumber", [])
+
+    def make_request(self, method, params):
+        if method in self.WRITE_METHODS and len(self.endpoints) > 1:
+            return self._broadcast(method, params)
+        ranked = self.ranked()
+        if getattr(self._local, "hedged", False) and len(ranked) > 1:
+            return self._hedged(ranked, method, params)
+        last_err = None
+        for i, endpoint in enumerate(ranked):
+            try:
+                return self._call(endpoint, method, params)
+            except Exception as e:
+                last_err = e
+                if i + 1 < len(ranked):
+                    metrics.inc("rpc_failover_total", method=method)
+                    log.warning(f"[RPC] {method} failed on {endpoint.name} ({e}), failing over")
+        raise last_err
+
+    def make_batch_request(self, batch_requests):
+        """One JSON-RPC batch of reads on the best endpoint, failing over like a single read."""
+        ranked = self.ranked()
+        last_err = None
+        for i, endpoint in enumerate(ranked):
+            start = time.perf_counter()
+            try:
+                response = endpoint.provider.make_batch_request(batch_requests)
+            except Exception as e:
+                endpoint.failed()
+                metrics.inc("rpc_endpoint_errors_total", endpoint=endpoint.name)
+                last_err = e
+                if i + 1 < len(ranked):
+                    metrics.inc("rpc_failover_total", method="batch")
+                    log.warning(f"[RPC] batch of {len(batch_requests)} failed on {endpoint.name} ({e}), failing over")
+                continue
+            endpoint.ok(time.perf_counter() - start)
+            return response
+        raise last_err
+
+    def _hedged(self, ranked: list[RPCEndpoint], method, params):
+        primary = self._executor.submit(self._call, ranked[0], method, params)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done and primary.exception() is None:
+            return primary.result()
+        backup = self._executor.submit(self._call, ranked[1], method, params)
+        metrics.inc("rpc_hedged_total", method=method)
+        pending = {primary, backup}
+        last_err = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    metrics.inc("rpc_hedge_wins_total", method=method, winner="backup" if f is backup else "primary")
+                    return f.result()
+                last_err = f.exception()
+        raise last_err
+
+    def _broadcast(self, method, params):
+        now = time.monotonic()
+        targets = [e for e in self.endpoints if e.down_until <= now] or self.ranked()[:1]
+        futures = [self._executor.submit(self._call, e, method, params) for e in targets]
+        first_error = None
+        for f in as_completed(futures):
+            try:
+                response = f.result()
+            except Exception as e:
+                first_error = first_error or e
+                continue
+            if isinstance(response, dict) and response.get("error"):
+                first_error = first_error or response
+                continue
+            return response    # accepted by at least one node; the rest finish in the background
+        if isinstance(first_error, dict):
+            return first_error
+        raise first_error
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(e.provider.is_connected(show_traceback) for e in self.ranked()[:2])
+
+    def status(self) -> list[dict]:
+        return [e.status() for e in self.ranked()]
+
+# ═══════════════════════════════════════════════════
+#  Round Lifecycle Tracing
+# ═══════════════════════════════════════════════════
+
+class RoundTracer:
+    """One structured trace per round transition, keyed by the round that expired.
+
+    Spans are timestamped points (expiry_detected, price_obtained,
+    resolve_sent/mined, start_sent/mined, prediction_done, batch_sent/mined,
+    ...) with their offset from the round's on-chain end_time, which is the
+    SLO we care about. Finished traces stay in an in-memory ring for the API
+    and are appended to a JSONL file; rollover and bets-mined latency also go
+    to /metrics.
+    """
+
+    def __init__(self, path: str, size: int = 500, market: str | None = None):
+        self.path = path
+        self.market = market
+        self._ring: collections.OrderedDict[int, dict] = collections.OrderedDict()
+        self._size = size
+        self._lock = threading.Lock()
+
+    def mark(self, round_id: int, span: str, end_time: int | None = None, **attrs):
+        now = time.time()
+        stale = []
+        with self._lock:
+            trace = self._ring.get(round_id)
+            if trace is None:
+                trace = {"round_id": round_id, "market": self.market, "next_round_id": None,
+                         "end_time": end_time, "spans": [], "finished": False}
+                self._ring[round_id] = trace
+                # A newer transition started: older ones will not get more spans
+                stale = [t for rid, t in self._ring.items() if rid < round_id and not t["finished"]]
+                while len(self._ring) > self._size:
+                    self._ring.popitem(last=False)
+            if end_time and not trace["end_time"]:
+                trace["end_time"] = end_time
+            entry = {"span": span, "t": now}
+            if trace["end_time"]:
+                entry["since_end_ms"] = round((now - trace["end_time"]) * 1000)
+            entry.update(attrs)
+            trace["spans"].append(entry)
+        for t in stale:
+            self.finish(t["round_id"], incomplete=True)
+
+    def set_next_round(self, round_id: int, next_round_id: int):
+        with self._lock:
+            if round_id in self._ring:
+                self._ring[round_id]["next_round_id"] = next_round_id
+
+    def finish(self, round_id: int, incomplete: bool = False):
+        with self._lock:
+            trace = self._ring.get(round_id)
+            if trace is None or trace["finished"]:
+                return
+            trace["finished"] = True
+            trace["incomplete"] = incomplete
+            trace["summary"] = self._summarize(trace)
+            record = json.dumps(trace, default=str)
+        for key, metric in (("rollover_ms", "round_rollover_seconds"), ("bets_mined_ms", "round_bets_mined_seconds")):
+            if trace["summary"].get(key) is not None:
+                metrics.observe(metric, trace["summary"][key] / 1000, market=self.market)
+        try:
+            with open(self.path, "a") as f:
+                f.write(record + "\n")
+        except OSError as e:
+            log.error(f"[TRACE] Export failed: {e}")
+
+    @staticmethod
+    def _summarize(trace: dict) -> dict:
+        first = {}
+        for span in trace["spans"]:
+            first.setdefault(span["span"], span["t"])
+        end = trace["end_time"]
+        since_end = lambda name: round((first[name] - end) * 1000) if end and name in first else None
+        return {
+            "rollover_ms": since_end("start_mined"),        # expiry → next round accepting bets
+            "bets_mined_ms": since_end("batch_mined"),      # expiry → bot bets on-chain
+            "resolve_attempts": sum(1 for s in trace["spans"] if s["span"] == "resolve_sent"),
+        }
+
+    def get(self, round_id: int) -> dict | None:
+        with self._lock:
+            trace = self._ring.get(round_id)
+            return json.loads(json.dumps(trace, default=str)) if trace else None
+
+    def recent(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            traces = list(self._ring.values())[-limit:]
+            return json.loads(json.dumps(traces[::-1], default=str))
+
+tracer = RoundTracer(ROUND_TRACE_FILE, market=DEFAULT_MARKET)
+
 # ═══════════════════════════════════════════════════
 #  User / Wallet Manager
 # ═══════════════════════════════════════════════════
@@ -133,6 +969,13 @@ class UserManager:
     def __init__(self, w3: Web3):
         self.w3 = w3
         self.users = self._load_db()
+        self.ousdc = w3.eth.contract(address=OUSDC_ADDRESS, abi=ERC20_ABI)
+        # Balance cache: wallet (lowercase) → {"balances", "block", "at", "used", "dirty"}
+        self._balances: dict[str, dict] = {}
+        self._balances_lock = threading.Lock()
+        self._pruned_at = time.time()
+        if shared is not None:
+            shared.seed_wallets(self.users)
 
     def _load_db(self):
         if self.DB_FILE.exists():
@@ -148,45 +991,202 @@ class UserManager:
         player_address = player_address.lower()
         if player_address in self.users:
             return self.users[player_address]
+        if shared is not None and (stored := shared.get_wallet(player_address)):
+            self.users[player_address] = stored
+            return stored
         acct = Account.create()
         wallet = {
             "address": acct.address,
             "private_key": acct._private_key.hex(),
             "created_at": time.time()
         }
+        if shared is not None:
+            # Two workers may race on a new player: keep whichever wallet was stored first
+            wallet = shared.put_wallet_if_absent(player_address, wallet)
+            self.users[player_address] = wallet
+            return wallet
         self.users[player_address] = wallet
         self._save_db()
         log.info(f"Created deposit wallet {wallet['address']} for player {player_address}")
         return wallet
 
     def get_wallet(self, player_address: str):
-        return self.users.get(player_address.lower())
-
-    def get_balances(self, wallet_address: str) -> dict:
-        eth_wei = self.w3.eth.get_balance(wallet_address)
-        ousdc_contract = self.w3.eth.contract(address=OUSDC_ADDRESS, abi=ERC20_ABI)
+        p = player_address.lower()
+        if p not in self.users and shared is not None and (stored := shared.get_wallet(p)):
+            self.users[p] = stored
+        return self.users.get(p)
+
+    def cached_balances(self, wallet_address: str, max_age: float | None = None) -> dict:
+        """Balances from the cache; RPC only for a new, aged or invalidated wallet.
+
+        The keeper's follow_blocks() invalidates (and re-reads) wallets named
+        in OUSDC Transfer logs, so OUSDC is current. ETH moves leave no logs:
+        an entry is re-read once older than `max_age` seconds (default
+        BALANCE_CACHE_SEC). If that read fails, the last good balances are
+        returned rather than an error or a zero.
+        """
+        key = wallet_address.lower()
+        now = time.time()
+        entry = self._balances.get(key)
+        if entry and not entry["dirty"] and now - entry["at"] <= (BALANCE_CACHE_SEC if max_age is None else max_age):
+            entry["used"] = now
+            metrics.inc("balance_cache_total", outcome="hit")
+            return entry["balances"]
+        metrics.inc("balance_cache_total", outcome="miss")
         try:
-            ousdc_wei = ousdc_contract.functions.balanceOf(wallet_address).call()
-        except Exception:
-            ousdc_wei = 0
+            balances = self.get_balances(wallet_address)
+        except Exception as e:
+            if entry is None:
+                raise
+            # A failed read is not a zero balance (that would be a false 402); stays stale, so the next call retries
+            log.warning(f"[BALANCES] Read of {key} failed, serving block {entry['block']}: {e}")
+            entry["used"] = now
+            return entry["balances"]
+        self._store_balances(key, balances, now)
+        return balances
+
+    def _store_balances(self, key: str, balances: dict, used: float | None = None):
+        with self._balances_lock:
+            prev = self._balances.get(key)
+            if prev and prev["block"] > balances["block"]:
+                return   # a refresh for a newer block already landed
+            self._balances[key] = {"balances": balances, "block": balances["block"], "at": time.time(),
+                                   "used": used or (prev["used"] if prev else time.time()), "dirty": False}
+            now = time.time()
+            if now - self._pruned_at > BALANCE_POLL_SEC:
+                # Wallets nobody asked about for BALANCE_ACTIVE_SEC leave the cache
+                self._pruned_at = now
+                for k in [k for k, e in self._balances.items() if now - e["used"] > BALANCE_ACTIVE_SEC]:
+                    del self._balances[k]
+
+    @staticmethod
+    def _balances_dict(eth_wei: int, ousdc_wei: int, block: int) -> dict:
         return {
-            "eth": float(self.w3.from_wei(eth_wei, 'ether')),
+            "eth": float(Web3.from_wei(eth_wei, 'ether')),
             "eth_wei": eth_wei,
             "ousdc": ousdc_wei / 1e6,
+            "block": block,
         }
 
+    def get_balances(self, wallet_address: str, block: int | str = "latest") -> dict:
+        """ETH + OUSDC of one wallet; raises if either read fails (never reports a failed read as 0)."""
+        address = Web3.to_checksum_address(wallet_address)
+        if block == "latest":
+            block = self.w3.eth.block_number
+        eth_wei = self.w3.eth.get_balance(address, block_identifier=block)
+        ousdc_wei = self.ousdc.functions.balanceOf(address).call(block_identifier=block)
+        return self._balances_dict(eth_wei, ousdc_wei, block)
+
+    def read_balances(self, keys: list[str], block: int) -> dict[str, dict]:
+        """ETH + OUSDC of many wallets at `block` in one JSON-RPC batch.
+
+        Wallets with a failed read are left out (their cache entry stays as
+        it was); a rejected batch raises.
+        """
+        calls = []
+        for key in keys:
+            address = Web3.to_checksum_address(key)
+            calls.append(("eth_getBalance", [address, hex(block)]))
+            calls.append(("eth_call", [{"to": OUSDC_ADDRESS, "data": self.ousdc.encode_abi("balanceOf", [address])},
+                                       hex(block)]))
+        responses = self.w3.provider.make_batch_request(calls)
+        if not isinstance(responses, list):
+            raise RuntimeError(f"balance batch rejected: {responses.get('error') if isinstance(responses, dict) else responses}")
+        balances = {}
+        for key, eth, ousdc in zip(keys, responses[0::2], responses[1::2]):
+            try:
+                balances[key] = self._balances_dict(int(eth["result"], 16), int(ousdc["result"], 16), block)
+            except (KeyError, TypeError, ValueError):
+                metrics.inc("balance_refresh_errors_total")
+        return balances
+
+    def invalidate(self, wallets: list[str] | None):
+        """Mark cached wallets dirty (None: all of them); their next read goes to the chain."""
+        with self._balances_lock:
+            for key in (list(self._balances) if wallets is None else wallets):
+                if entry := self._balances.get(key):
+                    entry["dirty"] = True
+
+    TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+
+    def follow_blocks(self, active=lambda: True, batch_size: int = 100):
+        """Per new block: mark wallets named in OUSDC Transfer logs dirty and re-read just those.
+
+        Runs in the keeper only (while active()). With a shared store the
+        touched wallets also go out as a balances_dirty event, so API workers
+        invalidate their own caches instead of each following the chain. When
+        the logs can't be scanned (new leader, or more than 1000 blocks
+        behind) every cached wallet is invalidated. ETH is not refreshed
+        here: it ages out through cached_balances' max_age.
+        """
+        last_block = None
+        while not _shutdown.is_set():
+            _shutdown.wait(BALANCE_POLL_SEC)
+            if not active():
+                last_block = None
+                continue
+            try:
+                with self._balances_lock:
+                    blocks = [e["block"] for e in self._balances.values()]
+                if not blocks and shared is None:
+                    last_block = None
+                    continue
+                head = self.w3.eth.block_number
+                if last_block is None and shared is None:
+                    last_block = min(blocks)   # each entry is exact at the block it was read at
+                if last_block is not None and head <= last_block:
+                    continue
+                touched = None
+                if last_block is not None and head - last_block <= 1000:
+                    logs = self.w3.eth.get_logs({"fromBlock": last_block + 1, "toBlock": head,
+                                                 "address": OUSDC_ADDRESS, "topics": [self.TRANSFER_TOPIC]})
+                    touched = sorted({"0x" + bytes(t)[-20:].hex() for log_ in logs for t in log_["topics"][1:3]})
+                last_block = head
+                if touched != []:
+                    self.invalidate(touched)
+                    if shared is not None:
+                        shared.append_event("balances_dirty", {"block": head, "wallets": touched}, None)
+                # Also retries wallets whose read failed on an earlier block
+                with self._balances_lock:
+                    dirty = [k for k, e in self._balances.items() if e["dirty"]]
+                start = time.perf_counter()
+                for i in range(0, len(dirty), batch_size):
+                    for key, balances in self.read_balances(dirty[i:i + batch_size], head).items():
+                        self._store_balances(key, balances)
+                if dirty:
+                    metrics.observe("balance_refresh_seconds", time.perf_counter() - start)
+            except Exception as e:
+                log.error(f"[BALANCES] Refresh error: {e}")
+
 # ═══════════════════════════════════════════════════
 #  AI Model Oracle (OpenGradient ML Inference)
 # ═══════════════════════════════════════════════════
 
 class AIModelOracle:
-    WORKFLOWS_FILE = Path(__file__).parent / "workflows.json"
+    WORKFLOWS_FILE = Path(AI_WORKFLOWS_FILE)
+    PREDICTIONS_FILE = Path(AI_PREDICTIONS_FILE)
+    PREDICTION_MAX_AGE = 600   # cached predictions older than this are not restored
 
     def __init__(self, private_key: str):
-        self.client = og.Client(private_key=private_key)
-        self.workflows = self._load_workflows()
-        self.last_predictions = {}
+        self._private_key = private_key
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.workflows = self._load_workflows()     # copy-on-write: replaced whole on every switch
+        self.last_predictions = self._load_predictions()
         self._lock = threading.Lock()
+        self._deployer = ThreadPoolExecutor(max_workers=WORKFLOW_DEPLOY_CONCURRENCY, thread_name_prefix="wf-deploy")
+        self._renewing: set[str] = set()
+        self._retry_at: dict[str, float] = {}
+        self._failures: dict[str, int] = {}
+
+    @property
+    def client(self) -> "og.Client":
+        """OpenGradient client, built on first use (startup warmup or first inference)."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = og.Client(private_key=self._private_key)
+        return self._client
 
     def _load_workflows(self) -> dict:
         if self.WORKFLOWS_FILE.exists():
@@ -194,11 +1194,31 @@ class AIModelOracle:
                 return json.load(f)
         return {}
 
-    def _save_workflows(self):
+    def _load_predictions(self) -> dict:
+        """Last run's predictions, so bots and /api/ai/predict have a signal before the first inference."""
+        try:
+            with open(self.PREDICTIONS_FILE) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        cutoff = time.time() - self.PREDICTION_MAX_AGE
+        return {k: p for k, p in saved.items()
+                if k in self.workflows and p.get("timestamp", 0) > cutoff}
+
+    def _save_predictions(self, predictions: dict):
+        tmp = self.PREDICTIONS_FILE.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(predictions, f)
+        os.replace(tmp, self.PREDICTIONS_FILE)
+
+    def _save_workflows(self, workflows: dict):
         with open(self.WORKFLOWS_FILE, "w") as f:
-            json.dump(self.workflows, f, indent=2)
+            json.dump(workflows, f, indent=2)
+        if shared is not None:
+            _shared_put("workflows", workflows)
 
-    def deploy_workflow(self, model_key: str) -> str:
+    def deploy_workflow(self, model_key: str) -> dict:
+        """Deploy a new scheduled workflow for `model_key` and return its record (not switched to yet)."""
         config = AI_MODELS[model_key]
         base, quote = config["pair"]
         log.info(f"[AI] Deploying workflow for {config['name']} ({config['model_cid']})...")
@@ -207,11 +1227,11 @@ class AIModelOracle:
             total_candles=config["total_candles"],
             candle_duration_in_mins=config["candle_duration"],
             order=og.CandleOrder.DESCENDING,
-            candle_types=config["candle_types"],
+            candle_types=[getattr(og.CandleType, c) for c in config["candle_types"]],
         )
         scheduler = og.SchedulerParams(
             frequency=config["scheduler_frequency"],
-            duration_hours=24,
+            duration_hours=WORKFLOW_TTL_HOURS,
         )
         contract_address = self.client.alpha.new_workflow(
             model_cid=config["model_cid"],
@@ -219,55 +1239,141 @@ class AIModelOracle:
             input_tensor_name=config["input_tensor"],
             scheduler_params=scheduler,
         )
-        self.workflows[model_key] = {
+        now = time.time()
+        log.info(f"[AI] Workflow deployed: {config['name']} -> {contract_address}")
+        return {
             "address": contract_address,
             "model_cid": config["model_cid"],
             "name": config["name"],
-            "deployed_at": time.time(),
-            "expires_at": time.time() + 24 * 3600,
+            "deployed_at": now,
+            "expires_at": now + WORKFLOW_TTL_HOURS * 3600,
         }
-        self._save_workflows()
-        log.info(f"[AI] Workflow deployed: {config['name']} -> {contract_address}")
-        return contract_address
 
-    def deploy_all(self):
-        for model_key in AI_MODELS:
+    # ── Lifecycle: renew ahead of expiry, switch only to a workflow that answers ──
+
+    def due(self) -> list[str]:
+        """Models without a workflow, or with one expiring within WORKFLOW_RENEW_BEFORE_SEC."""
+        horizon = time.time() + WORKFLOW_RENEW_BEFORE_SEC
+        workflows = self.workflows
+        return [k for k in AI_MODELS if workflows.get(k, {}).get("expires_at", 0) <= horizon]
+
+    def renew_due(self) -> list:
+        """Start renewals for every due model (at most WORKFLOW_DEPLOY_CONCURRENCY run at once)."""
+        now = time.time()
+        futures = []
+        with self._lock:
+            for model_key in self.due():
+                if model_key in self._renewing or self._retry_at.get(model_key, 0) > now:
+                    continue
+                self._renewing.add(model_key)
+                futures.append(self._deployer.submit(self.renew, model_key))
+        return futures
+
+    def renew(self, model_key: str):
+        """Deploy a replacement workflow, wait until it returns a result, then switch to it.
+
+        The current workflow keeps serving run_prediction until the switch,
+        which is a single reference swap, so predictions never go dark.
+        Failures back off exponentially (1 min → 30 min) per model.
+        """
+        old = self.workflows.get(model_key)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            wf = self.deploy_workflow(model_key)
+            prediction = self._verify(model_key, wf)
+            if old:
+                wf["replaces"] = old["address"]
+            with self._lock:
+                self.workflows = {**self.workflows, model_key: wf}
+                self._save_workflows(self.workflows)
+                self._failures.pop(model_key, None)
+            self._store_prediction(model_key, prediction)
+            outcome = "ok"
+            log.info(f"[AI] {AI_MODELS[model_key]['name']}: switched to {wf['address']}"
+                     + (f" (was {old['address']}, {max(0, old.get('expires_at', 0) - time.time()) / 60:.0f} min left)"
+                        if old else ""))
+        except Exception as e:
+            with self._lock:
+                failures = self._failures[model_key] = self._failures.get(model_key, 0) + 1
+                self._retry_at[model_key] = time.time() + min(1800, 60 * 2 ** (failures - 1))
+            log.error(f"[AI] Renewal of {model_key} failed ({failures}x): {e}"
+                      + (f"; still on {old['address']}" if old else ""))
+        finally:
+            with self._lock:
+                self._renewing.discard(model_key)
+            metrics.observe("ai_workflow_renewal_seconds", time.perf_counter() - start, model=model_key, outcome=outcome)
+
+    def _verify(self, model_key: str, wf: dict) -> dict:
+        """First prediction from a freshly deployed workflow; raises if none within WORKFLOW_VERIFY_TIMEOUT_SEC."""
+        deadline = time.monotonic() + WORKFLOW_VERIFY_TIMEOUT_SEC
+        while True:
             try:
-                if model_key in self.workflows:
-                    wf = self.workflows[model_key]
-                    if wf.get("expires_at", 0) > time.time():
-                        log.info(f"[AI] Workflow {model_key} already deployed at {wf['address']}")
-                        continue
-                self.deploy_workflow(model_key)
-                time.sleep(2)
+                return self._infer(model_key, wf["address"])
             except Exception as e:
-                log.error(f"[AI] Failed to deploy {model_key}: {e}")
-                log.error(traceback.format_exc())
+                if time.monotonic() + 15 > deadline:
+                    raise RuntimeError(f"workflow {wf['address']} returned no result: {e}") from e
+                log.info(f"[AI] Waiting for first result of {wf['address'][:10]}... ({e})")
+                time.sleep(15)
+
+    def lifecycle_loop(self, active=None):
+        """Keep every model's workflow deployed and renewed; idle while active() is False."""
+        log.info(f"[AI] Workflow lifecycle: renew {WORKFLOW_RENEW_BEFORE_SEC / 60:.0f} min before expiry, "
+                 f"{WORKFLOW_DEPLOY_CONCURRENCY} deploy(s) at a time")
+        while True:
+            if active is None or active():
+                try:
+                    self.renew_due()
+                except Exception as e:
+                    log.error(f"[AI] Lifecycle check failed: {e}")
+            time.sleep(WORKFLOW_CHECK_SEC)
 
-    def run_prediction(self, model_key: str) -> dict:
-        if model_key not in self.workflows:
-            raise ValueError(f"Workflow {model_key} not deployed")
+    def renewal_status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {k: {"renewing": k in self._renewing, "failures": self._failures.get(k, 0),
+                        "retry_in_sec": round(max(0, self._retry_at.get(k, 0) - now))}
+                    for k in AI_MODELS}
+
+    def _infer(self, model_key: str, contract_address: str) -> dict:
         config = AI_MODELS[model_key]
-        wf = self.workflows[model_key]
-        contract_address = wf["address"]
-        log.info(f"[AI] Running inference: {config['name']} ({contract_address[:10]}...)")
-        try:
-            result = self.client.alpha.run_workflow(contract_address)
-        except Exception as e:
-            log.warning(f"[AI] run_workflow failed ({e}), trying read_workflow_result...")
-            result = self.client.alpha.read_workflow_result(contract_address)
+        with metrics.timer("ai_inference_seconds", model=model_key):
+            try:
+                result = self.client.alpha.run_workflow(contract_address)
+            except Exception as e:
+                log.warning(f"[AI] run_workflow failed ({e}), trying read_workflow_result...")
+                metrics.inc("ai_inference_fallback_total", model=model_key)
+                result = self.client.alpha.read_workflow_result(contract_address)
         prediction = self._parse_model_output(result, config)
         prediction["workflow_address"] = contract_address
         prediction["model_key"] = model_key
         prediction["timestamp"] = time.time()
+        return prediction
+
+    def _store_prediction(self, model_key: str, prediction: dict):
         with self._lock:
             self.last_predictions[model_key] = prediction
+            try:
+                self._save_predictions(self.last_predictions)
+            except OSError as e:
+                log.warning(f"[AI] Could not save predictions: {e}")
+        if shared is not None:
+            _shared_put(f"ai:{model_key}", prediction)
+
+    def run_prediction(self, model_key: str) -> dict:
+        wf = self.workflows.get(model_key)
+        if wf is None:
+            raise ValueError(f"Workflow {model_key} not deployed")
+        config = AI_MODELS[model_key]
+        log.info(f"[AI] Running inference: {config['name']} ({wf['address'][:10]}...)")
+        prediction = self._infer(model_key, wf["address"])
+        self._store_prediction(model_key, prediction)
         log.info(f"[AI] {config['name']}: {prediction['direction']} "
                  f"(return: {prediction['predicted_return']:.4f}, "
                  f"confidence: {prediction['confidence']:.0f}%)")
         return prediction
 
-    def _parse_model_output(self, output: og.ModelOutput, config: dict) -> dict:
+    def _parse_model_output(self, output: "og.ModelOutput", config: dict) -> dict:
         direction = "UP"
         predicted_return = 0.0
         confidence = 50.0
@@ -323,9 +1429,13 @@ class AIModelOracle:
         with self._lock:
             return dict(self.last_predictions)
 
-    def prediction_loop(self):
+    def prediction_loop(self, active=None):
+        """Refresh every deployed model forever; skipped while active() is False."""
         log.info("[AI] Starting prediction loop...")
         while True:
+            if active is not None and not active():
+                time.sleep(1)
+                continue
             for model_key in AI_MODELS:
                 try:
                     if model_key in self.workflows:
@@ -340,76 +1450,1047 @@ class AIModelOracle:
 # ═══════════════════════════════════════════════════
 
 class X402Oracle:
+    """Ask Oracle: direction hint from a TEE LLM, paid per completion via x402.
+
+    get_prediction() asks one model. get_ensemble() asks several at once
+    and answers with the first reply (mode "first") or with the
+    confidence-weighted vote of the replies in by the deadline (mode
+    "vote", which also returns early once the majority can't flip). Latency
+    and agreement with the ensemble answer are tracked per model in
+    X402Oracle.stats (see /api/predict/stats).
+    """
+
+    PROMPT = (
+        "Analyze the Bitcoin (BTC) market right now. "
+        "Where will the price go in the next 5 minutes? "
+        "Provide:\n"
+        "1. Direction (UP or DOWN)\n"
+        "2. Confidence (50-100)\n"
+        "3. Brief reasoning (1-2 sentences)\n"
+        "Format:\nDIRECTION: UP\nCONFIDENCE: 70\nREASON: Bitcoin showing bullish momentum...\n"
+    )
+
+    # Shared by every user's oracle: bounds concurrent completions process-wide
+    _pool = ThreadPoolExecutor(max_workers=LLM_ENSEMBLE_WORKERS, thread_name_prefix="llm")
+    _stats: dict[str, dict] = {}
+    _stats_lock = threading.Lock()
+
     def __init__(self, private_key: str, default_model: str = DEFAULT_MODEL):
         self.client = og.Client(private_key=private_key)
-        self.default_model = AVAILABLE_MODELS.get(default_model, og.TEE_LLM.GEMINI_2_5_FLASH)
+        self.default_model = AVAILABLE_MODELS.get(default_model, "GEMINI_2_5_FLASH")
         self.model_label = default_model
 
     def get_prediction(self, model_name: str | None = None) -> dict:
-        model = AVAILABLE_MODELS.get(model_name, self.default_model)
         label = model_name or self.model_label
         log.info(f"[x402] User requesting BTC prediction ({label})...")
-        result = self.client.llm.completion(
-            model=model,
-            prompt=(
-                "Analyze the Bitcoin (BTC) market right now. "
-                "Where will the price go in the next 5 minutes? "
-                "Provide:\n"
-                "1. Direction (UP or DOWN)\n"
-                "2. Brief reasoning (1-2 sentences)\n"
-                "Format:\nDIRECTION: UP\nREASON: Bitcoin showing bullish momentum...\n"
-            ),
-            max_tokens=100,
-            x402_settlement_mode=og.x402SettlementMode.SETTLE_INDIVIDUAL_WITH_METADATA,
-        )
+        start = time.perf_counter()
+        try:
+            prediction = self._complete(model_name)
+        except Exception:
+            self._record(label, time.perf_counter() - start, ok=False)
+            raise
+        self._record(label, time.perf_counter() - start, ok=True)
+        return prediction
+
+    def _complete(self, model_name: str | None) -> dict:
+        if model_name is not None and model_name not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model {model_name!r}")   # names become metric labels
+        model = getattr(og.TEE_LLM, AVAILABLE_MODELS.get(model_name, self.default_model))
+        label = model_name or self.model_label
+        with metrics.timer("llm_completion_seconds", model=label):
+            result = self.client.llm.completion(
+                model=model,
+                prompt=self.PROMPT,
+                max_tokens=120,
+                x402_settlement_mode=og.x402SettlementMode.SETTLE_INDIVIDUAL_WITH_METADATA,
+            )
         raw = result.completion_output.strip()
         direction = "UP" if "UP" in raw.upper().split("DIRECTION")[-1][:20] else "DOWN"
         reason = ""
+        confidence = 50.0
         for line in raw.split("\n"):
-            if "REASON:" in line.upper():
+            if "REASON:" in line.upper() and not reason:
                 reason = line.split(":", 1)[-1].strip()
-                break
+            elif "CONFIDENCE:" in line.upper():
+                digits = "".join(c for c in line.split(":", 1)[-1] if c.isdigit() or c == ".")
+                try:
+                    confidence = min(100.0, max(50.0, float(digits)))
+                except ValueError:
+                    pass
         if not reason:
             reason = raw
 
-        log.info(f"[x402] Oracle: {direction} | Hash: {result.payment_hash[:10]}...")
+        log.info(f"[x402] Oracle ({label}): {direction} {confidence:.0f}% | Hash: {result.payment_hash[:10]}...")
         return {
             "direction": direction,
+            "confidence": confidence,
             "reason": reason,
             "payment_hash": result.payment_hash,
             "model": label,
             "raw_output": raw,
         }
 
+    def get_ensemble(self, models: list[str] | None = None, mode: str | None = None,
+                     deadline: float | None = None) -> dict:
+        """Ask `models` concurrently; answer by first reply or weighted vote within `deadline` seconds.
+
+        Completions still running at the deadline (or after the early
+        return) are abandoned: queued ones are cancelled, running ones
+        cannot be interrupted and finish in the background, feeding only the
+        latency stats. Raises RuntimeError if no model answered in time.
+        """
+        models = [m for m in dict.fromkeys(models or LLM_ENSEMBLE_MODELS) if m in AVAILABLE_MODELS]
+        mode = mode or LLM_ENSEMBLE_MODE
+        deadline = LLM_ENSEMBLE_DEADLINE_SEC if deadline is None else deadline
+        if not models:
+            raise ValueError("No known models in the ensemble")
+        log.info(f"[x402] Ensemble ({mode}, {deadline:g}s): {', '.join(models)}")
+        start = time.perf_counter()
+
+        def _timed(label):
+            t = time.perf_counter()
+            try:
+                result = self._complete(label)
+            except Exception:
+                self._record(label, time.perf_counter() - t, ok=False)
+                raise
+            self._record(label, time.perf_counter() - t, ok=True)
+            return result, time.perf_counter() - start
+
+        futures = {self._pool.submit(_timed, label): label for label in models}
+        answers, failed = [], []
+        pending = set(futures)
+        end = start + deadline
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.perf_counter()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is not None:
+                    failed.append({"model": futures[f], "error": str(f.exception())})
+                    continue
+                answer, elapsed = f.result()
+                answers.append({**answer, "latency_ms": round(elapsed * 1000)})
+            if answers and (mode == "first" or self._decided(answers, len(pending))):
+                break
+        for f in pending:
+            f.cancel()
+        abandoned = [futures[f] for f in pending]
+        if abandoned:
+            metrics.inc("llm_ensemble_abandoned_total", len(abandoned))
+        if not answers:
+            raise RuntimeError(f"No model answered within {deadline:g}s"
+                               + (f" ({'; '.join(e['model'] + ': ' + e['error'] for e in failed)})" if failed else ""))
+
+        weights = {"UP": 0.0, "DOWN": 0.0}
+        for a in answers:
+            weights[a["direction"]] += a["confidence"]
+        direction = answers[0]["direction"] if mode == "first" else max(weights, key=weights.get)
+        lead = next(a for a in answers if a["direction"] == direction)
+        agreeing = [a for a in answers if a["direction"] == direction]
+        for a in answers:
+            self._record(a["model"], None, agreed=a["direction"] == direction)
+        metrics.observe("llm_ensemble_seconds", time.perf_counter() - start, mode=mode, answers=len(answers))
+        log.info(f"[x402] Ensemble: {direction} ({len(agreeing)}/{len(answers)} agree, "
+                 f"{len(abandoned)} abandoned) in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return {
+            "direction": direction,
+            # Mean confidence of the models behind the answer; how many agree is ensemble.agreement
+            "confidence": round(sum(a["confidence"] for a in agreeing) / len(agreeing), 1),
+            "reason": lead["reason"],
+            "payment_hash": lead["payment_hash"],
+            "model": "ensemble",
+            "raw_output": lead["raw_output"],
+            "ensemble": {
+                "mode": mode,
+                "votes": [{k: a[k] for k in ("model", "direction", "confidence", "latency_ms", "payment_hash")}
+                          for a in answers],
+                "agreement": round(len(agreeing) / len(answers), 2),
+                "failed": failed,
+                "abandoned": abandoned,
+            },
+        }
+
+    @staticmethod
+    def _decided(answers: list[dict], pending: int) -> bool:
+        """True once the pending models can no longer change the vote (confidence is at most 100)."""
+        weights = {"UP": 0.0, "DOWN": 0.0}
+        for a in answers:
+            weights[a["direction"]] += a["confidence"]
+        return abs(weights["UP"] - weights["DOWN"]) > 100 * pending
+
+    @classmethod
+    def _record(cls, model: str, seconds: float | None, ok: bool = True, agreed: bool | None = None):
+        with cls._stats_lock:
+            st = cls._stats.setdefault(model, {"calls": 0, "errors": 0, "latency_ms": None,
+                                               "votes": 0, "agreed": 0})
+            if seconds is not None:
+                st["calls"] += 1
+                st["errors"] += not ok
+                ms = seconds * 1000
+                st["latency_ms"] = ms if st["latency_ms"] is None else 0.8 * st["latency_ms"] + 0.2 * ms
+            if agreed is not None:
+                st["votes"] += 1
+                st["agreed"] += agreed
+                metrics.inc("llm_ensemble_votes_total", model=model, agreed=str(agreed).lower())
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._stats_lock:
+            return {model: {**st, "latency_ms": round(st["latency_ms"]) if st["latency_ms"] is not None else None,
+                            "agreement": round(st["agreed"] / st["votes"], 3) if st["votes"] else None}
+                    for model, st in cls._stats.items()}
+
 # ═══════════════════════════════════════════════════
 #  Price Fetcher
 # ═══════════════════════════════════════════════════
 
 def get_crypto_price_usd(asset: str = "btc") -> float:
-    """Fetch price from Binance (same source as frontend WebSocket)."""
+    """Fetch price from Binance (same source as frontend WebSocket). ValueError for assets not in PRICE_URLS_BINANCE."""
+    url = PRICE_URLS_BINANCE.get(asset)
+    if url is None:
+        raise ValueError(f"Unknown asset {asset!r}. Available: {', '.join(PRICE_URLS_BINANCE)}")
+    start = time.perf_counter()
+    outcome = "error"
     try:
-        url = PRICE_URLS_BINANCE.get(asset, PRICE_URLS_BINANCE["btc"])
         resp = requests.get(url, timeout=5)
         resp.raise_for_status()
-        return float(resp.json()["price"])
+        price = float(resp.json()["price"])
+        outcome = "ok"
+        return price
     except Exception as e:
         log.error(f"Failed to fetch {asset.upper()} price from Binance: {e}")
         return 0.0
+    finally:
+        metrics.observe("price_fetch_seconds", time.perf_counter() - start, asset=asset, outcome=outcome)
 
 def get_btc_price_usd() -> float:
     return get_crypto_price_usd("btc")
 
+class PriceFeed:
+    """Price cache shared by the market engines, the SSE ticker and the API.
+
+    get() returns the cached price while it is younger than max_age, so any
+    number of readers of one asset cost one Binance request per window. A
+    per-asset lock keeps concurrent misses down to a single fetch.
+    """
+
+    def __init__(self):
+        self._cache: dict[str, tuple[float, float]] = {}
+        self._locks = {asset: threading.Lock() for asset in PRICE_URLS_BINANCE}
+
+    def get(self, asset: str, max_age: float = 1.0) -> float:
+        hit = self._cache.get(asset)
+        if hit and time.time() - hit[1] < max_age:
+            return hit[0]
+        with self._locks.setdefault(asset, threading.Lock()):
+            hit = self._cache.get(asset)
+            if hit and time.time() - hit[1] < max_age:
+                return hit[0]
+            price = get_crypto_price_usd(asset)
+            if price > 0:
+                self._cache[asset] = (price, time.time())
+            return price
+
+    def age(self, asset: str) -> float:
+        hit = self._cache.get(asset)
+        return time.time() - hit[1] if hit else float("inf")
+
+prices = PriceFeed()
+
+# ═══════════════════════════════════════════════════
+#  Chain Indexer (Predict402 + Vault402 logs → SQLite)
+# ═══════════════════════════════════════════════════
+
+class ChainIndexer:
+    """Follows Predict402 / Vault402 logs incrementally into a local SQLite store.
+
+    Scans from the stored checkpoint up to head - confirmations in bounded
+    chunks; each chunk (rows + new checkpoint) is committed in one
+    transaction. The checkpoint block hash is kept next to the checkpoint, and
+    if the chain no longer has that hash the indexer rewinds REORG_WINDOW
+    blocks, drops everything derived from them and scans again.
+
+    Amounts are stored as decimal wei strings (they overflow SQLite INTEGER).
+    """
+
+    CHUNK_BLOCKS = 2000
+    REORG_WINDOW = 64
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS rounds (
+            round_id INTEGER PRIMARY KEY, strike_price INTEGER, start_time INTEGER, end_time INTEGER,
+            started_block INTEGER, resolved INTEGER NOT NULL DEFAULT 0, up_won INTEGER,
+            closing_price INTEGER, up_pool TEXT, down_pool TEXT, total_pool TEXT,
+            resolved_block INTEGER, resolved_tx TEXT
+        );
+        CREATE TABLE IF NOT EXISTS bets (
+            block INTEGER, log_index INTEGER, tx_hash TEXT, round_id INTEGER, player TEXT,
+            is_up INTEGER, amount TEXT, nickname TEXT, used_ai INTEGER,
+            PRIMARY KEY (block, log_index)
+        );
+        CREATE INDEX IF NOT EXISTS bets_player ON bets (player, block);
+        CREATE INDEX IF NOT EXISTS bets_round ON bets (round_id);
+        CREATE TABLE IF NOT EXISTS payouts (
+            block INTEGER, log_index INTEGER, tx_hash TEXT, round_id INTEGER, player TEXT, amount TEXT,
+            PRIMARY KEY (block, log_index)
+        );
+        CREATE INDEX IF NOT EXISTS payouts_player ON payouts (player, round_id);
+        CREATE TABLE IF NOT EXISTS vault_events (
+            block INTEGER, log_index INTEGER, tx_hash TEXT, player TEXT, kind TEXT, amount TEXT,
+            PRIMARY KEY (block, log_index)
+        );
+        CREATE INDEX IF NOT EXISTS vault_events_player ON vault_events (player, block);
+        CREATE TABLE IF NOT EXISTS vault_balances (player TEXT PRIMARY KEY, balance TEXT, block INTEGER);
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            player TEXT PRIMARY KEY, nickname TEXT, bets INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0, wagered TEXT NOT NULL DEFAULT '0',
+            earnings TEXT NOT NULL DEFAULT '0', earnings_eth REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (earnings_eth DESC, wins DESC);
+        CREATE TABLE IF NOT EXISTS leaderboard_rounds (round_id INTEGER PRIMARY KEY, resolved_block INTEGER);
+    """
+
+    def __init__(self, w3: Web3, predict_address: str, vault_address: str | None, db_path: str,
+                 confirmations: int = INDEXER_CONFIRMATIONS, start_block: int | None = None):
+        self.w3 = w3
+        self.predict = w3.eth.contract(address=predict_address, abi=PREDICT_ABI)
+        self.vault = w3.eth.contract(address=vault_address, abi=VAULT_ABI) if vault_address else None
+        self.addresses = [c.address for c in (self.predict, self.vault) if c is not None]
+        self.db_path = db_path
+        self.confirmations = confirmations
+        self.start_block = start_block
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._events = {}   # topic0 → (contract event, source)
+        for contract, source in ((self.predict, "predict"), (self.vault, "vault")):
+            if contract is None:
+                continue
+            for abi in contract.abi:
+                if abi.get("type") == "event":
+                    sig = f"{abi['name']}({','.join(i['type'] for i in abi['inputs'])})"
+                    topic = Web3.to_hex(Web3.keccak(text=sig))
+                    self._events[topic] = (getattr(contract.events, abi["name"])(), source)
+        db = self._db()
+        db.executescript(self.SCHEMA)
+        # A store is only valid for the contracts it was built from (e.g. after DEFAULT_MARKET changed)
+        contracts = ",".join(a.lower() for a in self.addresses)
+        stored = self._meta("contracts")
+        if stored is None:
+            with db:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('contracts', ?)", (contracts,))
+        elif stored != contracts:
+            raise SystemExit(f"{db_path} indexes {stored}, not {contracts}: delete it or set INDEXER_DB")
+
+    # ── Storage ──
+
+    def _db(self) -> sqlite3.Connection:
+        """Per-thread connection; WAL lets API readers run while the indexer writes."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def checkpoint(self) -> tuple[int | None, str | None]:
+        rows = dict(self._db().execute("SELECT key, value FROM meta WHERE key IN ('block', 'hash')").fetchall())
+        if "block" not in rows:
+            return None, None
+        return int(rows["block"]), rows.get("hash")
+
+    def _block_hash(self, number: int) -> str:
+        return Web3.to_hex(self.w3.eth.get_block(number)["hash"])
+
+    def _block_hash_or_none(self, number: int) -> str | None:
+        try:
+            return self._block_hash(number)
+        except BlockNotFound:
+            return None   # chain got shorter than our checkpoint — also a reorg
+
+    # ── Sync ──
+
+    def sync_once(self) -> int:
+        """Index newly confirmed blocks. Returns the number of logs applied."""
+        head = self.w3.eth.block_number - self.confirmations
+        last, last_hash = self.checkpoint()
+        if last is None:
+            last = self._origin(head) - 1
+        elif last_hash and self._block_hash_or_none(last) != last_hash:
+            self._rewind(last)
+            return 0
+
+        applied = 0
+        while last < head:
+            to_block = min(head, last + self.CHUNK_BLOCKS)
+            logs = self.w3.eth.get_logs({"fromBlock": last + 1, "toBlock": to_block, "address": self.addresses})
+            decoded = []
+            for entry in logs:
+                event = self._events.get(Web3.to_hex(entry["topics"][0])) if entry["topics"] else None
+                if event:
+                    decoded.append((event[1], event[0].process_log(entry)))
+            touched = {d["args"]["user"].lower() for src, d in decoded if src == "vault" and "user" in d["args"]}
+            balances = self._read_vault_balances(touched, to_block)
+            to_hash = self._block_hash(to_block)
+            with self._write_lock, self._db() as db:
+                self._apply(db, decoded)
+                db.executemany("INSERT OR REPLACE INTO vault_balances VALUES (?, ?, ?)",
+                               [(p, str(b), to_block) for p, b in balances.items()])
+                db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                               [("block", str(to_block)), ("hash", to_hash)])
+            applied += len(decoded)
+            last = to_block
+        if last >= head and self._meta("origin_complete") == "1" and self._meta("complete") != "1":
+            with self._write_lock, self._db() as db:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '1')")
+            log.info(f"[INDEXER] Backfill from deployment reached block {last}; leaderboard is complete")
+        return applied
+
+    def _meta(self, key: str) -> str | None:
+        row = self._db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _origin(self, head: int) -> int:
+        """First block to scan on an empty store: INDEXER_START_BLOCK, else the deployment block.
+
+        Only a scan that starts at (or before) deployment sees every bet, so
+        that is recorded as origin_complete; falling back to head -
+        INDEXER_BACKFILL_BLOCKS leaves the store marked incomplete.
+        """
+        deployed = self._deploy_block()
+        if self.start_block is not None:
+            origin = self.start_block
+            complete = deployed is None or origin <= deployed   # operator set the deployment block
+        elif deployed is not None:
+            origin, complete = deployed, True
+        else:
+            origin, complete = max(0, head - INDEXER_BACKFILL_BLOCKS), False
+            log.warning(f"[INDEXER] Deployment block unknown, indexing from {origin}; leaderboard stays "
+                        f"incomplete (set INDEXER_START_BLOCK to the deployment block)")
+        with self._write_lock, self._db() as db:
+            db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                           [("origin", str(origin)), ("origin_complete", "1" if complete else "0")])
+        return origin
+
+    def _deploy_block(self) -> int | None:
+        """Earliest block with code at any indexed address (binary search over eth_getCode).
+
+        None when the node can't serve historical state (non-archive).
+        """
+        try:
+            head = self.w3.eth.block_number
+            first = []
+            for address in self.addresses:
+                if not self.w3.eth.get_code(address, block_identifier=head):
+                    return None
+                lo, hi = 0, head
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if self.w3.eth.get_code(address, block_identifier=mid):
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                first.append(lo)
+            return min(first)
+        except Exception as e:
+            log.warning(f"[INDEXER] Could not locate deployment block: {e}")
+            return None
+
+    def complete(self) -> bool:
+        """True once the store was backfilled from deployment up to head (totals match getLeaderboard)."""
+        return self._meta("complete") == "1"
+
+    def _read_vault_balances(self, players, block: int) -> dict[str, int]:
+        balances = {}
+        for player in players:
+            addr = Web3.to_checksum_address(player)
+            try:
+                balances[player] = self.vault.functions.getBalance(addr).call(block_identifier=block)
+            except Exception:
+                # Non-archive nodes can't serve old state during a backfill
+                balances[player] = self.vault.functions.getBalance(addr).call()
+        return balances
+
+    def _apply(self, db: sqlite3.Connection, decoded: list):
+        pending_payouts = {}   # tx hash → payout row keys; RoundResolved comes after its Payouts
+        for source, ev in decoded:
+            name, a = ev["event"], ev["args"]
+            block, idx, tx = ev["blockNumber"], ev["logIndex"], Web3.to_hex(ev["transactionHash"])
+            if name == "BetPlaced":
+                db.execute("INSERT OR REPLACE INTO bets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (block, idx, tx, a["roundId"], a["player"].lower(), int(a["isUp"]),
+                            str(a["amount"]), a["nickname"], int(a["usedAi"])))
+            elif name == "RoundStarted":
+                db.execute("INSERT INTO rounds (round_id, strike_price, start_time, end_time, started_block) "
+                           "VALUES (?, ?, ?, ?, ?) ON CONFLICT(round_id) DO UPDATE SET "
+                           "strike_price=excluded.strike_price, start_time=excluded.start_time, "
+                           "end_time=excluded.end_time, started_block=excluded.started_block",
+                           (a["roundId"], a["strikePrice"], a["startTime"], a["endTime"], block))
+            elif name == "RoundResolved":
+                db.execute("INSERT INTO rounds (round_id, resolved, up_won, closing_price, up_pool, down_pool, "
+                           "total_pool, resolved_block, resolved_tx) VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT(round_id) DO UPDATE SET resolved=1, up_won=excluded.up_won, "
+                           "closing_price=excluded.closing_price, up_pool=excluded.up_pool, "
+                           "down_pool=excluded.down_pool, total_pool=excluded.total_pool, "
+                           "resolved_block=excluded.resolved_block, resolved_tx=excluded.resolved_tx",
+                           (a["roundId"], int(a["upWon"]), a["closingPrice"], str(a["upPool"]),
+                            str(a["downPool"]), str(a["totalPool"]), block, tx))
+                for key in pending_payouts.pop(tx, []):
+                    db.execute("UPDATE payouts SET round_id = ? WHERE block = ? AND log_index = ?",
+                               (a["roundId"], *key))
+                self._materialize_round(db, a["roundId"], block)
+            elif name == "NicknameRegistered":
+                db.execute("INSERT INTO leaderboard (player, nickname) VALUES (?, ?) "
+                           "ON CONFLICT(player) DO UPDATE SET nickname = excluded.nickname",
+                           (a["player"].lower(), a["nickname"]))
+                db.execute("INSERT INTO meta VALUES ('nickname_rev', '1') ON CONFLICT(key) DO UPDATE "
+                           "SET value = CAST(value AS INTEGER) + 1")
+            elif name == "Payout":
+                db.execute("INSERT OR REPLACE INTO payouts VALUES (?, ?, ?, NULL, ?, ?)",
+                           (block, idx, tx, a["player"].lower(), str(a["amount"])))
+                pending_payouts.setdefault(tx, []).append((block, idx))
+            elif source == "vault" and "user" in a:
+                amount = a.get("amount")
+                db.execute("INSERT OR REPLACE INTO vault_events VALUES (?, ?, ?, ?, ?, ?)",
+                           (block, idx, tx, a["user"].lower(), name,
+                            str(amount) if amount is not None else None))
+
+    def _rewind(self, last: int):
+        fork = max(-1, last - self.REORG_WINDOW)
+        log.warning(f"[INDEXER] Reorg detected at block {last}, rewinding to {fork}")
+        with self._write_lock, self._db() as db:
+            stale = [r["player"] for r in db.execute("SELECT player FROM vault_balances WHERE block > ?", (fork,))]
+        balances = self._read_vault_balances(stale, max(fork, 0)) if stale and self.vault else {}
+        fork_hash = self._block_hash(fork) if fork >= 0 else None
+        with self._write_lock, self._db() as db:
+            for table in ("bets", "payouts", "vault_events"):
+                db.execute(f"DELETE FROM {table} WHERE block > ?", (fork,))
+            db.execute("DELETE FROM rounds WHERE started_block > ?", (fork,))
+            db.execute("UPDATE rounds SET resolved = 0, up_won = NULL, closing_price = NULL, up_pool = NULL, "
+                       "down_pool = NULL, total_pool = NULL, resolved_block = NULL, resolved_tx = NULL "
+                       "WHERE resolved_block > ?", (fork,))
+            if db.execute("DELETE FROM leaderboard_rounds WHERE resolved_block > ?", (fork,)).rowcount:
+                self._rebuild_leaderboard(db)
+            db.executemany("INSERT OR REPLACE INTO vault_balances VALUES (?, ?, ?)",
+                           [(p, str(b), fork) for p, b in balances.items()])
+            if fork >= 0:
+                db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [("block", str(fork)), ("hash", fork_hash)])
+            else:
+                db.execute("DELETE FROM meta WHERE key IN ('block', 'hash')")
+
+    # ── Leaderboard (materialized, updated once per resolved round) ──
+
+    def _materialize_round(self, db: sqlite3.Connection, round_id: int, block: int):
+        """Fold one resolved round into the leaderboard — O(bets in round)."""
+        if db.execute("SELECT 1 FROM leaderboard_rounds WHERE round_id = ?", (round_id,)).fetchone():
+            return
+        delta = {}   # player → [bets, wins, wagered, earnings, nickname]
+        for b in db.execute("SELECT player, amount, nickname FROM bets WHERE round_id = ? "
+                            "ORDER BY block, log_index", (round_id,)):
+            d = delta.setdefault(b["player"], [0, 0, 0, 0, None])
+            d[0] += 1
+            d[2] += int(b["amount"])
+            d[4] = b["nickname"]
+        for p in db.execute("SELECT player, amount FROM payouts WHERE round_id = ?", (round_id,)):
+            d = delta.setdefault(p["player"], [0, 0, 0, 0, None])
+            d[1] += 1
+            d[3] += int(p["amount"])
+        self._add_to_leaderboard(db, delta)
+        db.execute("INSERT INTO leaderboard_rounds VALUES (?, ?)", (round_id, block))
+
+    def _add_to_leaderboard(self, db: sqlite3.Connection, delta: dict):
+        for player, (bets, wins, wagered, earnings, nickname) in delta.items():
+            row = db.execute("SELECT * FROM leaderboard WHERE player = ?", (player,)).fetchone()
+            if row:
+                bets += row["bets"]
+                wins += row["wins"]
+                wagered += int(row["wagered"])
+                earnings += int(row["earnings"])
+                nickname = row["nickname"] or nickname
+            db.execute("INSERT OR REPLACE INTO leaderboard VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (player, nickname, bets, wins, str(wagered), str(earnings),
+                        float(self.w3.from_wei(earnings, "ether"))))
+
+    def _rebuild_leaderboard(self, db: sqlite3.Connection):
+        """Recompute from scratch — only needed after a reorg removed resolved rounds."""
+        db.execute("UPDATE leaderboard SET bets = 0, wins = 0, wagered = '0', earnings = '0', earnings_eth = 0")
+        rounds = [r["round_id"] for r in db.execute("SELECT round_id FROM leaderboard_rounds")]
+        db.execute("DELETE FROM leaderboard_rounds")
+        for round_id in rounds:
+            block = db.execute("SELECT resolved_block FROM rounds WHERE round_id = ?", (round_id,)).fetchone()
+            self._materialize_round(db, round_id, block["resolved_block"] if block else None)
+
+    def leaderboard_version(self) -> tuple[int, int]:
+        """(last round folded in, nickname revision) — changes exactly when a leaderboard page can change."""
+        row = self._db().execute("SELECT MAX(round_id) AS r FROM leaderboard_rounds").fetchone()
+        return row["r"] or 0, int(self._meta("nickname_rev") or 0)
+
+    def leaderboard(self, offset: int = 0, limit: int = 50) -> dict:
+        db = self._db()
+        # Rows from NicknameRegistered alone (no bet yet) only serve nickname lookups
+        total = db.execute("SELECT COUNT(*) AS n FROM leaderboard WHERE bets > 0").fetchone()["n"]
+        rows = db.execute("SELECT * FROM leaderboard WHERE bets > 0 ORDER BY earnings_eth DESC, wins DESC, player "
+                          "LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        entries = []
+        for rank, r in enumerate(rows, start=offset + 1):
+            wagered, earnings = int(r["wagered"]), int(r["earnings"])
+            entries.append({
+                "rank": rank,
+                "player": r["player"],
+                "nickname": r["nickname"] or "",
+                "total_wins": r["wins"],
+                "total_bets": r["bets"],
+                "win_rate": r["wins"] * 10000 // r["bets"] if r["bets"] else 0,   # basis points, like PlayerStats
+                "total_earnings_wei": str(earnings),
+                "total_earnings_eth": r["earnings_eth"],
+                "wagered_eth": float(self.w3.from_wei(wagered, "ether")),
+                "pnl_eth": _signed_eth(earnings - wagered),
+            })
+        return {"total_players": total, "entries": entries}
+
+    def run(self, active=None):
+        """Sync forever; with active=callable, only while it returns True (one writer per store)."""
+        log.info(f"[INDEXER] Following {', '.join(self.addresses)} → {self.db_path}")
+        if self.checkpoint()[0] is not None and self._meta("origin") is None:
+            log.warning(f"[INDEXER] {self.db_path} predates deployment-block backfill; the leaderboard is "
+                        f"reported incomplete until the store is deleted and rebuilt")
+        while True:
+            if active is not None and not active():
+                time.sleep(INDEXER_POLL_SEC)
+                continue
+            try:
+                n = self.sync_once()
+                if n:
+                    log.info(f"[INDEXER] Indexed {n} log(s) up to block {self.checkpoint()[0]}")
+            except Exception as e:
+                log.error(f"[INDEXER] Sync error: {e}")
+            time.sleep(INDEXER_POLL_SEC)
+
+    # ── Queries ──
+
+    def bet_history(self, player: str, limit: int = 50, before_block: int | None = None) -> list[dict]:
+        rows = self._db().execute(
+            "SELECT b.*, r.resolved, r.up_won, r.strike_price, r.closing_price, "
+            "  (SELECT group_concat(p.amount) FROM payouts p WHERE p.player = b.player AND p.round_id = b.round_id) AS payouts "
+            "FROM bets b LEFT JOIN rounds r ON r.round_id = b.round_id "
+            "WHERE b.player = ? AND b.block < ? ORDER BY b.block DESC, b.log_index DESC LIMIT ?",
+            (player.lower(), before_block if before_block is not None else 2**62, limit),
+        ).fetchall()
+        history = []
+        for r in rows:
+            payout_wei = sum(int(x) for x in r["payouts"].split(",")) if r["payouts"] else 0
+            resolved = bool(r["resolved"])
+            history.append({
+                "round_id": r["round_id"],
+                "direction": "UP" if r["is_up"] else "DOWN",
+                "amount_eth": float(self.w3.from_wei(int(r["amount"]), "ether")),
+                "nickname": r["nickname"],
+                "used_ai": bool(r["used_ai"]),
+                "tx_hash": r["tx_hash"],
+                "block": r["block"],
+                "status": ("won" if bool(r["up_won"]) == bool(r["is_up"]) else "lost") if resolved else "pending",
+                "strike_price": r["strike_price"] / 100.0 if r["strike_price"] is not None else None,
+                "closing_price": r["closing_price"] / 100.0 if r["closing_price"] is not None else None,
+                "round_payout_eth": float(self.w3.from_wei(payout_wei, "ether")),
+            })
+        return history
+
+    def round_results(self, limit: int = 20, before_round: int | None = None) -> list[dict]:
+        rows = self._db().execute(
+            "SELECT r.*, (SELECT COUNT(*) FROM bets b WHERE b.round_id = r.round_id) AS bets "
+            "FROM rounds r WHERE r.round_id < ? ORDER BY r.round_id DESC LIMIT ?",
+            (before_round if before_round is not None else 2**62, limit),
+        ).fetchall()
+        eth = lambda wei: float(self.w3.from_wei(int(wei), "ether")) if wei is not None else None
+        return [{
+            "round_id": r["round_id"],
+            "start_time": r["start_time"],
+            "end_time": r["end_time"],
+            "strike_price": r["strike_price"] / 100.0 if r["strike_price"] is not None else None,
+            "closing_price": r["closing_price"] / 100.0 if r["closing_price"] is not None else None,
+            "resolved": bool(r["resolved"]),
+            "result": ("UP" if r["up_won"] else "DOWN") if r["resolved"] else None,
+            "up_pool_eth": eth(r["up_pool"]),
+            "down_pool_eth": eth(r["down_pool"]),
+            "total_pool_eth": eth(r["total_pool"]),
+            "bets": r["bets"],
+            "resolved_tx": r["resolved_tx"],
+        } for r in rows]
+
+    def vault_balance(self, player: str) -> dict | None:
+        row = self._db().execute("SELECT balance, block FROM vault_balances WHERE player = ?",
+                                 (player.lower(),)).fetchone()
+        if row is None:
+            return None
+        return {"balance_eth": float(self.w3.from_wei(int(row["balance"]), "ether")),
+                "balance_wei": row["balance"], "block": row["block"]}
+
+    def nickname(self, player: str) -> str | None:
+        """Nickname from NicknameRegistered / bet events; None if the player never showed up."""
+        row = self._db().execute("SELECT nickname FROM leaderboard WHERE player = ?", (player.lower(),)).fetchone()
+        return row["nickname"] if row and row["nickname"] else None
+
+    def vault_balances(self, players: list[str]) -> dict[str, int]:
+        """Indexed vault balances (wei) of many players at once; players never seen are missing."""
+        db, found = self._db(), {}
+        for i in range(0, len(players), 500):
+            chunk = [p.lower() for p in players[i:i + 500]]
+            rows = db.execute(f"SELECT player, balance FROM vault_balances WHERE player IN "
+                              f"({','.join('?' * len(chunk))})", chunk)
+            found.update((r["player"], int(r["balance"])) for r in rows)
+        return found
+
+# ═══════════════════════════════════════════════════
+#  Shared State (ROLE=api / ROLE=keeper deployments)
+# ═══════════════════════════════════════════════════
+
+class LeaseLost(RuntimeError):
+    """A keeper write or send carried a fencing token that is no longer the lease's current one."""
+
+class SharedState:
+    """Cross-process state in one SQLite file (WAL) for split API / keeper deployments.
+
+    - lease:   keeper leader election (holder, fencing token, expiry)
+    - kv:      latest snapshots (market, AI predictions, workflows)
+    - bots:    per-player bot state; mutate() runs inside the write transaction,
+               so concurrent updates from different processes never lose fields
+    - events:  SSE event log every process tails and re-publishes to its clients
+    - jobs:    keeper work queued by API workers (manual bot bets)
+    - wallets: deposit wallets, first writer wins
+
+    kv and bots rows carry a global sequence number so followers fetch only
+    what changed since their last poll. Writers serialize on BEGIN IMMEDIATE.
+
+    Keeper writes pass the lease's fencing token: inside the write
+    transaction the lease must still be held by this node under that token
+    (and a kv row must not carry a newer one), else LeaseLost. A keeper that
+    was paused past its lease can't overwrite its successor's state.
+    """
+
+    EVENT_RETENTION_SEC = 3600
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS seq (id INTEGER PRIMARY KEY, n INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, holder TEXT, token INTEGER, expires_at REAL);
+        CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, seq INTEGER, token INTEGER);
+        CREATE INDEX IF NOT EXISTS kv_seq ON kv (seq);
+        CREATE TABLE IF NOT EXISTS bots (player TEXT PRIMARY KEY, state TEXT, seq INTEGER);
+        CREATE INDEX IF NOT EXISTS bots_seq ON bots (seq);
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, event TEXT, player TEXT, data TEXT, ts REAL
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, payload TEXT, created_at REAL, taken_by TEXT
+        );
+        CREATE TABLE IF NOT EXISTS wallets (player TEXT PRIMARY KEY, wallet TEXT);
+    """
+
+    def __init__(self, path: str, node_id: str):
+        self.path = path
+        self.node_id = node_id
+        self._local = threading.local()
+        db = self._db()
+        db.executescript(self.SCHEMA)
+        if "token" not in {r[1] for r in db.execute("PRAGMA table_info(kv)")}:
+            db.execute("ALTER TABLE kv ADD COLUMN token INTEGER")   # stores created before fencing
+        db.execute("INSERT OR IGNORE INTO seq (id, n) VALUES (1, 0)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _next_seq(db: sqlite3.Connection) -> int:
+        return db.execute("UPDATE seq SET n = n + 1 WHERE id = 1 RETURNING n").fetchone()[0]
+
+    # ── Lease ──
+
+    def try_lease(self, name: str, ttl: float) -> int | None:
+        """Acquire or renew lease `name` for ttl seconds. Returns the fencing token, or None if held elsewhere."""
+        now = time.time()
+        with self._write() as db:
+            row = db.execute("SELECT holder, token, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != self.node_id and row[2] > now:
+                return None
+            token = row[1] if row and row[0] == self.node_id else (row[1] + 1 if row else 1)
+            db.execute("INSERT OR REPLACE INTO lease (name, holder, token, expires_at) VALUES (?, ?, ?, ?)",
+                       (name, self.node_id, token, now + ttl))
+        return token
+
+    def holds_lease(self, name: str, token: int) -> bool:
+        """True while this node holds lease `name` under `token` and it has not expired."""
+        row = self._db().execute("SELECT holder, token, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+        return bool(row) and row[0] == self.node_id and row[1] == token and row[2] > time.time()
+
+    def _fence(self, db: sqlite3.Connection, token: int, name: str = "keeper"):
+        row = db.execute("SELECT holder, token, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+        if not row or row[0] != self.node_id or row[1] != token or row[2] <= time.time():
+            raise LeaseLost(f"fencing token {token} is stale (lease held by "
+                            f"{row[0] if row else None} with token {row[1] if row else None})")
+
+    def release_lease(self, name: str):
+        with self._write() as db:
+            db.execute("UPDATE lease SET expires_at = 0 WHERE name = ? AND holder = ?", (name, self.node_id))
+
+    def lease_info(self, name: str) -> dict | None:
+        row = self._db().execute("SELECT holder, token, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+        return {"holder": row[0], "token": row[1], "expires_in": round(row[2] - time.time(), 1)} if row else None
+
+    # ── Snapshots ──
+
+    def put(self, key: str, value, token: int | None = None):
+        """Store snapshot `key`; with token, only as the current keeper (LeaseLost otherwise)."""
+        data = json.dumps(value, default=str)
+        with self._write() as db:
+            row = db.execute("SELECT token FROM kv WHERE key = ?", (key,)).fetchone()
+            if token is not None:
+                self._fence(db, token)
+                if row and row[0] is not None and row[0] > token:
+                    raise LeaseLost(f"{key} was already written under token {row[0]} (ours: {token})")
+            else:
+                token = row[0] if row else None   # unfenced writes keep the last keeper's token
+            db.execute("INSERT OR REPLACE INTO kv (key, value, seq, token) VALUES (?, ?, ?, ?)",
+                       (key, data, self._next_seq(db), token))
+
+    def kv_since(self, seq: int) -> list[tuple[str, object, int]]:
+        rows = self._db().execute("SELECT key, value, seq FROM kv WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        return [(k, json.loads(v), s) for k, v, s in rows]
+
+    # ── Bots ──
+
+    def update_bots(self, mutations: dict, default, token: int | None = None) -> dict[str, dict]:
+        """Run mutate(bot) for every player in one write transaction; fenced by `token` if given."""
+        bots = {}
+        with self._write() as db:
+            if token is not None:
+                self._fence(db, token)
+            for player, mutate in mutations.items():
+                row = db.execute("SELECT state FROM bots WHERE player = ?", (player,)).fetchone()
+                bot = {**default(), **json.loads(row[0])} if row else default()
+                mutate(bot)
+                db.execute("INSERT OR REPLACE INTO bots (player, state, seq) VALUES (?, ?, ?)",
+                           (player, json.dumps(bot, default=str), self._next_seq(db)))
+                bots[player] = bot
+        return bots
+
+    def update_bot(self, player: str, mutate, default, token: int | None = None) -> dict:
+        return self.update_bots({player: mutate}, default, token)[player]
+
+    def bots_since(self, seq: int) -> list[tuple[str, dict, int]]:
+        rows = self._db().execute("SELECT player, state, seq FROM bots WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        return [(p, json.loads(s), n) for p, s, n in rows]
+
+    def seed_bots(self, bots: dict[str, dict]):
+        """Import bots not in the store yet (first start from a bot_state.json)."""
+        with self._write() as db:
+            for player, bot in bots.items():
+                db.execute("INSERT OR IGNORE INTO bots (player, state, seq) VALUES (?, ?, ?)",
+                           (player, json.dumps(bot, default=str), self._next_seq(db)))
+
+    # ── Events ──
+
+    def append_event(self, event: str, data: dict, player: str | None):
+        with self._write() as db:
+            db.execute("INSERT INTO events (origin, event, player, data, ts) VALUES (?, ?, ?, ?, ?)",
+                       (self.node_id, event, player, json.dumps(data, default=str), time.time()))
+
+    def events_since(self, event_id: int, limit: int = 1000) -> list[tuple]:
+        return self._db().execute(
+            "SELECT id, origin, event, player, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (event_id, limit),
+        ).fetchall()
+
+    def last_event_id(self) -> int:
+        return self._db().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def prune_events(self):
+        with self._write() as db:
+            db.execute("DELETE FROM events WHERE ts < ?", (time.time() - self.EVENT_RETENTION_SEC,))
+
+    # ── Jobs ──
+
+    def enqueue_job(self, kind: str, payload: dict):
+        with self._write() as db:
+            db.execute("INSERT INTO jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+                       (kind, json.dumps(payload), time.time()))
+
+    def take_jobs(self, kind: str, limit: int = 100) -> list[dict]:
+        with self._write() as db:
+            rows = db.execute("SELECT id, payload FROM jobs WHERE kind = ? AND taken_by IS NULL ORDER BY id LIMIT ?",
+                              (kind, limit)).fetchall()
+            db.executemany("UPDATE jobs SET taken_by = ? WHERE id = ?", [(self.node_id, r[0]) for r in rows])
+        return [json.loads(r[1]) for r in rows]
+
+    # ── Wallets ──
+
+    def get_wallet(self, player: str) -> dict | None:
+        row = self._db().execute("SELECT wallet FROM wallets WHERE player = ?", (player,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_wallet_if_absent(self, player: str, wallet: dict) -> dict:
+        """Store `wallet` unless another process got there first; returns the stored one."""
+        with self._write() as db:
+            db.execute("INSERT OR IGNORE INTO wallets (player, wallet) VALUES (?, ?)", (player, json.dumps(wallet)))
+            return json.loads(db.execute("SELECT wallet FROM wallets WHERE player = ?", (player,)).fetchone()[0])
+
+    def seed_wallets(self, users: dict[str, dict]):
+        with self._write() as db:
+            db.executemany("INSERT OR IGNORE INTO wallets (player, wallet) VALUES (?, ?)",
+                           [(p, json.dumps(w)) for p, w in users.items()])
+
+shared = SharedState(SHARED_STATE_DB, NODE_ID) if ROLE != "all" else None
+
+# Keeper work (resolver, AI loop, batch bets, price ticker, indexer) runs only
+# while this is set in the future. ROLE=all never checks it; ROLE=keeper moves
+# it forward on each lease renewal, with a margin so a stalled renewal stops
+# the keeper before another process can take the lease over.
+_keeper_lease_until = 0.0
+_keeper_token: int | None = None   # fencing token of the lease this process holds
+
+def _fencing_token() -> int | None:
+    return _keeper_token if ROLE == "keeper" else None
+
+def _check_lease():
+    """Re-check the keeper lease right before a send; a keeper paused past its lease gets LeaseLost.
+
+    Also stops the keeper loops at once (until the election thread wins the
+    lease again) rather than at the next renewal.
+    """
+    global _keeper_lease_until
+    if ROLE != "keeper":
+        return
+    token = _keeper_token
+    if token is not None and shared.holds_lease("keeper", token):
+        return
+    _keeper_lease_until = 0.0
+    raise LeaseLost(f"keeper lease lost (token {token})")
+
+def _shared_put(key: str, value):
+    """Publish a snapshot to the shared store, fenced while this process is the keeper."""
+    try:
+        shared.put(key, value, token=_fencing_token())
+    except LeaseLost as e:
+        log.warning(f"[SHARED] Dropped stale write of {key}: {e}")
+
+def _is_keeper() -> bool:
+    """True if this process may do keeper work (always in ROLE=all, lease holder in ROLE=keeper)."""
+    if ROLE == "all":
+        return True
+    return ROLE == "keeper" and time.monotonic() < _keeper_lease_until
+
+# ═══════════════════════════════════════════════════
+#  Event Stream (SSE push to browsers)
+# ═══════════════════════════════════════════════════
+
+class EventHub:
+    """Fan-out of agent events to Server-Sent-Events subscribers.
+
+    Every event is encoded into an SSE frame once and the same bytes are
+    queued for each matching subscriber, so publishing cost does not depend
+    on payload size or on how clients render it. Public events go to every
+    subscriber; player events only to subscribers of that player. A client
+    whose queue is full is dropped instead of slowing the publisher down.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._subs: dict[int, tuple[queue.Queue, str | None]] = {}
+        self._latest: dict[str, bytes] = {}   # last public frame per event name
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, player: str | None = None) -> tuple[int, queue.Queue]:
+        q = queue.Queue(maxsize=self.queue_size)
+        player = player.lower() if player else None
+        with self._lock:
+            sub_id = next(self._ids)
+            self._subs[sub_id] = (q, player)
+            # Late joiners start from the current snapshot instead of polling for it
+            for frame in self._latest.values():
+                q.put_nowait(frame)
+        return sub_id, q
+
+    def unsubscribe(self, sub_id: int):
+        with self._lock:
+            self._subs.pop(sub_id, None)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, event: str, data: dict, player: str | None = None, relay: bool = True):
+        """Queue an event for matching subscribers; relay=True also appends it to the shared log."""
+        player = player.lower() if player else None
+        if relay and shared is not None:
+            shared.append_event(event, data, player)
+        frame = f"id: {next(self._ids)}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+        with self._lock:
+            if player is None:
+                self._latest[event] = frame
+            subs = list(self._subs.items())
+        for sub_id, (q, sub_player) in subs:
+            if player is not None and sub_player != player:
+                continue
+            try:
+                q.put_nowait(frame)
+            except queue.Full:
+                log.warning(f"[SSE] Dropping slow subscriber #{sub_id}")
+                self.unsubscribe(sub_id)
+
+events = EventHub()
+
+def _price_ticker():
+    """Publish price ticks for every market while anyone is listening (API workers' clients count as listening)."""
+    last_price: dict[str, float] = {}
+    while True:
+        time.sleep(PRICE_TICK_SEC)
+        if not _is_keeper() or (shared is None and not events.subscriber_count()):
+            continue
+        for asset in list(markets) or ["btc"]:
+            price = prices.get(asset, max_age=PRICE_TICK_SEC / 2)
+            if price > 0 and price != last_price.get(asset):
+                last_price[asset] = price
+                events.publish("price", {"asset": asset, "price": price, "timestamp": time.time()})
+
 # ═══════════════════════════════════════════════════
 #  Bot State (multi-player auto-betting)
 # ═══════════════════════════════════════════════════
 
-BOT_STATE_FILE = os.path.join(os.path.dirname(__file__), "bot_state.json")
+BOT_STATE_FILE = os.getenv("BOT_STATE_FILE", os.path.join(os.path.dirname(__file__), "bot_state.json"))
 
 # BOTS: dict keyed by player address (lowercase)
 # Each entry: {"active": bool, "max_bet_eth": float, "last_bet_round": int,
 #              "last_prediction": dict|None, "logs": list, "total_bets": int, ...}
+#
+# Concurrency model (copy-on-write):
+#   - Entries are never mutated in place. Writers copy the entry, change the
+#     copy and swap it into BOTS under that player's lock stripe, so updates
+#     for different players run in parallel.
+#   - Readers take no lock: BOTS[p] is always a complete snapshot, never a
+#     half-applied update.
+#   - _bots_lock only guards inserting new players and copying the key set.
 BOTS: dict[str, dict] = {}
 _bots_lock = threading.Lock()
+_BOT_LOCK_STRIPES = 64
+_bot_stripes = [threading.Lock() for _ in range(_BOT_LOCK_STRIPES)]
+_bot_save_lock = threading.Lock()
 
 def _default_bot_state() -> dict:
     return {
@@ -421,19 +2502,95 @@ def _default_bot_state() -> dict:
         "total_bets": 0,
         "wins": 0,
         "losses": 0,
+        # Realized results, filled in by _settle_round after each resolution
+        "wagered_wei": 0,
+        "payout_wei": 0,
+        "last_settled_round": 0,
+        # Markets this bot bets on. Progress fields (last_bet_round,
+        # last_settled_round) of other markets get a _<asset> suffix, see Market.bot_key
+        "markets": [DEFAULT_MARKET],
+        # Strategy overrides on top of STRATEGY_DEFAULTS (set by /api/bot/start)
+        "strategy": {},
     }
 
+# Bot fields the strategy engine reads; changing any of them rebuilds the markets' StrategyTables
+STRATEGY_FIELDS = ("active", "max_bet_eth", "markets", "strategy")
+_strategy_version = 0
+
+def _bump_strategies():
+    global _strategy_version
+    _strategy_version += 1
+
+def _bot_stripe(player: str) -> threading.Lock:
+    return _bot_stripes[hash(player) % _BOT_LOCK_STRIPES]
+
 def _get_bot(player: str) -> dict:
-    """Get or create bot state for a player."""
+    """Get a read-only snapshot of a player's bot state (created on first use)."""
+    p = player.lower()
+    bot = BOTS.get(p)
+    if bot is None:
+        with _bots_lock:
+            bot = BOTS.setdefault(p, _default_bot_state())
+    return bot
+
+def _update_bot(player: str, mutate) -> dict:
+    """Apply `mutate(bot)` to a private copy of the player's bot and publish it.
+
+    With a shared store the mutation runs against the stored copy inside its
+    write transaction, so API workers and the keeper never overwrite each
+    other's fields.
+    """
     p = player.lower()
+    with _bot_stripe(p):
+        old = BOTS.get(p) or {}
+        if shared is not None:
+            bot = shared.update_bot(p, mutate, _default_bot_state)
+            with _bots_lock:
+                BOTS[p] = bot
+        else:
+            # Deep: published snapshots share nothing (strategy, markets, last_prediction, logs) with the copy
+            bot = copy.deepcopy(_get_bot(p))
+            mutate(bot)
+            BOTS[p] = bot
+        if any(old.get(f) != bot.get(f) for f in STRATEGY_FIELDS):
+            _bump_strategies()
+    return bot
+
+def _update_bots(mutations: dict, fenced: bool = False) -> dict[str, dict]:
+    """_update_bot for many players at once: one shared-store write transaction instead of one per player.
+
+    fenced=True marks keeper bookkeeping (bet results, settlement), which a
+    keeper that lost its lease must not write (LeaseLost).
+    """
+    mutations = {p.lower(): fn for p, fn in mutations.items()}
+    if shared is None:
+        return {p: _update_bot(p, fn) for p, fn in mutations.items()}
+    stripes = sorted({hash(p) % _BOT_LOCK_STRIPES for p in mutations})
+    with ExitStack() as stack:
+        for i in stripes:
+            stack.enter_context(_bot_stripes[i])
+        old = {p: BOTS.get(p) or {} for p in mutations}
+        bots = shared.update_bots(mutations, _default_bot_state, token=_fencing_token() if fenced else None)
+        with _bots_lock:
+            BOTS.update(bots)
+    if any(old[p].get(f) != bot.get(f) for p, bot in bots.items() for f in STRATEGY_FIELDS):
+        _bump_strategies()
+    return bots
+
+def _bots_snapshot() -> dict[str, dict]:
+    """Shallow copy of BOTS; entries are immutable snapshots, so this is consistent per player."""
     with _bots_lock:
-        if p not in BOTS:
-            BOTS[p] = _default_bot_state()
-        return BOTS[p]
+        return dict(BOTS)
 
 def _load_bot_state():
-    """Restore bot state from file (survives agent restarts)."""
+    """Restore bot state from the shared store, or from file (survives agent restarts)."""
     global BOTS
+    if shared is not None:
+        stored = {p: {**_default_bot_state(), **b} for p, b, _ in shared.bots_since(0)}
+        if stored:
+            BOTS = stored
+            log.info(f"[BOT] Loaded {len(BOTS)} bot(s) from shared state")
+            return
     try:
         if os.path.exists(BOT_STATE_FILE):
             with open(BOT_STATE_FILE, "r") as f:
@@ -457,56 +2614,621 @@ def _load_bot_state():
                     log.info(f"[BOT] Migrated old single-player state for {p[:10]}...")
             else:
                 # New multi-player format
-                BOTS = saved
+                BOTS = {p: {**_default_bot_state(), **b} for p, b in saved.items()}
             active_count = sum(1 for b in BOTS.values() if b.get("active"))
             log.info(f"[BOT] Restored {len(BOTS)} bot(s), {active_count} active")
     except Exception as e:
         log.error(f"[BOT] Failed to load state: {e}")
+    if shared is not None and BOTS:
+        shared.seed_bots(BOTS)
+    _bump_strategies()
 
 def _save_bot_state():
-    """Persist bot state to file."""
+    """Persist bot state to file (atomic replace, serialized between writers).
+
+    No-op with a shared store: every _update_bot is already durable there.
+    """
+    if shared is not None:
+        return
     try:
-        with _bots_lock:
-            data = dict(BOTS)
-        with open(BOT_STATE_FILE, "w") as f:
-            json.dump(data, f, default=str)
+        data = _bots_snapshot()
+        with _bot_save_lock:
+            tmp = BOT_STATE_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, default=str)
+            os.replace(tmp, BOT_STATE_FILE)
     except Exception as e:
         log.error(f"[BOT] Failed to save state: {e}")
 
-def bot_add_log(player: str, msg: str, save: bool = False):
+def _log_appender(entries: list[str], then=None):
+    """Mutation appending `entries` to a bot's log (last 50 kept), after `then(bot)` if given."""
+    def _append(bot):
+        if then is not None:
+            then(bot)
+        bot["logs"] = (bot["logs"] + entries)[-50:]
+    return _append
+
+def _publish_bot_logs(bots: dict[str, dict], entries: dict[str, list[str]]):
+    for player, bot in bots.items():
+        for entry in entries.get(player, []):
+            events.publish("bot", {"player": player, "log": entry, "active": bot["active"],
+                                   "total_bets": bot.get("total_bets", 0)}, player=player)
+            log.info(f"[BOT:{player[:8]}] {entry[9:]}")
+
+def bot_add_logs(messages: list[tuple[str, str]], save: bool = False):
+    """bot_add_log for many (player, msg) pairs, written in one store transaction."""
+    if not messages:
+        return
     ts = time.strftime("%H:%M:%S")
-    entry = f"{ts} {msg}"
-    bot = _get_bot(player)
-    bot["logs"].append(entry)
-    if len(bot["logs"]) > 50:
-        bot["logs"] = bot["logs"][-50:]
-    log.info(f"[BOT:{player[:8]}] {msg}")
+    entries: dict[str, list[str]] = {}
+    for player, msg in messages:
+        entries.setdefault(player.lower(), []).append(f"{ts} {msg}")
+    bots = _update_bots({p: _log_appender(e) for p, e in entries.items()})
+    _publish_bot_logs(bots, entries)
     if save:
         _save_bot_state()
 
+def bot_add_log(player: str, msg: str, save: bool = False):
+    bot_add_logs([(player, msg)], save=save)
+
 def _get_active_players() -> list[str]:
     """Return list of player addresses with active bots."""
-    with _bots_lock:
-        return [p for p, b in BOTS.items() if b.get("active")]
+    return [p for p, b in _bots_snapshot().items() if b.get("active")]
 
 # Load saved bot state from previous run
 _load_bot_state()
+startup.mark("bot_state")
 
 # ═══════════════════════════════════════════════════
-#  API Server
+#  Bot Strategy Engine (one vectorized pass per round)
 # ═══════════════════════════════════════════════════
 
-app = Flask(__name__)
-CORS(app, origins=[
-    'https://predict402.cloud',
-    'http://localhost:5173',
-    'http://localhost:3000',
-])
+# A bot's strategy = these defaults overridden by its "strategy" field. The
+# defaults reproduce the original single strategy: follow the market's model,
+# full / half / quarter of max bet at >=75% / >=60% / lower confidence.
+STRATEGY_DEFAULTS = {
+    "signal": "ml",             # "ml" | "llm" (frontend BotConfig.strategy)
+    "model": None,              # AI_MODELS key for this market's asset; otherwise the market's model
+    "mode": "follow",           # "follow" the model's direction or bet "contrarian"
+    "min_confidence": 0.0,      # % of time-adjusted confidence below which the bot sits out
+    "high_confidence": 75.0,    # tier thresholds (time-adjusted confidence, %)
+    "mid_confidence": 60.0,
+    "bet_scaling": {"high": 100, "mid": 50, "low": 25},   # % of max bet per tier; 0 skips the round
+    # LLM bot settings from the bot builder, kept with the bot
+    "temperature": 0.2,
+    "max_tokens": 200,
+    "system_prompt": "",
+}
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+def _strategy_of(bot: dict) -> dict:
+    return {**STRATEGY_DEFAULTS, **(bot.get("strategy") or {})}
+
+def _parse_strategy(data: dict, current: dict | None) -> dict:
+    """Strategy overrides from a /api/bot/start body (frontend BotConfig field names).
+
+    Fields missing from the body keep their `current` value. Raises
+    ValueError on bad input.
+    """
+    s = {**(current or {})}
+    if "strategy" in data:
+        if data["strategy"] not in ("ml", "llm"):
+            raise ValueError("strategy must be 'ml' or 'llm'")
+        s["signal"] = data["strategy"]
+    if "model" in data:
+        if data["model"] and data["model"] not in AI_MODELS and data["model"] not in AVAILABLE_MODELS:
+            raise ValueError(f"Unknown model {data['model']!r}")
+        s["model"] = data["model"] or None
+    if "mode" in data:
+        if data["mode"] not in ("follow", "contrarian"):
+            raise ValueError("mode must be 'follow' or 'contrarian'")
+        s["mode"] = data["mode"]
+    for key in ("min_confidence", "high_confidence", "mid_confidence"):
+        if key in data:
+            value = float(data[key])
+            if not 0 <= value <= 100:
+                raise ValueError(f"{key} must be within 0..100")
+            s[key] = value
+    if "bet_scaling" in data:
+        scaling = {tier: float(data["bet_scaling"].get(tier, STRATEGY_DEFAULTS["bet_scaling"][tier]))
+                   for tier in ("high", "mid", "low")}
+        if not all(0 <= v <= 100 for v in scaling.values()):
+            raise ValueError("bet_scaling values must be within 0..100 (% of max bet)")
+        s["bet_scaling"] = scaling
+    if "temperature" in data:
+        s["temperature"] = min(2.0, max(0.0, float(data["temperature"])))
+    if "max_tokens" in data:
+        s["max_tokens"] = min(4096, max(1, int(data["max_tokens"])))
+    if "system_prompt" in data:
+        s["system_prompt"] = str(data["system_prompt"] or "")[:4000]
+    merged = {**STRATEGY_DEFAULTS, **s}
+    if merged["mid_confidence"] > merged["high_confidence"]:
+        raise ValueError("mid_confidence must not exceed high_confidence")
+    return s
+
+
+class StrategyTable:
+    """One market's active bots as NumPy columns, so a round's decisions are a single vector pass.
+
+    Columns are rebuilt only after a strategy field of some bot changed
+    (_strategy_version). The per-round bet marker is updated in place by
+    mark_bet(), so the steady-state cost per round is a few vector ops
+    whatever the number of bots.
+    """
+
+    def __init__(self, market: "Market"):
+        self.market = market
+        self.cols = self.columns(market, [], {})
+        self.index: dict[str, int] = {}
+        self._version = -1
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def columns(m: "Market", players: list[str], bots: dict[str, dict]) -> dict:
+        strategies = [_strategy_of(bots[p]) for p in players]
+        model_keys = [s["model"] if s["signal"] == "ml" and AI_MODELS.get(s["model"] or "", {}).get("asset") == m.asset
+                      else m.model_key for s in strategies]
+        models = sorted({k for k in model_keys if k})
+        slot = {k: i for i, k in enumerate(models)}
+        last_key = m.bot_key("last_bet_round")
+        return {
+            "players": players,
+            "models": models,
+            "model": np.array([slot.get(k, -1) for k in model_keys], dtype=np.int64),   # -1: no signal
+            "max_bet": np.array([bots[p].get("max_bet_eth", 0.01) for p in players], dtype=float),
+            "min_conf": np.array([s["min_confidence"] for s in strategies], dtype=float),
+            "high": np.array([s["high_confidence"] for s in strategies], dtype=float),
+            "mid": np.array([s["mid_confidence"] for s in strategies], dtype=float),
+            "scale": np.array([[s["bet_scaling"]["high"], s["bet_scaling"]["mid"], s["bet_scaling"]["low"]]
+                               for s in strategies], dtype=float).reshape(len(players), 3) / 100.0,
+            "contrarian": np.array([s["mode"] == "contrarian" for s in strategies], dtype=bool),
+            "last_bet": np.array([bots[p].get(last_key, 0) for p in players], dtype=np.int64),
+        }
+
+    def refresh(self) -> dict:
+        """Current columns, rebuilt first if any bot's strategy changed since the last build."""
+        if self._version != _strategy_version:
+            with self._lock:
+                version = _strategy_version
+                if self._version != version:
+                    bots = _bots_snapshot()
+                    players = sorted(p for p, b in bots.items()
+                                     if b.get("active") and self.market.asset in b.get("markets", [DEFAULT_MARKET]))
+                    self.cols = self.columns(self.market, players, bots)
+                    self.index = {p: i for i, p in enumerate(players)}
+                    self._version = version
+        return self.cols
+
+    def mark_bet(self, players: list[str], round_id: int):
+        cols, index = self.cols, self.index
+        rows = [index[p] for p in players if p in index]
+        if rows:
+            cols["last_bet"][rows] = np.maximum(cols["last_bet"][rows], round_id)
+
+
+def decide_bets(cols: dict, signals: dict[str, dict], time_factor: float, round_id: int,
+                force: bool = False):
+    """Evaluate every bot in `cols` against this round's model signals.
+
+    Returns (rows, size_eth, is_up, adjusted_confidence) for the bots that
+    bet. force=True ignores whether a bot already bet this round (manual
+    trigger).
+    """
+    models = cols["models"]
+    # One trailing "no signal" slot, so model index -1 needs no special case
+    up = np.array([signals[k]["direction"] == "UP" if k in signals else False for k in models] + [False])
+    conf = np.array([signals[k]["confidence"] if k in signals else np.nan for k in models] + [np.nan])
+    slot = cols["model"]
+    adjusted = conf[slot] * (0.5 + 0.5 * time_factor)
+    scale = cols["scale"]
+    tier = np.select([adjusted >= cols["high"], adjusted >= cols["mid"]], [scale[:, 0], scale[:, 1]], scale[:, 2])
+    size = np.maximum(0.001, cols["max_bet"] * tier * (0.4 + 0.6 * time_factor))
+    bet = (tier > 0) & (adjusted >= cols["min_conf"])   # NaN (no signal) compares False
+    bet &= np.isfinite(size)   # a NaN/inf max_bet stored before validation skips that bot only
+    if not force:
+        bet &= cols["last_bet"] < round_id
+    is_up = up[slot] ^ cols["contrarian"]
+    rows = np.flatnonzero(bet)
+    return rows, size[rows], is_up[rows], adjusted[rows]
+
+# ═══════════════════════════════════════════════════
+#  Admission Control (bounded pools + per-player rate limits)
+# ═══════════════════════════════════════════════════
+
+# Expensive endpoint → (workers, queue, workers during keeper priority, requests/min per player, burst).
+# Override one with ADMISSION_<NAME>=workers,queue,priority_workers,per_min,burst.
+ADMISSION_LIMITS = {
+    "predict":   (4, 8, 2, 6, 3),      # /api/predict: paid x402 LLM call
+    "ai_fresh":  (2, 4, 0, 6, 2),      # /api/ai/predict running a workflow (fresh / nothing cached)
+    "bot_bet":   (2, 8, 0, 6, 2),      # /api/bot/bet: synchronous placeBetBatch
+    "user_init": (4, 16, 1, 10, 5),    # /api/user/init: wallet creation + balance reads
+}
+for _name in ADMISSION_LIMITS:
+    if os.getenv(f"ADMISSION_{_name.upper()}"):
+        ADMISSION_LIMITS[_name] = tuple(float(v) for v in os.getenv(f"ADMISSION_{_name.upper()}").split(","))
+
+
+class Overloaded(Exception):
+    """Request refused by admission control; becomes a 429/503 with Retry-After."""
+
+    def __init__(self, status: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class AdmissionPool:
+    """Bounded concurrency for one expensive endpoint.
+
+    At most `workers` requests run at once and at most `queue` more wait
+    (up to ADMISSION_QUEUE_WAIT_SEC) for a slot; beyond that the request is
+    refused right away with a 503, so a burst queues briefly instead of
+    piling up threads on the RPC/LLM backends. While round-critical keeper
+    work is running (Admission.keeper_priority) only `priority_workers` run.
+    Each client IP also gets a token bucket of `per_min` requests/minute
+    with `burst` capacity; an empty bucket is a 429. The bucket is not keyed
+    by the request's player: that is client-chosen, so rotating it would
+    reset the limit.
+    """
+
+    def __init__(self, name: str, workers: int, queue: int, priority_workers: int, per_min: float, burst: float):
+        self.name = name
+        self.workers = int(workers)
+        self.queue = int(queue)
+        self.priority_workers = int(priority_workers)
+        self.rate = per_min / 60.0
+        self.burst = burst
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 1.0                   # EWMA seconds per request, for Retry-After
+        self._buckets: dict[str, list[float]] = {}   # client IP → [tokens, last refill]
+        self._cond = threading.Condition()
+
+    def limit(self) -> int:
+        return self.priority_workers if admission.keeper_priority() else self.workers
+
+    def _take_token(self, client: str):
+        now = time.monotonic()
+        with self._cond:
+            if len(self._buckets) > 10_000:
+                # Forget clients whose bucket has refilled anyway
+                self._buckets = {p: b for p, b in self._buckets.items()
+                                 if b[0] + (now - b[1]) * self.rate < self.burst}
+            tokens, last = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = [tokens, now]
+                raise Overloaded(429, (1 - tokens) / self.rate, "rate_limited")
+            self._buckets[client] = [tokens - 1, now]
+
+    def _retry_after(self) -> float:
+        return self.service_time * (self.waiting + 1) / max(1, self.limit())
+
+    @contextmanager
+    def admit(self, client: str):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        try:
+            self._take_token(client)
+            start = time.monotonic()
+            with self._cond:
+                if self.active >= self.limit() and self.waiting >= self.queue:
+                    raise Overloaded(503, self._retry_after(), "queue_full")
+                self.waiting += 1
+                try:
+                    # Short waits: the limit drops and recovers with the keeper priority window
+                    while self.active >= self.limit():
+                        remaining = start + ADMISSION_QUEUE_WAIT_SEC - time.monotonic()
+                        if remaining <= 0:
+                            raise Overloaded(503, self._retry_after(), "queue_timeout")
+                        self._cond.wait(min(remaining, 0.25))
+                finally:
+                    self.waiting -= 1
+                self.active += 1
+        except Overloaded as e:
+            metrics.inc("admission_rejected_total", endpoint=self.name, reason=e.reason)
+            raise
+        metrics.observe("admission_wait_seconds", time.monotonic() - start, endpoint=self.name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+                self._cond.notify()
+
+    def status(self) -> dict:
+        return {"active": self.active, "waiting": self.waiting, "limit": self.limit(),
+                "workers": self.workers, "queue": self.queue, "priority_workers": self.priority_workers,
+                "per_min": self.rate * 60, "burst": self.burst, "service_time": round(self.service_time, 3)}
+
+
+class Admission:
+    """Admission pools of the expensive endpoints plus the keeper priority signal.
+
+    Keeper priority holds from ADMISSION_PRIORITY_LEAD_SEC before a market's
+    round ends until its next round is synced (capped at
+    ADMISSION_PRIORITY_MAX_SEC), and while the keeper runs round-critical
+    work in this process (`with admission.critical():`). The round window
+    comes from the market state cache, so ROLE=api workers back off too.
+    """
+
+    def __init__(self, limits: dict):
+        self.pools = {name: AdmissionPool(name, *spec) for name, spec in limits.items()}
+        self._critical = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def critical(self):
+        with self._lock:
+            self._critical += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._critical -= 1
+
+    def keeper_priority(self) -> bool:
+        if self._critical:
+            return True
+        now = time.time()
+        return any(m.state["end_time"] and
+                   -ADMISSION_PRIORITY_LEAD_SEC <= now - m.state["end_time"] <= ADMISSION_PRIORITY_MAX_SEC
+                   for m in markets.values())
+
+    def admit(self, name: str):
+        """Enter pool `name`, rate-limited per client IP (X-Forwarded-For behind TRUSTED_PROXIES)."""
+        return self.pools[name].admit(request.remote_addr or "-")
+
+    def status(self) -> dict:
+        return {"enabled": ADMISSION_ENABLED, "keeper_priority": self.keeper_priority(),
+                "pools": {name: pool.status() for name, pool in self.pools.items()}}
+
+admission = Admission(ADMISSION_LIMITS)
+
+def admitted(name: str):
+    """Route decorator: run the view inside admission pool `name`; a malformed player address is a 400."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            player = (request.get_json(silent=True) or {}).get("player") or request.args.get("player")
+            if player is not None and not (isinstance(player, str) and Web3.is_address(player)):
+                return jsonify({"error": "Invalid player address"}), 400
+            with admission.admit(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ═══════════════════════════════════════════════════
+#  API Server
+# ═══════════════════════════════════════════════════
+
+app = Flask(__name__)
+CORS(app, origins=[
+    'https://predict402.cloud',
+    'http://localhost:5173',
+    'http://localhost:3000',
+])
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+# Long-lived or admin routes that would always look slow
+SLOW_WATCH_SKIP = {"/api/stream", "/api/admin/profile"}
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    if SLOW_REQUEST_MS > 0 and request.path not in SLOW_WATCH_SKIP:
+        g.slow_watch = profiler.watch(f"{request.method} {request.path}", SLOW_REQUEST_MS)
+        g.slow_watch.__enter__()
+
+@app.teardown_request
+def _end_slow_watch(exc):
+    watch = g.pop("slow_watch", None)
+    if watch is not None:
+        watch.__exit__(None, None, None)
+
+@app.after_request
+def _record_request_timing(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - start,
+                        route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.errorhandler(Overloaded)
+def _overloaded(e: Overloaded):
+    message = "Too many requests" if e.status == 429 else "Server busy"
+    response = jsonify({"error": f"{message}, retry in {e.retry_after}s", "reason": e.reason,
+                        "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
+
+@app.route("/api/admission/status", methods=["GET"])
+def admission_status():
+    """Admission pools (in flight, queued, current limit) and whether keeper priority is on."""
+    return jsonify(admission.status())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (RPC, price, inference, LLM, tx and HTTP timings)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/rpc/status", methods=["GET"])
+def rpc_status():
+    """RPC endpoints best-first with their EWMA latency, consecutive errors and cooldown."""
+    return jsonify({"endpoints": rpc_pool.status()})
+
+@app.route("/api/traces", methods=["GET"])
+def round_traces():
+    """Round transition traces of ?market=: ?round=N for one, otherwise the most recent ?limit=."""
+    try:
+        round_id = _int_arg("round")
+        limit = _int_arg("limit", 20, cap=500)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    m = markets.get(request.args.get("market", DEFAULT_MARKET).lower())
+    market_tracer = m.tracer if m else tracer
+    if round_id is not None:
+        trace = market_tracer.get(round_id)
+        return (jsonify(trace), 200) if trace else (jsonify({"error": "No trace for round"}), 404)
+    return jsonify({"traces": market_tracer.recent(limit)})
+
+# ──── Admin: profiling ────
+
+def _admin_denied():
+    """Error response unless the request carries ADMIN_TOKEN (Authorization: Bearer ... or X-Admin-Token)."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints disabled (ADMIN_TOKEN not set)"}), 404
+    auth = request.headers.get("Authorization", "")
+    token = auth[7:] if auth.startswith("Bearer ") else request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Forbidden"}), 403
+    return None
+
+@app.route("/api/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """Sample every thread for ?seconds= (max 60) every ?interval_ms=; folded stacks for flamegraph.pl / speedscope.
+
+    ?thread= keeps threads whose name contains it (e.g. market-btc, llm, Thread-).
+    """
+    if (denied := _admin_denied()) is not None:
+        return denied
+    try:
+        seconds = min(60.0, max(0.1, float(request.args.get("seconds", 10))))
+        interval = min(1.0, max(0.001, float(request.args.get("interval_ms", 10)) / 1000))
+    except ValueError:
+        return jsonify({"error": "Invalid seconds / interval_ms"}), 400
+    try:
+        folded, samples = profiler.profile(seconds, interval, request.args.get("thread", ""))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    log.info(f"[PROFILE] {samples} samples over {seconds:g}s by {request.remote_addr}")
+    return Response(folded, mimetype="text/plain", headers={"X-Profile-Samples": str(samples)})
+
+@app.route("/api/admin/slow", methods=["GET"])
+def admin_slow():
+    """Stacks captured for slow requests / round phases (newest last). ?id=<id>&format=folded for one capture."""
+    if (denied := _admin_denied()) is not None:
+        return denied
+    if request.args.get("id"):
+        capture = next((c for c in profiler.captures if str(c["id"]) == request.args["id"]), None)
+        if capture is None:
+            return jsonify({"error": "No such capture"}), 404
+        if request.args.get("format") == "folded":
+            return Response("".join(f"{stack} {n}\n" for stack, n in capture["stacks"].items()), mimetype="text/plain")
+        return jsonify(capture)
+    try:
+        limit = _int_arg("limit", 20, cap=SLOW_CAPTURES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"thresholds_ms": {"request": SLOW_REQUEST_MS, "round": SLOW_ROUND_MS},
+                    "captures": [{k: v for k, v in c.items() if k != "stacks"} for c in profiler.slow(limit)]})
+
+rpc_pool = RPCPool(RPC_URLS, pool_size=RPC_POOL_SIZE, hedge_after=RPC_HEDGE_AFTER_MS / 1000)
+w3 = Web3(rpc_pool)
 user_mgr = UserManager(w3)
-predict_contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=PREDICT_ABI) if CONTRACT_ADDRESS else None
-vault_contract = w3.eth.contract(address=VAULT_ADDRESS, abi=VAULT_ABI) if VAULT_ADDRESS else None
+
+class Market:
+    """One registered market: contracts, AI model, round tracer and round-state cache.
+
+    `state` is copy-on-write like BOTS: the dict bound to it is never
+    mutated, writers publish a new one under the market's lock and readers
+    grab the current reference once and use it without locking.
+    """
+
+    def __init__(self, asset: str, contract: str, vault: str, model_key: str | None):
+        self.asset = asset
+        self.tag = f"[{asset.upper()}]"
+        self.address = Web3.to_checksum_address(contract)
+        self.predict = w3.eth.contract(address=self.address, abi=PREDICT_ABI)
+        self.vault = w3.eth.contract(address=Web3.to_checksum_address(vault), abi=VAULT_ABI) if vault else None
+        self.model_key = model_key
+        self.tracer = tracer if asset == DEFAULT_MARKET else RoundTracer(ROUND_TRACE_FILE, market=asset)
+        self.strategies = StrategyTable(self)
+        self.state = {
+            "strike_price": 0.0,
+            "round_id": 0,
+            "end_time": 0,
+            "up_pool": 0,
+            "down_pool": 0,
+        }
+        self._lock = threading.Lock()
+        # Settlement watermark: every round <= settled_through is settled; the
+        # settler thread works through (settled_through, settle_target] in order
+        self.settled_through = 0
+        self.settle_target = 0
+        self.settler: threading.Thread | None = None
+        self.settle_lock = threading.Lock()
+
+    def advance(self, round_id: int, **fields) -> bool:
+        """Publish new fields for `round_id`, unless the cache already moved past it."""
+        with self._lock:
+            if round_id < self.state["round_id"]:
+                return False
+            new_state = {**self.state, "round_id": round_id, **fields}
+            if new_state == self.state:
+                return True
+            self.state = new_state
+        events.publish("market", {**new_state, "market": self.asset})
+        if shared is not None:
+            _shared_put(f"market:{self.asset}", new_state)
+        return True
+
+    def adopt(self, state: dict):
+        """Take a snapshot published by another process (no event, no store write)."""
+        with self._lock:
+            if state.get("round_id", 0) >= self.state["round_id"]:
+                self.state = state
+
+    @property
+    def bot_name(self) -> str:
+        """Display name of this market's bots, after the AI model they follow (e.g. "BTC XGBoost ML")."""
+        return f"{AI_MODELS[self.model_key]['name']} ML" if self.model_key else f"{self.asset.upper()} bot"
+
+    def bot_key(self, field: str) -> str:
+        """Per-market bot progress field; the default market keeps the original names."""
+        return field if self.asset == DEFAULT_MARKET else f"{field}_{self.asset}"
+
+    def players(self) -> list[str]:
+        """Active players whose bot bets on this market."""
+        return [p for p in _get_active_players() if self.asset in _get_bot(p).get("markets", [DEFAULT_MARKET])]
+
+def _build_markets() -> dict[str, Market]:
+    registry = {}
+    for asset in MARKET_ASSETS:
+        prefix = "" if asset == "btc" else f"{asset.upper()}_"
+        contract = os.getenv(f"{prefix}CONTRACT_ADDRESS", "")
+        if not contract:
+            log.warning(f"[MARKET] {asset.upper()}: {prefix}CONTRACT_ADDRESS not set, market disabled")
+            continue
+        if asset not in PRICE_URLS_BINANCE:
+            raise SystemExit(f"No price source for market {asset!r} (see PRICE_URLS_BINANCE)")
+        model_key = os.getenv(f"{asset.upper()}_AI_MODEL") or next(
+            (k for k, v in AI_MODELS.items() if v["asset"] == asset), None)
+        if model_key and model_key not in AI_MODELS:
+            raise SystemExit(f"{asset.upper()}_AI_MODEL: unknown model {model_key!r}")
+        registry[asset] = Market(asset, contract, os.getenv(f"{prefix}VAULT_ADDRESS", ""), model_key)
+        log.info(f"[MARKET] {asset.upper()}: {contract} | vault {os.getenv(f'{prefix}VAULT_ADDRESS') or '-'} | "
+                 f"model {model_key or '-'}")
+    return registry
+
+markets = _build_markets()
+default_market = markets.get(DEFAULT_MARKET)
+predict_contract = default_market.predict if default_market else None
+vault_contract = default_market.vault if default_market else None
+
+def _market_arg(value: str | None) -> Market | None:
+    return markets.get((value or DEFAULT_MARKET).lower())
+
+# History, rounds, leaderboard and vault balances are served for the default market
+indexer = ChainIndexer(
+    w3, default_market.address, default_market.vault.address if default_market.vault else None, INDEXER_DB,
+    start_block=int(INDEXER_START_BLOCK) if INDEXER_START_BLOCK else None,
+) if default_market else None
 
 ai_oracle = None
 if PRIVATE_KEY:
@@ -516,25 +3238,18 @@ if PRIVATE_KEY:
     except Exception as e:
         log.error(f"[AI] Failed to init oracle: {e}")
 
-# Market state cache (+ thread lock for safe access from auto_resolve thread)
-MARKET_STATE = {
-    "strike_price": 0.0,
-    "round_id": 0,
-    "end_time": 0,
-    "up_pool": 0,
-    "down_pool": 0,
-}
-_market_lock = threading.Lock()
+startup.mark("clients")
 
 # ──── User Endpoints ────
 
 @app.route("/api/user/init", methods=["POST"])
+@admitted("user_init")
 def init_user():
     player = request.json.get("player")
     if not player:
         return jsonify({"error": "No player"}), 400
     wallet = user_mgr.get_or_create_wallet(player)
-    balances = user_mgr.get_balances(wallet["address"])
+    balances = user_mgr.cached_balances(wallet["address"])
     return jsonify({"deposit_address": wallet["address"], "balances": balances})
 
 @app.route("/api/user/balance", methods=["GET"])
@@ -543,11 +3258,16 @@ def get_balance():
     wallet = user_mgr.get_wallet(player)
     if not wallet:
         return jsonify({"error": "User not found"}), 404
-    return jsonify(user_mgr.get_balances(wallet["address"]))
+    try:
+        max_age = float(request.args["max_age"]) if request.args.get("max_age") else None
+    except ValueError:
+        return jsonify({"error": "Invalid max_age"}), 400
+    return jsonify(user_mgr.cached_balances(wallet["address"], max_age=max_age))
 
 # ──── Ask Oracle (x402 LLM — user hint) ────
 
 @app.route("/api/predict", methods=["POST"])
+@admitted("predict")
 def predict():
     """Ask LLM via x402 — gives user a hint on direction. NOT removed."""
     player = request.json.get("player")
@@ -555,17 +3275,43 @@ def predict():
     wallet = user_mgr.get_wallet(player)
     if not wallet:
         return jsonify({"error": "Deposit wallet not found. Init first."}), 400
-    bals = user_mgr.get_balances(wallet["address"])
-    if bals["ousdc"] < 0.01:
+    ensemble = model_name == "ensemble"
+    if model_name is not None and not ensemble and model_name not in AVAILABLE_MODELS:
+        return jsonify({"error": f"Unknown model. Available: ensemble, {', '.join(AVAILABLE_MODELS)}"}), 400
+    models = request.json.get("models")
+    if ensemble:
+        # Every entry is a paid completion on the shared pool: known names only, each once, bounded count
+        if models is None:
+            models = [name for name in LLM_ENSEMBLE_MODELS if name in AVAILABLE_MODELS]
+        elif not isinstance(models, list) or not models or not all(isinstance(name, str) for name in models):
+            return jsonify({"error": "models must be a non-empty list of model names"}), 400
+        models = list(dict.fromkeys(models))
+        unknown = [name for name in models if name not in AVAILABLE_MODELS]
+        if unknown:
+            return jsonify({"error": f"Unknown model(s): {', '.join(unknown)}"}), 400
+        if len(models) > len(LLM_ENSEMBLE_MODELS):
+            return jsonify({"error": f"At most {len(LLM_ENSEMBLE_MODELS)} models per ensemble"}), 400
+        if request.json.get("mode", LLM_ENSEMBLE_MODE) not in ("vote", "first"):
+            return jsonify({"error": "mode must be 'vote' or 'first'"}), 400
+    bals = user_mgr.cached_balances(wallet["address"])
+    if bals["ousdc"] < 0.01 * (len(models) if ensemble else 1):
         return jsonify({"error": "Insufficient OUSDC balance. Please deposit."}), 402
     try:
         user_oracle = X402Oracle(wallet["private_key"])
-        data = user_oracle.get_prediction(model_name)
+        if ensemble:
+            data = user_oracle.get_ensemble(models, mode=request.json.get("mode"))
+        else:
+            data = user_oracle.get_prediction(model_name)
         return jsonify(data)
     except Exception as e:
         log.error(f"Predict error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/predict/stats", methods=["GET"])
+def predict_stats():
+    """Per-model LLM latency (EWMA), errors and agreement with ensemble answers."""
+    return jsonify({"models": X402Oracle.stats(), "ensemble": LLM_ENSEMBLE_MODELS, "mode": LLM_ENSEMBLE_MODE})
+
 # ──── AI Model Prediction ────
 
 @app.route("/api/ai/predict", methods=["POST"])
@@ -580,8 +3326,9 @@ def ai_predict():
         if model_key:
             if model_key not in AI_MODELS:
                 return jsonify({"error": f"Unknown model: {model_key}"}), 400
-            if fresh or not ai_oracle.get_cached_prediction(model_key):
-                prediction = ai_oracle.run_prediction(model_key)
+            if (fresh or not ai_oracle.get_cached_prediction(model_key)) and _is_keeper():
+                with admission.admit("ai_fresh"):
+                    prediction = ai_oracle.run_prediction(model_key)
             else:
                 prediction = ai_oracle.get_cached_prediction(model_key)
         else:
@@ -589,9 +3336,15 @@ def ai_predict():
             if not asset_models:
                 return jsonify({"error": f"No models for asset '{asset}'"}), 400
             prediction = ai_oracle.get_prediction_for_asset(asset)
-            if not prediction or fresh:
-                prediction = ai_oracle.run_prediction(asset_models[0])
+            if (not prediction or fresh) and _is_keeper():
+                with admission.admit("ai_fresh"):
+                    prediction = ai_oracle.run_prediction(asset_models[0])
+        if not prediction:
+            # API workers never run inference; they serve what the keeper published
+            return jsonify({"error": "No prediction yet"}), 503
         return jsonify(prediction)
+    except Overloaded:
+        raise
     except Exception as e:
         log.error(f"AI predict error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -619,6 +3372,7 @@ def ai_status():
     return jsonify({
         "status": "active",
         "workflows": ai_oracle.workflows,
+        "renewals": ai_oracle.renewal_status(),
         "predictions": {k: {
             "direction": v["direction"], "confidence": v["confidence"],
             "predicted_return": v["predicted_return"], "timestamp": v["timestamp"],
@@ -632,28 +3386,45 @@ def bot_start():
     """Start the auto-betting bot for a player."""
     data = request.json or {}
     player = data.get("player")
-    max_bet = float(data.get("max_bet_eth", 0.01))
     if not player:
         return jsonify({"error": "No player address"}), 400
-    bot = _get_bot(player)
-    bot["active"] = True
-    bot["max_bet_eth"] = max_bet
-    bot_add_log(player, f"Bot started | max bet: {max_bet} ETH")
+    try:
+        max_bet = float(data.get("max_bet_eth", 0.01))
+    except (TypeError, ValueError):
+        max_bet = math.nan
+    if not math.isfinite(max_bet) or max_bet <= 0:
+        return jsonify({"error": "max_bet_eth must be a positive number"}), 400
+    requested = data.get("markets")
+    if requested is not None and (not isinstance(requested, list) or not all(isinstance(a, str) for a in requested)):
+        return jsonify({"error": "markets must be a list of market names"}), 400
+    bot_markets = list(dict.fromkeys(a.lower() for a in requested or _get_bot(player).get("markets", [DEFAULT_MARKET])))
+    unknown = [a for a in bot_markets if a not in markets]
+    if unknown:
+        return jsonify({"error": f"Unknown market(s): {', '.join(unknown)}. "
+                                 f"Available: {', '.join(markets) or 'none'}"}), 400
+    try:
+        strategy = _parse_strategy(data, _get_bot(player).get("strategy"))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid strategy: {e}"}), 400
+    _update_bot(player, lambda b: b.update(active=True, max_bet_eth=max_bet, markets=bot_markets, strategy=strategy))
+    effective = _strategy_of({"strategy": strategy})
+    bot_add_log(player, f"Bot started | max bet: {max_bet} ETH | markets: {', '.join(a.upper() for a in bot_markets)} | "
+                        f"{effective['signal'].upper()} {effective['model'] or 'market model'} {effective['mode']} "
+                        f"| min conf {effective['min_confidence']:.0f}%")
     _save_bot_state()
 
     # If there's an active round right now, we can try to join late
-    round_id = MARKET_STATE.get("round_id", 0)
-    end_time = MARKET_STATE.get("end_time", 0)
     now = int(time.time())
-    if round_id > 0 and end_time > now:
+    if any(m.state["round_id"] > 0 and m.state["end_time"] > now
+           for a, m in markets.items() if a in bot_markets):
          # Optionally trigger batch just for this player?
          # _process_batch_bets([player]) 
          # But safer to wait for next round cycle.
          bot_add_log(player, "Bot activated. Waiting for next round cycle...")
 
     active_count = len(_get_active_players())
-    return jsonify({"status": "started", "running": True, "max_bet_eth": max_bet,
-                    "active_bots": active_count})
+    return jsonify({"status": "started", "running": True, "max_bet_eth": max_bet, "markets": bot_markets,
+                    "strategy": effective, "active_bots": active_count})
 
 @app.route("/api/bot/stop", methods=["POST"])
 def bot_stop():
@@ -662,8 +3433,7 @@ def bot_stop():
     player = data.get("player")
     if not player:
         return jsonify({"error": "No player address"}), 400
-    bot = _get_bot(player)
-    bot["active"] = False
+    _update_bot(player, lambda b: b.update(active=False))
     bot_add_log(player, "Bot stopped by user")
     _save_bot_state()
     return jsonify({"status": "stopped", "running": False})
@@ -678,191 +3448,226 @@ def bot_status():
         return jsonify({"active_bots": len(active), "players": active})
 
     bot = _get_bot(player)
-
-    # Get on-chain nickname
-    player_nick = ""
-    if predict_contract:
-        try:
-            player_nick = predict_contract.functions.nicknames(
-                Web3.to_checksum_address(player)
-            ).call()
-        except:
-            pass
+    player_nick = _nickname(player)
+    bot_markets = bot.get("markets", [DEFAULT_MARKET])
+    # ?market= picks which of the bot's markets the name and last round refer to (default: its first)
+    m = _market_arg(request.args.get("market") or (bot_markets[0] if bot_markets else None))
+    if not m and request.args.get("market"):
+        return jsonify({"error": f"Unknown market. Available: {', '.join(markets)}"}), 404
 
     return jsonify({
         "running": bot["active"],
         "active": bot["active"],
         "player": player,
         "player_nickname": player_nick,
-        "bot_name": "BTC XGBoost ML",
+        "market": m.asset if m else None,
+        "bot_name": m.bot_name if m else None,
         "max_bet_eth": bot["max_bet_eth"],
-        "last_bet_round": bot["last_bet_round"],
+        "markets": bot_markets,
+        "strategy": _strategy_of(bot),
+        "last_bet_round": bot.get(m.bot_key("last_bet_round"), 0) if m else bot["last_bet_round"],
         "last_prediction": bot["last_prediction"],
         "logs": bot["logs"][-20:],
         "total_bets": bot.get("total_bets", 0),
         "wins": bot.get("wins", 0),
         "losses": bot.get("losses", 0),
+        **_bot_pnl(bot),
     })
 
 @app.route("/api/bot/bet", methods=["POST"])
+@admitted("bot_bet")
 def bot_bet_manual():
-    """Manually trigger bot to place a bet this round."""
+    """Manually trigger bot to place a bet this round (?market=, default market otherwise)."""
     data = request.json or {}
     player = data.get("player")
     if not player:
         return jsonify({"error": "No player address"}), 400
+    m = _market_arg(data.get("market"))
+    if not m:
+        return jsonify({"error": "Unknown market"}), 404
     bot = _get_bot(player)
     if not bot["active"]:
         return jsonify({"error": "Bot not started for this player"}), 400
-    result = _process_batch_bets([player])
-    if result:
-        return jsonify({"status": "Batch triggered for user"})
+    if not _is_keeper():
+        shared.enqueue_job("bet", {"player": player.lower(), "market": m.asset})
+        return jsonify({"status": "queued"}), 202
+    placed = _process_batch_bets(m, [player])
+    if placed:
+        return jsonify({"status": "Batch triggered for user", "placed": placed})
     return jsonify({"error": "Could not place bet (see logs)"}), 500
 
-def _process_batch_bets(specific_players: list[str] = None):
+def _process_batch_bets(m: Market, specific_players: list[str] = None, trace_round: int | None = None) -> int:
     """
-    Batch Betting: Collects all active players, runs AI ONCE, puts bets in ONE tx.
-    Safely handles gas reimbursement from Vault.
+    Batch Betting: evaluates every active bot of market `m` in one vectorized pass (StrategyTable,
+    decide_bets), runs each model the bots follow ONCE and sends one placeBetBatch per direction
+    (chunks of BOT_BATCH_MAX_USERS). Safely handles gas reimbursement from Vault.
+    specific_players: manual trigger, bets for these players even if they already bet this round.
+    trace_round: round whose transition trace gets the prediction/batch spans.
+    Returns the number of players whose bet was mined.
     """
-    if not ai_oracle or not vault_contract or not predict_contract:
-        log.error("BatchBet: Oracle or contracts not configured")
-        return
+    if not ai_oracle or not m.vault or not m.model_key:
+        log.error(f"[BATCH] {m.tag} Oracle, vault or AI model not configured")
+        return 0
 
     # 1. Identify players to bet for
+    cols = m.strategies.refresh()
     if specific_players:
-        targets = specific_players
-    else:
-        targets = _get_active_players()
-    
-    if not targets:
-        return
+        wanted = {p.lower() for p in specific_players}
+        rows = [i for i, p in enumerate(cols["players"]) if p in wanted]
+        cols = {k: v if k == "models" else [v[i] for i in rows] if k == "players" else v[rows]
+                for k, v in cols.items()}
+    targets = cols["players"]
 
-    log.info(f"[BATCH] Processing bets for {len(targets)} players...")
-
-    # 2. Run AI Prediction (Once for everyone)
-    try:
-        # Use cached if fresh (<60s) or run new
-        # For new round start, usually we want fresh
-        prediction = ai_oracle.run_prediction("btc_xgboost")
-    except Exception as e:
-        log.error(f"[BATCH] AI prediction failed: {e}")
-        return
+    if not targets:
+        return 0
 
-    direction = prediction["direction"]
-    confidence = prediction["confidence"]
-    predicted_return = prediction["predicted_return"]
-    is_up = direction == "UP"
+    log.info(f"[BATCH] {m.tag} Processing bets for {len(targets)} players...")
 
-    # 3. Time factor (check round time)
+    # 2. Run AI Prediction (once per model the bots follow, not per bot)
+    signals = {}
+    for model_key in cols["models"]:
+        try:
+            signals[model_key] = ai_oracle.run_prediction(model_key)
+        except Exception as e:
+            log.error(f"[BATCH] {m.tag} AI prediction failed ({model_key}): {e}")
+    if not signals:
+        if trace_round is not None:
+            m.tracer.mark(trace_round, "prediction_failed", error="no model signal")
+        return 0
+    if trace_round is not None:
+        main_signal = signals.get(m.model_key) or next(iter(signals.values()))
+        m.tracer.mark(trace_round, "prediction_done", direction=main_signal["direction"], players=len(targets))
+
+    # 3. Time factor (check round time) — one snapshot for the whole batch
+    market = m.state
+    round_id = market["round_id"]
     now = int(time.time())
-    end_time = MARKET_STATE.get("end_time", 0)
+    end_time = market.get("end_time", 0)
     remaining_sec = max(0, end_time - now)
-    
+
     if remaining_sec < 45:
         log.warning(f"[BATCH] Skipping - too late in round ({remaining_sec}s left)")
-        return
-        
+        return 0
+
     time_factor = min(1.0, remaining_sec / 300)
-    
-    # 4. Prepare Batch Arrays
-    batch_users = []
-    batch_amounts = []
-    
-    # We need to calculate bets for each user
-    for player in targets:
-        bot = _get_bot(player)
-        
-        # Skip if already bet this round (unless manual force)
-        if not specific_players and bot["last_bet_round"] >= MARKET_STATE["round_id"]:
-            continue
 
-        # Logic for amount
-        max_bet = bot["max_bet_eth"]
-        
-        # Scale by confidence
-        adjusted_conf = confidence * (0.5 + 0.5 * time_factor)
-        if adjusted_conf >= 75:
-            bet_eth = max_bet
-        elif adjusted_conf >= 60:
-            bet_eth = max_bet * 0.5
+    # 4. Decide every bot at once
+    with metrics.timer("bot_decision_seconds", market=m.asset):
+        rows, sizes, ups, adjusted = decide_bets(cols, signals, time_factor, round_id, force=bool(specific_players))
+    if not len(rows):
+        log.info(f"[BATCH] {m.tag} No bot qualifies this round.")
+        return 0
+    players = [targets[i] for i in rows]
+    amounts = [w3.to_wei(float(eth), 'ether') for eth in sizes]
+    model_of = [cols["models"][cols["model"][i]] for i in rows]
+
+    # 5. Check Vault balances: indexed first, RPC only for players the index can't vouch for
+    # (the contract skips underfunded players anyway, this only keeps them out of the tx)
+    gas_buffer = w3.to_wei(0.0005, 'ether')
+    balances = indexer.vault_balances(players) if indexer and m is default_market else {}
+    recheck = [p for p, wei in zip(players, amounts) if balances.get(p, -1) < wei + gas_buffer]
+    if recheck:
+        def _balance(player):
+            try:
+                return player, m.vault.functions.getBalance(Web3.to_checksum_address(player)).call()
+            except Exception as e:
+                bot_add_log(player, f"Balance check error: {e}")
+                return player, None
+        with ThreadPoolExecutor(max_workers=min(8, len(recheck))) as pool:
+            balances.update(pool.map(_balance, recheck))
+
+    batches = {True: [], False: []}
+    messages = []
+    for player, wei, eth, is_up, conf, model_key in zip(players, amounts, sizes, ups, adjusted, model_of):
+        vault_bal = balances.get(player)
+        direction = "UP" if is_up else "DOWN"
+        if vault_bal is None:
+            continue
+        if vault_bal >= wei + gas_buffer:
+            batches[bool(is_up)].append((player, wei, float(conf), signals[model_key]["predicted_return"]))
+            messages.append((player, f"Queueing Batch Bet: {m.asset.upper()} {direction} | {eth:.4f} ETH"))
         else:
-            bet_eth = max_bet * 0.25
-        
-        # Scale by time
-        bet_eth = max(0.001, bet_eth * (0.4 + 0.6 * time_factor))
-        bet_wei = w3.to_wei(bet_eth, 'ether')
-        
-        # Check Balance (Vault)
-        try:
-            # We add a buffer for gas fee estimation (e.g. 0.0002 ETH)
-            # The contract also checks this, but we want to fail fast here to avoid revert
-            vault_bal = vault_contract.functions.getBalance(Web3.to_checksum_address(player)).call()
-            gas_buffer = w3.to_wei(0.0005, 'ether') 
-            
-            if vault_bal >= bet_wei + gas_buffer:
-                batch_users.append(Web3.to_checksum_address(player))
-                batch_amounts.append(bet_wei)
-                
-                # Log intent
-                bot_add_log(player, f"Queueing Batch Bet: {direction} | {bet_eth:.4f} ETH")
-            else:
-                bot_add_log(player, f"Skipping: Insufficient Vault Balance ({w3.from_wei(vault_bal,'ether')} < {bet_eth}+gas)")
-        except Exception as e:
-            bot_add_log(player, f"Balance check error: {e}")
-            
-    if not batch_users:
+            messages.append((player, f"Skipping: Insufficient Vault Balance ({w3.from_wei(vault_bal,'ether')} < {eth:.4f}+gas)"))
+    bot_add_logs(messages)
+
+    chunks = [(is_up, batch[i:i + BOT_BATCH_MAX_USERS])
+              for is_up, batch in batches.items() for i in range(0, len(batch), BOT_BATCH_MAX_USERS)]
+    if not chunks:
         log.info("[BATCH] No valid bets to place.")
-        return
+        return 0
 
-    # 5. Send Transaction
-    try:
-        log.info(f"[BATCH] Sending TX for {len(batch_users)} users. Direction: {direction}")
-        acct = Account.from_key(PRIVATE_KEY)
-        nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-        
-        # Gas estimation: ~100k + 100k per user?
-        # Let's use estimateGas or hardcode safe limit
-        gas_limit = 200000 + (len(batch_users) * 150000)
-        
-        tx = vault_contract.functions.placeBetBatch(
-            batch_users, batch_amounts, is_up
-        ).build_transaction({
-            "from": acct.address,
-            "nonce": nonce,
-            "gas": gas_limit,
-            "gasPrice": w3.eth.gas_price,
-            "chainId": CHAIN_ID,
-        })
-        
-        signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        
-        log.info(f"[BATCH] Tx Sent: {tx_hash.hex()}")
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=45)
-        
-        if receipt.status == 1:
-            log.info("[BATCH] Tx Success!")
-            # Update state for all included users
-            for i, user_cs in enumerate(batch_users):
-                player_addr = user_cs.lower()
-                bot = _get_bot(player_addr)
-                bot["total_bets"] = bot.get("total_bets", 0) + 1
-                bot["last_bet_round"] = MARKET_STATE["round_id"]
-                bot["last_prediction"] = {
-                    "direction": direction,
-                    "confidence": adjusted_conf / 100.0,
-                    "predicted_return": predicted_return,
-                    "bet_amount_eth": float(w3.from_wei(batch_amounts[i], 'ether')),
-                    "tx_hash": tx_hash.hex(),
-                    "timestamp": time.time()
-                }
-                bot_add_log(player_addr, f"Batch Bet Executed! Tx: {tx_hash.hex()[:10]}...")
-            _save_bot_state()
-        else:
-            log.error("[BATCH] Tx Failed (Reverted)")
-            
-    except Exception as e:
-         log.error(f"[BATCH] Transaction error: {e}")
+    # 6. Send Transactions (one per direction/chunk, in parallel)
+    def _send(is_up: bool, chunk: list[tuple]) -> int:
+        batch_users = [Web3.to_checksum_address(p) for p, *_ in chunk]
+        batch_amounts = [wei for _, wei, *_ in chunk]
+        direction = "UP" if is_up else "DOWN"
+        try:
+            log.info(f"[BATCH] {m.tag} Sending TX for {len(batch_users)} users. Direction: {direction}")
+
+            # Safe limit until gas_oracle has learned the per-user cost from mined batches
+            gas_limit = 200000 + (len(batch_users) * 150000)
+
+            # Journal key: one intent per (round, set of players); meta lets a restart finish the bookkeeping
+            batch_id = Web3.keccak(text=",".join(sorted(batch_users))).hex()[:10]
+            meta = {"players": [p for p, *_ in chunk], "amounts": batch_amounts, "direction": direction,
+                    "confidences": [conf / 100.0 for *_, conf, _ in chunk],
+                    "returns": [ret for *_, ret in chunk]}
+            key = f"{m.asset}:{round_id}:placeBetBatch:{batch_id}"
+            _, tx_hash, receipt = _send_tx(
+                m.vault.functions.placeBetBatch(batch_users, batch_amounts, is_up),
+                "placeBetBatch", gas=gas_limit, timeout=45, units=len(batch_users),
+                trace=(m.tracer, trace_round, "batch") if trace_round is not None else None,
+                key=key, meta=meta, finish=False,
+            )
+
+            if receipt.status == 1:
+                log.info(f"[BATCH] {m.tag} {direction} Tx Success!")
+                # Done only once the bots are updated; until then the journal keeps it for recovery
+                _record_batch(m, round_id, meta, tx_hash)
+                journal.done(key, "mined")
+                return len(batch_users)
+            log.error(f"[BATCH] {m.tag} {direction} Tx Failed (Reverted)")
+        except LeaseLost as e:
+            # Not a tx failure: whatever was mined stays journaled for the keeper that took over
+            log.warning(f"[BATCH] {m.tag} {direction} Keeper lease lost, leaving the batch to the new keeper: {e}")
+        except Exception as e:
+            log.error(f"[BATCH] {m.tag} {direction} Transaction error: {e}")
+        return 0
+
+    if len(chunks) == 1:
+        return _send(*chunks[0])
+    with ThreadPoolExecutor(max_workers=min(4, len(chunks))) as pool:
+        return sum(pool.map(lambda c: _send(*c), chunks))
+
+
+def _record_batch(m: Market, round_id: int, meta: dict, tx_hash):
+    """Update the bots of a mined placeBetBatch (also run for batches recovered from the journal)."""
+    n = len(meta["players"])
+    # Journal entries written before per-player strategies carry one confidence/return for the batch
+    confidences = meta.get("confidences") or [meta.get("confidence", 0.0)] * n
+    returns = meta.get("returns") or [meta.get("predicted_return", 0.0)] * n
+    entry = f"{time.strftime('%H:%M:%S')} Batch Bet Executed! Tx: {tx_hash.hex()[:10]}..."
+    mutations, entries = {}, {}
+    for player_addr, amount, confidence, predicted_return in zip(meta["players"], meta["amounts"], confidences, returns):
+        last_prediction = {
+            "direction": meta["direction"],
+            "confidence": confidence,
+            "predicted_return": predicted_return,
+            "bet_amount_eth": float(w3.from_wei(amount, 'ether')),
+            "tx_hash": tx_hash.hex(),
+            "timestamp": time.time(),
+            "market": m.asset,
+        }
+        p = player_addr.lower()
+        mutations[p] = _log_appender([entry], then=lambda b, lp=last_prediction: b.update({
+            "total_bets": b.get("total_bets", 0) + 1,
+            m.bot_key("last_bet_round"): round_id,
+            "last_prediction": lp,
+        }))
+        entries[p] = [entry]
+    _publish_bot_logs(_update_bots(mutations, fenced=True), entries)
+    m.strategies.mark_bet(meta["players"], round_id)
+    _save_bot_state()
 
 
 # ──── Price ────
@@ -870,8 +3675,10 @@ def _process_batch_bets(specific_players: list[str] = None):
 @app.route("/api/price", methods=["GET"])
 def get_verified_price():
     asset = request.args.get("asset", "btc").lower()
+    if asset not in PRICE_URLS_BINANCE:
+        return jsonify({"error": f"Unknown asset. Available: {', '.join(PRICE_URLS_BINANCE)}"}), 400
     try:
-        price = get_crypto_price_usd(asset)
+        price = prices.get(asset)
         if price == 0:
             return jsonify({"error": "Could not fetch price"}), 500
         return jsonify({"price": price, "asset": asset})
@@ -882,95 +3689,1000 @@ def get_verified_price():
 
 @app.route("/api/market/status", methods=["GET"])
 def market_status():
-    if not predict_contract:
+    """Round state of ?market= (btc, eth, sui, ...; default market otherwise)."""
+    if not markets:
         return jsonify({"error": "Contract not connected"}), 503
+    m = _market_arg(request.args.get("market"))
+    if not m:
+        return jsonify({"error": f"Unknown market. Available: {', '.join(markets)}"}), 404
     try:
-        # Always read current round from contract to stay in sync
-        on_chain_round = predict_contract.functions.currentRoundId().call()
-        if on_chain_round != MARKET_STATE["round_id"] or MARKET_STATE["end_time"] == 0:
-            with _market_lock:
-                MARKET_STATE["round_id"] = on_chain_round
-                MARKET_STATE["end_time"] = predict_contract.functions.roundEndTime().call()
-                if on_chain_round > 0:
-                    MARKET_STATE["strike_price"] = predict_contract.functions.getStrikePrice().call() / 100.0
+        ai_signal = None
+        if ai_oracle:
+            ai_signal = ai_oracle.get_prediction_for_asset(m.asset)
 
+        # Read-only snapshot: the keeper's resolver keeps it in sync (getRoundInfo) and
+        # API workers adopt it from the shared store; requests never touch the chain
+        market = m.state
         now = int(time.time())
-        remaining = max(0, MARKET_STATE["end_time"] - now)
+        remaining = max(0, market["end_time"] - now)
+        response = {
+            "market": m.asset,
+            "roundId": market["round_id"],
+            "strikePrice": market["strike_price"],
+            "endTime": market["end_time"],
+            "remainingSeconds": remaining,
+            "currentPrice": prices.get(m.asset),
+            "upPool": market["up_pool"],
+            "downPool": market["down_pool"],
+            "aiPrediction": ai_signal,
+        }
 
-        # Read pools
+        return jsonify(response)
+    except Exception as e:
+        log.error(f"Market status error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+# ──── History (served from the local chain index) ────
+
+def _int_arg(name: str, default: int | None = None, cap: int | None = None, minimum: int = 1) -> int | None:
+    """Integer query arg clamped to `cap`; ValueError (→ 400) if not an integer >= minimum.
+
+    SQLite reads a negative LIMIT as "no limit", so values below `minimum`
+    are rejected rather than passed through.
+    """
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return min(value, cap) if cap else value
+
+@app.route("/api/history", methods=["GET"])
+def bet_history():
+    """A player's bets with round outcome and payouts, newest first."""
+    player = request.args.get("player")
+    if not player:
+        return jsonify({"error": "No player address"}), 400
+    if not indexer:
+        return jsonify({"error": "Indexer not running"}), 503
+    try:
+        bets = indexer.bet_history(player, limit=_int_arg("limit", 50, cap=500),
+                                   before_block=_int_arg("before_block"))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination parameter: {e}"}), 400
+    return jsonify({"player": player.lower(), "bets": bets, "indexed_block": indexer.checkpoint()[0]})
+
+@app.route("/api/rounds", methods=["GET"])
+def round_results():
+    """Recent round results (strike, close, pools, winner side), newest first."""
+    if not indexer:
+        return jsonify({"error": "Indexer not running"}), 503
+    try:
+        rounds = indexer.round_results(limit=_int_arg("limit", 20, cap=500),
+                                       before_round=_int_arg("before_round"))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination parameter: {e}"}), 400
+    return jsonify({"rounds": rounds, "indexed_block": indexer.checkpoint()[0]})
+
+@app.route("/api/vault/balance", methods=["GET"])
+def vault_balance():
+    """Vault402 balance for a player as of the last indexed block."""
+    player = request.args.get("player")
+    if not player:
+        return jsonify({"error": "No player address"}), 400
+    if not indexer:
+        return jsonify({"error": "Indexer not running"}), 503
+    balance = indexer.vault_balance(player)
+    if balance is None:
+        return jsonify({"player": player.lower(), "balance_eth": 0.0, "balance_wei": "0", "block": None})
+    return jsonify({"player": player.lower(), **balance})
+
+# ──── Leaderboard (materialized from the chain index) ────
+
+_leaderboard_cache: dict[tuple, dict] = {}   # (version, offset, limit) → response body
+_leaderboard_cache_lock = threading.Lock()
+
+@app.route("/api/leaderboard", methods=["GET"])
+def leaderboard():
+    """Ranking by total earnings then wins. ?top=K or ?offset=&limit= for pages.
+
+    The ranking only changes when a round resolves or a nickname is
+    registered, so responses are cached per (last resolved round, nickname
+    revision, page) and carry both as their ETag. "complete" is false until
+    the index was backfilled from the contract's deployment block; clients
+    should read getLeaderboard() on-chain until then.
+    """
+    if not indexer:
+        return jsonify({"error": "Indexer not running"}), 503
+    try:
+        top = _int_arg("top", cap=500)
+        offset = 0 if top else _int_arg("offset", 0, minimum=0)
+        limit = top or _int_arg("limit", 50, cap=500)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination parameter: {e}"}), 400
+
+    version, complete = indexer.leaderboard_version(), indexer.complete()
+    etag = f'"lb-{version[0]}.{version[1]}{"" if complete else "p"}-{offset}-{limit}"'
+    if request.if_none_match.contains(etag.strip('"')):
+        return Response(status=304, headers={"ETag": etag})
+
+    key = (version, complete, offset, limit)
+    with _leaderboard_cache_lock:
+        body = _leaderboard_cache.get(key)
+    if body is None:
+        body = {"round_id": version[0], "complete": complete, "offset": offset, "limit": limit,
+                **indexer.leaderboard(offset, limit)}
+        with _leaderboard_cache_lock:
+            for stale in [k for k in _leaderboard_cache if k[:2] != key[:2]]:
+                del _leaderboard_cache[stale]
+            _leaderboard_cache[key] = body
+    resp = jsonify(body)
+    resp.headers["ETag"] = etag
+    resp.headers["Cache-Control"] = "public, max-age=5"
+    return resp
+
+# ──── Dashboard (one request for the whole page) ────
+
+# LRU of on-chain lookups, at most NICKNAME_CACHE_SIZE players
+_nicknames: collections.OrderedDict[str, tuple[str, float]] = collections.OrderedDict()
+_nicknames_lock = threading.Lock()
+
+def _nickname(player: str) -> str:
+    """On-chain nickname: chain index first, then a nicknames() call cached for NICKNAME_CACHE_SEC."""
+    p = player.lower()
+    if indexer and (nick := indexer.nickname(p)):
+        return nick
+    with _nicknames_lock:
+        hit = _nicknames.get(p)
+        if hit and time.time() - hit[1] < NICKNAME_CACHE_SEC:
+            _nicknames.move_to_end(p)
+            return hit[0]
+    nick = ""
+    if predict_contract:
         try:
-            up_pool_wei = predict_contract.functions.getUpPool().call()
-            down_pool_wei = predict_contract.functions.getDownPool().call()
-            with _market_lock:
-                MARKET_STATE["up_pool"] = float(w3.from_wei(up_pool_wei, 'ether'))
-                MARKET_STATE["down_pool"] = float(w3.from_wei(down_pool_wei, 'ether'))
+            nick = predict_contract.functions.nicknames(Web3.to_checksum_address(p)).call()
         except Exception:
             pass
+    with _nicknames_lock:
+        _nicknames[p] = (nick, time.time())
+        _nicknames.move_to_end(p)
+        while len(_nicknames) > NICKNAME_CACHE_SIZE:
+            _nicknames.popitem(last=False)
+    return nick
+
+def _dashboard_sections(player: str | None, m: Market, wanted: set[str]) -> dict:
+    sections = {}
+    if "market" in wanted:
+        state = m.state
+        sections["market"] = {
+            "market": m.asset, "roundId": state["round_id"], "strikePrice": state["strike_price"],
+            "endTime": state["end_time"], "upPool": state["up_pool"], "downPool": state["down_pool"],
+            # The price ticker keeps this warm; a miss only happens when nobody has asked for a while
+            "currentPrice": prices.get(m.asset, max_age=max(10.0, 2 * PRICE_TICK_SEC)),
+        }
+    if "ai" in wanted:
+        signal_ = ai_oracle.get_prediction_for_asset(m.asset) if ai_oracle else None
+        sections["ai"] = {k: signal_.get(k) for k in ("model_key", "model", "direction", "confidence",
+                                                     "predicted_return", "timestamp")} if signal_ else None
+    if player and "bot" in wanted:
+        # Read-only: polling a dashboard must not create bot entries
+        bot = BOTS.get(player.lower()) or _default_bot_state()
+        sections["bot"] = {
+            "running": bot["active"], "max_bet_eth": bot["max_bet_eth"],
+            "markets": bot.get("markets", [DEFAULT_MARKET]), "strategy": _strategy_of(bot),
+            "last_bet_round": bot.get(m.bot_key("last_bet_round"), 0), "last_prediction": bot["last_prediction"],
+            "total_bets": bot.get("total_bets", 0), "wins": bot.get("wins", 0), "losses": bot.get("losses", 0),
+            "logs": bot["logs"][-20:], **_bot_pnl(bot),
+        }
+    if player and "balances" in wanted:
+        wallet = user_mgr.get_wallet(player)
+        try:
+            deposit = user_mgr.cached_balances(wallet["address"]) if wallet else None
+        except Exception as e:
+            log.warning(f"[DASHBOARD] Balance read failed: {e}")
+            deposit = None
+        vault = indexer.vault_balance(player) if indexer and m is default_market else None
+        sections["balances"] = {
+            "deposit_address": wallet["address"] if wallet else None,
+            "deposit": deposit,
+            "vault_eth": vault["balance_eth"] if vault else 0.0,
+            "vault_block": vault["block"] if vault else None,
+        }
+    if player and "nickname" in wanted:
+        sections["nickname"] = _nickname(player)
+    return sections
 
-        ai_signal = None
-        if ai_oracle:
-            ai_signal = ai_oracle.get_prediction_for_asset("btc")
-
-        with _market_lock:
-            response = {
-                "roundId": MARKET_STATE["round_id"],
-                "strikePrice": MARKET_STATE["strike_price"],
-                "endTime": MARKET_STATE["end_time"],
-                "remainingSeconds": remaining,
-                "currentPrice": get_btc_price_usd(),
-                "upPool": MARKET_STATE["up_pool"],
-                "downPool": MARKET_STATE["down_pool"],
-                "aiPrediction": ai_signal,
-            }
+DASHBOARD_SECTIONS = ("market", "ai", "bot", "balances", "nickname")
 
-        return jsonify(response)
-    except Exception as e:
-        log.error(f"Market status error: {e}")
-        return jsonify({"error": str(e)}), 500
+@app.route("/api/dashboard", methods=["GET"])
+def dashboard():
+    """Everything the app page polls, from cached snapshots: ?player=&market=&fields=market,ai,...
+
+    The ETag lists one short hash per section. Sending it back as
+    If-None-Match gives 304 when nothing changed; ?since=<etag> (delta
+    mode) returns only the sections whose hash differs, listed in
+    "changed".
+    """
+    player = request.args.get("player")
+    if player:
+        if not Web3.is_address(player):
+            return jsonify({"error": "player must be a 0x address"}), 400
+        player = Web3.to_checksum_address(player)
+    m = _market_arg(request.args.get("market"))
+    if not m:
+        return jsonify({"error": f"Unknown market. Available: {', '.join(markets)}"}), 404
+    wanted = set(DASHBOARD_SECTIONS)
+    if request.args.get("fields"):
+        wanted = {f.strip() for f in request.args["fields"].split(",")}
+        unknown = wanted - set(DASHBOARD_SECTIONS)
+        if unknown:
+            return jsonify({"error": f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                                     f"Available: {', '.join(DASHBOARD_SECTIONS)}"}), 400
+
+    sections = _dashboard_sections(player, m, wanted)
+    hashes = {name: hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()[:8]
+              for name, body in sections.items()}
+    etag = "db-" + ".".join(f"{name[:2]}{hashes[name]}" for name in DASHBOARD_SECTIONS if name in hashes)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    body = {"server_time": time.time(), "player": player.lower() if player else None}
+    since = request.args.get("since", "").strip('"')
+    if since.startswith("db-"):
+        previous = {part[:2]: part[2:] for part in since[3:].split(".")}
+        changed = [name for name in sections if previous.get(name[:2]) != hashes[name]]
+        body["changed"] = changed
+        body.update((name, sections[name]) for name in changed)
+    else:
+        body.update(sections)
+    resp = jsonify(body)
+    resp.headers["ETag"] = f'"{etag}"'
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# ──── Event Stream ────
+
+@app.route("/api/stream", methods=["GET"])
+def event_stream():
+    """SSE feed: market/round/price events for everyone, bot events for ?player=."""
+    player = request.args.get("player")
+    sub_id, q = events.subscribe(player)
+
+    def generate():
+        try:
+            while not _shutdown.is_set():
+                try:
+                    yield q.get(timeout=15)
+                except queue.Empty:
+                    yield b": ping\n\n"   # keep proxies from closing idle streams
+        finally:
+            events.unsubscribe(sub_id)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # ═══════════════════════════════════════════════════
-#  Auto-Resolution (Realtime — fast round transitions)
+#  Keeper Transactions
 # ═══════════════════════════════════════════════════
 
+class GasOracle:
+    """Fee fields and gas limits for keeper transactions.
+
+    Fees: the chain's fee market is read at most once per GAS_PRICE_TTL_SEC
+    (latest block + gas price / priority fee). When blocks carry
+    baseFeePerGas, txs are EIP-1559 with maxFee = 2 * baseFee + tip, so they
+    survive a few rising blocks but only ever pay baseFee + tip. Round-critical
+    txs (urgent=True) scale the tip / legacy price by GAS_URGENT_MULTIPLIER.
+
+    Gas limits: gas used by mined txs is kept per label together with a size
+    hint (bets in the round, users in a batch). Once there are enough
+    samples, the limit is a linear fit of gas over size, plus
+    GAS_LIMIT_HEADROOM, capped at the block gas limit. An out-of-gas revert
+    bumps that label's next limits until a tx succeeds again.
+    """
+
+    HISTORY = 50
+    MIN_SAMPLES = 3
+
+    def __init__(self):
+        self._fees: dict | None = None
+        self._fees_at = 0.0
+        self._lock = threading.Lock()
+        self._history: dict[str, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.HISTORY))
+        self._bump: dict[str, float] = {}
+        self._block_gas_limit = 30_000_000
+
+    def _market(self) -> dict:
+        with self._lock:
+            if self._fees is not None and time.monotonic() - self._fees_at < GAS_PRICE_TTL_SEC:
+                return self._fees
+            block = w3.eth.get_block("latest")
+            self._block_gas_limit = block.get("gasLimit") or self._block_gas_limit
+            base = block.get("baseFeePerGas")
+            if base is None:
+                fees = {"gas_price": w3.eth.gas_price}
+            else:
+                try:
+                    tip = w3.eth.max_priority_fee
+                except Exception:
+                    tip = max(w3.eth.gas_price - base, Web3.to_wei(GAS_MIN_TIP_GWEI, "gwei"))
+                fees = {"base": base, "tip": max(tip, Web3.to_wei(GAS_MIN_TIP_GWEI, "gwei"))}
+            self._fees, self._fees_at = fees, time.monotonic()
+            return fees
+
+    def fees(self, urgent: bool = False) -> dict:
+        """Fee fields for build_transaction (gasPrice, or maxFeePerGas + maxPriorityFeePerGas)."""
+        market = self._market()
+        mult = GAS_URGENT_MULTIPLIER if urgent else 1.0
+        if "gas_price" in market:
+            return {"gasPrice": self._capped(int(market["gas_price"] * mult))}
+        tip = int(market["tip"] * mult)
+        return {"maxPriorityFeePerGas": tip, "maxFeePerGas": self._capped(2 * market["base"] + tip)}
+
+    def bumped(self, fees: dict) -> dict:
+        """Replacement fees: every field up by GAS_REPLACE_BUMP (nodes want >= +10%) and at least the current market."""
+        current = self.fees(urgent=True)
+        return {k: self._capped(max(int(v * GAS_REPLACE_BUMP) + 1, current.get(k, 0))) for k, v in fees.items()}
+
+    @staticmethod
+    def _capped(wei: int) -> int:
+        return min(wei, Web3.to_wei(GAS_MAX_FEE_GWEI, "gwei")) if GAS_MAX_FEE_GWEI else wei
+
+    def gas_limit(self, label: str, default: int, units: int = 1) -> int:
+        samples = list(self._history[label])
+        if len(samples) < self.MIN_SAMPLES:
+            limit = default
+        else:
+            u = np.array([s[0] for s in samples], dtype=float)
+            g = np.array([s[1] for s in samples], dtype=float)
+            if np.ptp(u) > 0:
+                slope, intercept = np.polyfit(u, g, 1)
+                predicted = intercept + max(slope, 0.0) * units
+            else:
+                predicted = g.max() / max(u[0], 1) * max(units, 1)
+            # Never below what a same-or-smaller call already needed
+            seen = g[u <= units].max() if (u <= units).any() else 0
+            limit = int(max(predicted, seen) * GAS_LIMIT_HEADROOM)
+        limit = int(limit * self._bump.get(label, 1.0))
+        return max(21_000, min(limit, self._block_gas_limit))
+
+    def record(self, label: str, units: int, receipt, limit: int):
+        if receipt.status == 1:
+            self._history[label].append((units, receipt.gasUsed))
+            self._bump.pop(label, None)
+        elif receipt.gasUsed >= limit * 0.95:
+            self._bump[label] = min(self._bump.get(label, 1.0) * 1.5, 4.0)
+            log.warning(f"[GAS] {label} ran out of gas at {limit}; next limit x{self._bump[label]:.2f}")
+
+gas_oracle = GasOracle()
+
+class NonceManager:
+    """Keeper nonces handed out locally, so market engines sharing the key never collide.
 
-# Pre-fetched BTC price (updated in the last seconds of each round)
-_prefetched_price = {"value": 0.0, "time": 0}
+    Seeded from the pending transaction count on first use and after
+    reset(). _send_tx resets it whenever a reserved nonce may not have reached
+    the mempool, so a gap or a stale count heals on the next send.
+    """
+
+    def __init__(self):
+        self._next: int | None = None
+        self._lock = threading.Lock()
+
+    def reserve(self, address: str) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = w3.eth.get_transaction_count(address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def peek(self, address: str) -> int:
+        """The nonce the next reserve() would hand out, without taking it."""
+        with self._lock:
+            if self._next is None:
+                self._next = w3.eth.get_transaction_count(address, 'pending')
+            return self._next
+
+    def claim(self, nonce: int) -> bool:
+        """Take exactly `nonce` (a tx signed ahead of time) if it is still the next one."""
+        with self._lock:
+            if self._next != nonce:
+                return False
+            self._next += 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._next = None
+
+nonces = NonceManager()
+
+@functools.lru_cache(maxsize=1)
+def _keeper_address() -> str:
+    return Account.from_key(PRIVATE_KEY).address
+
+class RolloverPrep:
+    """A market's round rollover txs, built and signed before the round expires.
+
+    In the last ROLLOVER_PREP_SEC of a round the resolver calls prepare()
+    every tick. It keeps one template per tx: resolveRound at the next
+    nonce and startNewRound at the one after, with fees, gas limit and
+    calldata encoded for price 0. The price is the first ABI word, so
+    filling it in is a 32-byte patch. Each tick signs the templates for the
+    current prefetched price, and the last ROLLOVER_VARIANTS prices stay
+    signed. At expiry, take() returns the tx signed for the closing price,
+    or patches and signs the template on the spot when the price moved.
+    Templates are rebuilt when the round, nonce, fees or gas limit change.
+    """
+
+    PRICE_WORD = slice(10, 74)   # hex chars of the first argument ("0x" + 4-byte selector before it)
+
+    def __init__(self, market: "Market"):
+        self.market = market
+        self.round_id: int | None = None
+        self.rinfo = None
+        self.templates: dict[str, dict] = {}
+        self.variants: collections.OrderedDict[int, dict] = collections.OrderedDict()
+        self.fired = False
+        self._key = None
+        self._lock = threading.Lock()
+
+    def prepare(self, round_id: int, rinfo, price_cents: int):
+        m = self.market
+        address = _keeper_address()
+        nonce = nonces.peek(address)
+        fees = gas_oracle.fees(urgent=True)
+        resolve_gas = gas_oracle.gas_limit("resolveRound", 2_000_000, rinfo[9] + ROLLOVER_BET_MARGIN)
+        start_gas = gas_oracle.gas_limit("startNewRound", 500_000)
+        key = (round_id, nonce, tuple(sorted(fees.items())), resolve_gas, start_gas)
+        with self._lock:
+            if key != self._key:
+                base = {"from": address, "chainId": CHAIN_ID, **fees}
+                self.templates = {
+                    "resolveRound": m.predict.functions.resolveRound(0, f"binance-{rinfo[1]}").build_transaction(
+                        {**base, "nonce": nonce, "gas": resolve_gas}),
+                    "startNewRound": m.predict.functions.startNewRound(0).build_transaction(
+                        {**base, "nonce": nonce + 1, "gas": start_gas}),
+                }
+                self.variants.clear()
+                self.round_id, self.rinfo, self.fired, self._key = round_id, rinfo, False, key
+            else:
+                self.rinfo = rinfo
+            if price_cents > 0 and price_cents not in self.variants:
+                self.variants[price_cents] = {label: self._sign(tpl, price_cents)
+                                              for label, tpl in self.templates.items()}
+                while len(self.variants) > ROLLOVER_VARIANTS:
+                    self.variants.popitem(last=False)
+
+    def _sign(self, template: dict, price_cents: int) -> dict:
+        data = template["data"]
+        tx = {**template, "data": data[:self.PRICE_WORD.start] + f"{price_cents:064x}" + data[self.PRICE_WORD.stop:]}
+        return {"tx": tx, "raw": w3.eth.account.sign_transaction(tx, PRIVATE_KEY).raw_transaction}
+
+    def ready(self):
+        """(round_id, rinfo) once the prepared round is over and its resolve hasn't been taken yet."""
+        if (self.templates and not self.fired and self.round_id == self.market.state["round_id"]
+                and time.time() >= self.rinfo[1] + 1):
+            return self.round_id, self.rinfo
+        return None
+
+    def take(self, round_id: int, label: str, price_cents: int) -> dict | None:
+        """Signed `label` tx for `price_cents`: pre-signed if the price was seen, else signed now."""
+        with self._lock:
+            if round_id != self.round_id or label not in self.templates:
+                return None
+            if label == "resolveRound":
+                self.fired = True
+            variant = self.variants.get(price_cents, {}).get(label)
+            metrics.inc("rollover_presigned_total", label=label, outcome="hit" if variant else "miss")
+            return variant or self._sign(self.templates[label], price_cents)
+
+    def clear(self):
+        with self._lock:
+            self.templates, self._key, self.round_id = {}, None, None
+            self.variants.clear()
+
+    def next_wake(self, default: float) -> float:
+        """Resolver sleep: wake right at expiry (end + 1s) when that comes sooner than `default`."""
+        if self.templates and not self.fired:
+            until = self.rinfo[1] + 1 - time.time() + 0.005
+            if 0 < until < default:
+                return until
+        return default
+
+class TxJournal:
+    """Append-only journal of keeper transactions and round phases (JSONL, fsync'd per record).
+
+    Records:
+      {"t": "sent", "key", "label", "hash", "tx", "meta"}   one per signed version (fee replacements too)
+      {"t": "done", "key", "outcome"}
+      {"t": "phase", "market", "set": {...}}                 e.g. {"resolved": 41, "attempts": 0}
+
+    `key` names the on-chain intent, "<market>:<round>:<label>[:<suffix>]".
+    _send_tx never sends a key that still has unfinished versions: it waits
+    on those hashes instead, so a restarted (or newly elected) keeper picks
+    up its in-flight transactions without duplicating them. replay() folds
+    the file into `pending` and `phases` and rewrites it to just that, so
+    it stays a few lines long. Only the process doing keeper work replays:
+    at startup in ROLE=all, on winning the lease in ROLE=keeper.
+    """
 
+    def __init__(self, path: str):
+        self.path = path
+        self.pending: dict[str, dict] = {}     # key → {key, label, market, round_id, meta, versions}
+        self.phases: dict[str, dict] = {}      # market → latest round per phase (+ retry counters)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _fold(self, rec: dict):
+        kind = rec["t"]
+        if kind == "sent":
+            key = rec["key"]
+            market, round_id, _ = key.split(":", 2)
+            entry = self.pending.setdefault(key, {"key": key, "label": rec["label"], "market": market,
+                                                  "round_id": int(round_id), "meta": rec.get("meta"),
+                                                  "versions": []})
+            entry["versions"].append({"hash": rec["hash"], "tx": rec["tx"]})
+        elif kind == "done":
+            self.pending.pop(rec["key"], None)
+        elif kind == "phase":
+            self.phases.setdefault(rec["market"], {}).update(rec["set"])
+
+    def _append(self, rec: dict):
+        line = json.dumps(rec, default=str) + "\n"
+        with self._lock:
+            self._fold(rec)
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> int:
+        """(Re)load the journal, compact it, and return how many transactions are in flight."""
+        with self._lock:
+            self.pending, self.phases = {}, {}
+            try:
+                with open(self.path) as f:
+                    for line in f:
+                        try:
+                            self._fold(json.loads(line))
+                        except (ValueError, KeyError):
+                            continue   # torn last line of a crashed write
+            except FileNotFoundError:
+                pass
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                for e in self.pending.values():
+                    for v in e["versions"]:
+                        f.write(json.dumps({"t": "sent", "key": e["key"], "label": e["label"], "hash": v["hash"],
+                                            "tx": v["tx"], "meta": e["meta"]}, default=str) + "\n")
+                for market, fields in self.phases.items():
+                    f.write(json.dumps({"t": "phase", "market": market, "set": fields}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, "a")
+            return len(self.pending)
+
+    def sent(self, key: str, label: str, tx_hash, tx: dict, meta: dict | None = None):
+        self._append({"t": "sent", "key": key, "label": label, "hash": Web3.to_hex(tx_hash), "tx": tx, "meta": meta})
+
+    def done(self, key: str, outcome: str):
+        self._append({"t": "done", "key": key, "outcome": outcome})
+
+    def phase(self, market: str, **fields):
+        self._append({"t": "phase", "market": market, "set": fields})
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            return self.pending.get(key)
 
-def _prefetch_btc_price():
-    """Pre-fetch BTC price so it's ready immediately when round ends."""
+    def inflight(self, market: str) -> list[dict]:
+        with self._lock:
+            return [e for e in self.pending.values() if e["market"] == market]
+
+    def phases_of(self, market: str) -> dict:
+        with self._lock:
+            return dict(self.phases.get(market, {}))
+
+journal = TxJournal(TX_JOURNAL_FILE)   # replayed by main() (ROLE=all) or on winning the keeper lease
+
+def _send_tx(fn_call, label: str, gas: int, nonce: int | None = None, timeout: int = 30,
+             trace: tuple[RoundTracer, int, str] | None = None, urgent: bool = False,
+             replace: bool = False, units: int = 1, key: str | None = None, meta: dict | None = None,
+             prepared: dict | None = None, since: float | None = None, finish: bool = True):
+    """Build, sign and send a keeper transaction, then wait for its receipt.
+
+    Returns (tx, tx_hash, receipt) of the transaction that got mined.
+
+    - Nonce: reserved from `nonces` unless one is given.
+    - Fees: from `gas_oracle`; urgent=True marks a round-critical tx.
+    - Gas limit: learned per label from earlier receipts, scaled by `units`
+      (the call's size). `gas` is the limit used until there are enough
+      samples.
+    - replace=True: if the tx is still pending after GAS_REPLACE_AFTER_SEC,
+      it is re-signed with the same nonce and bumped fees, at most
+      GAS_MAX_REPLACEMENTS times. Any of the hashes can then be mined.
+
+    Send and confirmation latency land in `tx_send_seconds` /
+    `tx_confirm_seconds`. `tx_total` counts outcomes (mined / reverted /
+    timeout / error) per label, and `tx_replacements_total` counts
+    replacements. With trace=(tracer, round_id, prefix) the round trace gets
+    `<prefix>_sent`, `<prefix>_replaced` and `<prefix>_<outcome>` spans. The
+    outcome span carries gas_used when a receipt came back.
+
+    key="<market>:<round>:<label>" journals every signed version (with
+    `meta` for recovery) until the outcome is known. If the key already has
+    versions in flight, e.g. sent before a crash or before a confirmation
+    timeout, nothing new is sent: the call waits on those instead.
+    finish=False leaves a mined key in the journal: the caller marks it
+    done once its own bookkeeping is written, so a crash or LeaseLost in
+    between leaves the tx for the next keeper's recovery.
+
+    prepared={"tx", "raw"} (RolloverPrep.take) is sent as is when its nonce
+    is still the next one; otherwise the call builds and signs as usual.
+    since=<unix time> reports the delay from then (round expiry) until the
+    tx is handed to the RPC pool in `tx_broadcast_lag_seconds`.
+    """
+    if not _is_keeper():
+        raise RuntimeError(f"{label}: not the keeper (role={ROLE})")
+    if key is not None and (entry := journal.get(key)) is not None:
+        result = _reattach(entry, timeout, trace, replace, finish=finish)
+        if result is not None:
+            return result
+    address = _keeper_address()
+    presigned = prepared is not None and nonce is None and nonces.claim(prepared["tx"]["nonce"])
     try:
-        price = get_btc_price_usd()
-        if price > 0:
-            _prefetched_price["value"] = price
-            _prefetched_price["time"] = time.time()
+        if presigned:
+            tx, raw = prepared["tx"], prepared["raw"]
+            nonce, gas_limit = tx["nonce"], tx["gas"]
+            fees = {k: tx[k] for k in ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas") if k in tx}
+        else:
+            if nonce is None:
+                nonce = nonces.reserve(address)
+            gas_limit = gas_oracle.gas_limit(label, gas, units)
+            fees = gas_oracle.fees(urgent=urgent)
+            tx = fn_call.build_transaction({
+                "from": address,
+                "nonce": nonce,
+                "gas": gas_limit,
+                "chainId": CHAIN_ID,
+                **fees,
+            })
+            raw = w3.eth.account.sign_transaction(tx, PRIVATE_KEY).raw_transaction
+        lag = None
+        if since is not None:
+            lag = max(0.0, time.time() - since)
+            metrics.observe("tx_broadcast_lag_seconds", lag, label=label, presigned=str(presigned).lower())
+        _check_lease()
+        with metrics.timer("tx_send_seconds", label=label):
+            tx_hash = w3.eth.send_raw_transaction(raw)
     except Exception:
-        pass
+        nonces.reset()   # the nonce may be unused (gap) or already taken (stale count)
+        raise
+    if key is not None:
+        journal.sent(key, label, tx_hash, tx, meta)
+    if lag is not None:
+        log.info(f"[TX] {label} broadcast {lag * 1000:.1f}ms after expiry ({'pre-signed' if presigned else 'signed now'})")
+    if trace:
+        trace[0].mark(trace[1], f"{trace[2]}_sent", tx=Web3.to_hex(tx_hash), nonce=nonce, gas=gas_limit, **fees,
+                      **({"expiry_lag_ms": round(lag * 1000, 1), "presigned": presigned} if lag is not None else {}))
+
+    start = time.perf_counter()
+    outcome = "error"
+    receipt = None
+    try:
+        if replace:
+            tx, tx_hash, receipt = _await_or_replace([(tx, tx_hash)], label, timeout, trace, key=key)
+        else:
+            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+        outcome = "mined" if receipt.status == 1 else "reverted"
+        gas_oracle.record(label, units, receipt, gas_limit)
+        return tx, tx_hash, receipt
+    except TimeExhausted:
+        outcome = "timeout"
+        raise
+    finally:
+        if key is not None and receipt is not None and (finish or outcome != "mined"):
+            journal.done(key, outcome)
+        metrics.observe("tx_confirm_seconds", time.perf_counter() - start, label=label, outcome=outcome)
+        metrics.inc("tx_total", label=label, outcome=outcome)
+        if trace:
+            trace[0].mark(trace[1], f"{trace[2]}_{outcome}",
+                          **({"gas_used": receipt.gasUsed, "tx": Web3.to_hex(tx_hash)} if receipt is not None else {}))
+
+def _reattach(entry: dict, timeout: float, trace, replace: bool, finish: bool = True):
+    """Wait on a journaled tx's sent versions instead of sending it again.
+
+    Returns (tx, tx_hash, receipt) like _send_tx, or None once it is clear
+    none of them can be mined any more (their nonce went to another tx),
+    in which case the caller sends afresh. finish as in _send_tx.
+    """
+    key, label = entry["key"], entry["label"]
+    versions = [(v["tx"], HexBytes(v["hash"])) for v in entry["versions"]]
+    tx = versions[-1][0]
+    log.info(f"[JOURNAL] {key}: reattaching to {len(versions)} sent version(s), nonce {tx['nonce']}")
+    metrics.inc("tx_reattached_total", label=label)
+    try:
+        # The node may have dropped it while we were away; re-sending the same signed bytes is harmless
+        w3.eth.send_raw_transaction(w3.eth.account.sign_transaction(tx, PRIVATE_KEY).raw_transaction)
+    except Exception:
+        pass   # already known / nonce too low: a version is pending or mined
+    receipt = None
+    outcome = "error"
+    try:
+        tx, tx_hash, receipt = _await_or_replace(versions, label, timeout, trace, key=key, replace=replace)
+        outcome = "mined" if receipt.status == 1 else "reverted"
+        return tx, tx_hash, receipt
+    except TimeExhausted:
+        outcome = "timeout"
+        if w3.eth.get_transaction_count(tx["from"], "latest") > tx["nonce"]:
+            # The nonce is spent but no version has a receipt: it went to another tx
+            outcome = "dropped"
+            log.warning(f"[JOURNAL] {key}: nonce {tx['nonce']} used by another tx, sending afresh")
+            return None
+        raise
+    finally:
+        if (receipt is not None and (finish or outcome != "mined")) or outcome == "dropped":
+            journal.done(key, outcome)
+        metrics.inc("tx_total", label=label, outcome=outcome)
+        if trace:
+            trace[0].mark(trace[1], f"{trace[2]}_{outcome}", reattached=True,
+                          **({"gas_used": receipt.gasUsed, "tx": Web3.to_hex(tx_hash)} if receipt is not None else {}))
+
+def _await_or_replace(versions: list[tuple[dict, HexBytes]], label: str, timeout: float, trace,
+                      key: str | None = None, replace: bool = True):
+    """Poll for a receipt of any of the tx's versions, replacing it with bumped fees while it stays pending."""
+    versions = list(versions)
+    sent_at = time.monotonic()
+    deadline = sent_at + timeout
+    next_replace = time.monotonic() + GAS_REPLACE_AFTER_SEC
+    while time.monotonic() < deadline:
+        for version, h in versions:
+            try:
+                receipt = w3.eth.get_transaction_receipt(h)
+            except TransactionNotFound:
+                continue
+            if receipt is not None:
+                return version, h, receipt
+        if replace and time.monotonic() >= next_replace and len(versions) <= GAS_MAX_REPLACEMENTS:
+            next_replace = time.monotonic() + GAS_REPLACE_AFTER_SEC
+            prev = versions[-1][0]
+            fee_fields = {k: prev[k] for k in ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas") if k in prev}
+            replacement = {**prev, **gas_oracle.bumped(fee_fields)}
+            try:
+                _check_lease()
+                signed = w3.eth.account.sign_transaction(replacement, PRIVATE_KEY)
+                new_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                # "nonce too low" means a previous version just got mined; the next poll finds it
+                log.warning(f"[GAS] {label} replacement not accepted: {e}")
+            else:
+                versions.append((replacement, new_hash))
+                if key is not None:
+                    journal.sent(key, label, new_hash, replacement)
+                metrics.inc("tx_replacements_total", label=label)
+                log.warning(f"[GAS] {label} pending for {time.monotonic() - sent_at:.1f}s, "
+                            f"replaced nonce {prev['nonce']} → {Web3.to_hex(new_hash)[:12]}")
+                if trace:
+                    trace[0].mark(trace[1], f"{trace[2]}_replaced", tx=Web3.to_hex(new_hash), **fee_fields)
+        time.sleep(0.2)
+    raise TimeExhausted(f"{label}: none of {len(versions)} version(s) mined within {timeout}s")
+
+# ═══════════════════════════════════════════════════
+#  Bot Settlement (per-round wins / losses / PnL)
+# ═══════════════════════════════════════════════════
 
+def _round_payouts(rinfo, bets) -> dict[str, list[int]]:
+    """Per-player [wins, losses, wagered_wei, payout_wei] for a resolved round's vault bets.
 
-def _get_best_price() -> float:
-    """Return pre-fetched price if fresh (< 15s), otherwise fetch new."""
-    if time.time() - _prefetched_price["time"] < 15 and _prefetched_price["value"] > 0:
-        return _prefetched_price["value"]
-    return get_btc_price_usd()
+    Mirrors Predict402.resolveRound: winners get their stake back plus a
+    share of 96% of the losing pool, pro rata to time-weighted shares.
+    """
+    up_pool, down_pool, up_shares, down_shares, up_won = rinfo[4], rinfo[5], rinfo[7], rinfo[8], rinfo[11]
+    winner_pool = up_pool if up_won else down_pool
+    loser_pool = down_pool if up_won else up_pool
+    winner_shares = up_shares if up_won else down_shares
+    profit_pool = loser_pool - loser_pool * 4 // 100
+    paid = winner_pool > 0 and winner_shares > 0
+
+    results: dict[str, list[int]] = {}
+    for player, is_up, amount, shares, _nick, _used_ai, from_vault in bets:
+        if not from_vault:
+            continue   # only bot (vault) bets count towards bot performance
+        r = results.setdefault(player.lower(), [0, 0, 0, 0])
+        r[2] += amount
+        if is_up == up_won and paid:
+            r[0] += 1
+            r[3] += amount + shares * profit_pool // winner_shares
+        else:
+            r[1] += 1
+    return results
 
+def _bot_pnl(bot: dict) -> dict:
+    wagered, payout = bot.get("wagered_wei", 0), bot.get("payout_wei", 0)
+    pnl = payout - wagered
+    return {
+        "wagered_eth": float(w3.from_wei(wagered, 'ether')),
+        "payout_eth": float(w3.from_wei(payout, 'ether')),
+        "pnl_eth": _signed_eth(pnl),
+        "roi": pnl / wagered if wagered else 0.0,
+    }
 
-def auto_resolve():
-    """Realtime round resolver — fast transitions, retry on failure."""
-    if not PRIVATE_KEY or not CONTRACT_ADDRESS:
-        log.warning("Auto-resolver disabled: no PRIVATE_KEY or CONTRACT_ADDRESS")
+def _settle_round(m: Market, round_id: int) -> bool:
+    """Settle bot bets of one resolved round. Reads that round once and touches only its bettors.
+
+    Rounds of a market are settled strictly in order (see _settle_pending),
+    so a bot's last_settled_round is a watermark. Returns False if the round
+    could not be read yet.
+    """
+    try:
+        rinfo = m.predict.functions.getRoundInfo(round_id).call()
+        if not rinfo[10]:
+            raise RuntimeError("round not resolved yet")
+        bets = m.predict.functions.getBets(round_id).call()
+    except Exception as e:
+        log.error(f"[SETTLE] {m.tag} Round #{round_id}: {e}")
+        return False
+    settled_key = m.bot_key("last_settled_round")
+
+    ts = time.strftime("%H:%M:%S")
+    applied: set[str] = set()
+    mutations, entries = {}, {}
+    for player, (wins, losses, wagered, payout) in _round_payouts(rinfo, bets).items():
+        if player not in BOTS:
+            continue
+        entry = (f"{ts} {m.asset.upper()} Round #{round_id} settled: {'WON' if wins else 'LOST'} | "
+                 f"PnL {_signed_eth(payout - wagered):+.5f} ETH")
+
+        def _apply(bot, player=player, wins=wins, losses=losses, wagered=wagered, payout=payout, entry=entry):
+            if bot.get(settled_key, 0) >= round_id:
+                return   # already counted (e.g. settled before a restart)
+            bot["wins"] = bot.get("wins", 0) + wins
+            bot["losses"] = bot.get("losses", 0) + losses
+            bot["wagered_wei"] = bot.get("wagered_wei", 0) + wagered
+            bot["payout_wei"] = bot.get("payout_wei", 0) + payout
+            bot[settled_key] = round_id
+            bot["logs"] = (bot["logs"] + [entry])[-50:]
+            applied.add(player)
+
+        mutations[player] = _apply
+        entries[player] = [entry]
+    if mutations:
+        try:
+            bots = _update_bots(mutations, fenced=True)
+        except LeaseLost as e:
+            log.warning(f"[SETTLE] {m.tag} Round #{round_id}: {e}")
+            return False
+        _publish_bot_logs({p: bots[p] for p in applied}, entries)
+    if applied:
+        _save_bot_state()
+    log.info(f"[SETTLE] {m.tag} Round #{round_id}: {len(bets)} bet(s), {len(applied)} bot(s) updated")
+    return True
+
+def _settle_async(m: Market, round_id: int):
+    """Queue every round up to `round_id` for settlement; returns at once."""
+    with m.settle_lock:
+        if not m.settled_through:
+            m.settled_through = round_id - 1   # no backlog scan ran: start at the first live resolution
+        m.settle_target = max(m.settle_target, round_id)
+        if m.settler is None and m.settled_through < m.settle_target:
+            m.settler = threading.Thread(target=_settle_pending, args=(m,), name=f"settle-{m.asset}", daemon=True)
+            m.settler.start()
+
+def _settle_pending(m: Market):
+    """Settle (settled_through, settle_target] one round at a time, retrying a failed read with backoff.
+
+    A round is never skipped, so settling N+1 can't mark N as done.
+    """
+    delay = 1.0
+    while not _shutdown.is_set():
+        with m.settle_lock:
+            round_id = m.settled_through + 1
+            if round_id > m.settle_target:
+                m.settler = None
+                return
+        if _settle_round(m, round_id):
+            with m.settle_lock:
+                m.settled_through = round_id
+            delay = 1.0
+        else:
+            _shutdown.wait(delay)
+            delay = min(delay * 2, 30.0)
+    with m.settle_lock:
+        m.settler = None
+
+def _settle_backlog(m: Market):
+    """Queue rounds that resolved while no keeper was running.
+
+    Starts after the oldest bot's last settled round among bots that bet
+    since then (at most SETTLE_BACKLOG_ROUNDS back) and ends at the round
+    before the current one; the resolver queues the current round itself
+    once it sees it resolved.
+    """
+    settled_key, bet_key = m.bot_key("last_settled_round"), m.bot_key("last_bet_round")
+    try:
+        last = m.predict.functions.currentRoundId().call() - 1
+    except Exception as e:
+        log.error(f"[SETTLE] {m.tag} Backlog check failed: {e}")
         return
+    unsettled = [b.get(settled_key, 0) + 1 for b in _bots_snapshot().values()
+                 if b.get(bet_key, 0) > b.get(settled_key, 0)]
+    first = max(min(unsettled, default=last + 1), last - SETTLE_BACKLOG_ROUNDS + 1, 1)
+    with m.settle_lock:
+        m.settled_through = min(m.settled_through, first - 1) if m.settled_through else first - 1
+    if last >= first:
+        log.info(f"[SETTLE] {m.tag} Settling rounds #{first}..#{last} resolved while the keeper was down")
+        _settle_async(m, last)
+
+# ═══════════════════════════════════════════════════
+#  Auto-Resolution (Realtime — fast round transitions)
+# ═══════════════════════════════════════════════════
+
 
-    log.info("Auto-resolver started")
-    acct = Account.from_key(PRIVATE_KEY)
+# Prices younger than this count as pre-fetched at expiry (fetched in the last seconds of a round)
+PREFETCH_MAX_AGE_SEC = 15
 
+
+# Set on graceful shutdown: the resolver finishes its current tick (incl. any
+# tx it is waiting on) and exits, SSE streams close.
+_shutdown = threading.Event()
+
+def auto_resolve():
+    """Run one round engine per registered market; returns once they have all stopped.
+
+    The engines share the price feed, the keeper nonce manager and the RPC
+    connection. Each one costs ~2 view calls per second while a round runs.
+    """
+    if not PRIVATE_KEY or not markets:
+        log.warning("Auto-resolver disabled: no PRIVATE_KEY or CONTRACT_ADDRESS")
+        return
+    engines = [threading.Thread(target=_run_market, args=(m,), name=f"market-{m.asset}", daemon=True)
+               for m in markets.values()]
+    for t in engines:
+        t.start()
+    for t in engines:
+        t.join()
+    log.info("Auto-resolver stopped")
+
+def _run_market(m: Market):
+    """Realtime round resolver for one market — fast transitions, retry on failure."""
+    log.info(f"{m.tag} Auto-resolver started")
     last_resolved_round = 0
     resolve_attempts = 0       # retry counter per round
     max_retries = 10           # more retries before backing off
     last_dev_fee_check = 0     # check every ~10 min
-
-    while True:
+    last_tick = None
+    recovered = False
+    rollover = RolloverPrep(m)
+
+    while not _shutdown.is_set():
+        if not _is_keeper():
+            # Standby until this process holds the keeper lease
+            last_tick = None
+            recovered = False
+            _shutdown.wait(1)
+            continue
+        if not recovered:
+            # Continue where the journal says the last keeper (maybe this process, before a crash) stopped
+            recovered = True
+            last_resolved_round, resolve_attempts = _recover_market(m)
+            _settle_backlog(m)
+        tick = time.perf_counter()
+        if last_tick is not None:
+            # Loop period; anything above ~1s is resolver lag (slow RPC, sends, backoff)
+            metrics.observe("resolver_loop_period_seconds", tick - last_tick, market=m.asset)
+        last_tick = tick
         try:
             now = int(time.time())
 
@@ -978,80 +4690,100 @@ def auto_resolve():
             if now - last_dev_fee_check > 600:
                 last_dev_fee_check = now
                 try:
-                    time_until = predict_contract.functions.timeUntilNextDevFee().call()
-                    pending = predict_contract.functions.accruedFees().call()
+                    time_until = m.predict.functions.timeUntilNextDevFee().call()
+                    pending = m.predict.functions.accruedFees().call()
                     if time_until == 0 and pending > 0:
-                        log.info(f"[DEV FEE] Distributing {w3.from_wei(pending, 'ether'):.6f} ETH to owner...")
-                        nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-                        tx = predict_contract.functions.distributeDevFee().build_transaction({
-                            "from": acct.address, "nonce": nonce,
-                            "gas": 100_000, "gasPrice": w3.eth.gas_price, "chainId": CHAIN_ID,
-                        })
-                        signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-                        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-                        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
+                        log.info(f"[DEV FEE] {m.tag} Distributing {w3.from_wei(pending, 'ether'):.6f} ETH to owner...")
+                        _, tx_hash, receipt = _send_tx(m.predict.functions.distributeDevFee(),
+                                                       "distributeDevFee", gas=100_000,
+                                                       key=f"{m.asset}:{m.state['round_id']}:distributeDevFee")
                         if receipt.status == 1:
-                            log.info(f"[DEV FEE] Distributed! tx: {tx_hash.hex()[:16]}...")
+                            log.info(f"[DEV FEE] {m.tag} Distributed! tx: {tx_hash.hex()[:16]}...")
                         else:
-                            log.error("[DEV FEE] Distribution tx failed")
+                            log.error(f"[DEV FEE] {m.tag} Distribution tx failed")
                 except Exception as e:
-                    log.error(f"[DEV FEE] Check error: {e}")
+                    log.error(f"[DEV FEE] {m.tag} Check error: {e}")
+
+            # Rollover prepared and the round just expired: resolve right away on last tick's
+            # round info (a revert, e.g. already resolved, takes the normal retry path).
+            expired = rollover.ready()
+            if expired and expired[0] <= last_resolved_round:
+                rollover.clear()
+                expired = None
+            if expired:
+                round_id, rinfo = expired
+                is_resolved = False
+                end_time = rinfo[1]
+            else:
+                # Read on-chain state. roundEndTime() is rounds[currentRoundId].endTime,
+                # so once a round exists getRoundInfo covers it in the same call.
+                # Around expiry these reads gate the transition: hedge them across RPC endpoints.
+                near_end = m.state["end_time"] - now <= RPC_HEDGE_WINDOW_SEC
+                with profiler.watch(f"round:{m.asset} reads", SLOW_ROUND_MS), \
+                        rpc_pool.hedged() if near_end else nullcontext():
+                    round_id = m.predict.functions.currentRoundId().call()
+
+                    # Check if contract says round is already resolved
+                    is_resolved = False
+                    rinfo = None
+                    if round_id > 0:
+                        try:
+                            rinfo = m.predict.functions.getRoundInfo(round_id).call()
+                            is_resolved = rinfo[10]  # resolved field (index 10: startTime,endTime,strikePrice,closingPrice,upPool,downPool,totalPool,upShares,downShares,totalBets,resolved)
+                        except Exception:
+                            pass
+                    end_time = rinfo[1] if rinfo is not None else m.predict.functions.roundEndTime().call()
 
-            # Read on-chain state
-            round_id = predict_contract.functions.currentRoundId().call()
-            end_time = predict_contract.functions.roundEndTime().call()
-            
             if round_id > 0:
                  diff = end_time - now
-                 log.info(f"[DEBUG] R#{round_id} End={end_time} Now={now} Diff={diff}")
-
-            # Check if contract says round is already resolved
-            is_resolved = False
-            if round_id > 0:
-                try:
-                    rinfo = predict_contract.functions.getRoundInfo(round_id).call()
-                    is_resolved = rinfo[10]  # resolved field (index 10: startTime,endTime,strikePrice,closingPrice,upPool,downPool,totalPool,upShares,downShares,totalBets,resolved)
-                except:
-                    pass
+                 log.info(f"[DEBUG] {m.tag} R#{round_id} End={end_time} Now={now} Diff={diff}")
 
             # Sync cache
-            if round_id != MARKET_STATE["round_id"] and round_id > 0:
-                with _market_lock:
-                    MARKET_STATE["round_id"] = round_id
-                    MARKET_STATE["end_time"] = end_time
-                    strike_cents = predict_contract.functions.getStrikePrice().call()
-                    MARKET_STATE["strike_price"] = strike_cents / 100.0
-                log.info(f"Synced to Round #{round_id}, strike: ${MARKET_STATE['strike_price']:.2f}")
-
-            # ── Pre-fetch: start fetching price 10s before round ends ──
+            if round_id != m.state["round_id"] and round_id > 0:
+                strike_cents = rinfo[2] if rinfo is not None else m.predict.functions.getStrikePrice().call()
+                m.advance(round_id, end_time=end_time, strike_price=strike_cents / 100.0)
+                log.info(f"{m.tag} Synced to Round #{round_id}, strike: ${m.state['strike_price']:.2f}")
+
+            # Pools come for free with getRoundInfo — keeps SSE pool updates off the RPC budget
+            if rinfo is not None and not is_resolved:
+                m.advance(round_id,
+                          up_pool=float(w3.from_wei(rinfo[4], 'ether')),
+                          down_pool=float(w3.from_wei(rinfo[5], 'ether')))
+
+            # ── Pre-fetch: refresh the shared price every tick in the last 10s of the round ──
             time_until_end = end_time - now
             if 0 < time_until_end <= 10 and not is_resolved:
-                _prefetch_btc_price()
+                prices.get(m.asset)
+
+            # ── Pre-sign: resolveRound + startNewRound for the current price, so expiry only broadcasts ──
+            if 0 < time_until_end <= ROLLOVER_PREP_SEC and not is_resolved and rinfo is not None:
+                try:
+                    rollover.prepare(round_id, rinfo, int(prices.get(m.asset, max_age=PREFETCH_MAX_AGE_SEC) * 100))
+                except Exception as e:
+                    log.warning(f"{m.tag} Rollover pre-sign failed: {e}")
 
             # ── Case 1: Round resolved on-chain but no new round started ──
             if is_resolved and round_id > 0:
+                rollover.clear()
                 if round_id > last_resolved_round:
                     last_resolved_round = round_id
+                    journal.phase(m.asset, resolved=round_id, attempts=0)
+                _settle_async(m, round_id)
+                m.tracer.mark(round_id, "resolved_found", end_time=end_time)
                 # Start new round immediately
-                price = _get_best_price()
+                price = prices.get(m.asset, max_age=PREFETCH_MAX_AGE_SEC)
                 if price > 0:
-                    log.info(f"Round #{round_id} already resolved. Starting new round...")
+                    m.tracer.mark(round_id, "price_obtained", price=price)
+                    log.info(f"{m.tag} Round #{round_id} already resolved. Starting new round...")
                     price_cents = int(price * 100)
-                    nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-                    tx = predict_contract.functions.startNewRound(price_cents).build_transaction({
-                        "from": acct.address,
-                        "nonce": nonce,
-                        "gas": 300_000,
-                        "gasPrice": w3.eth.gas_price,
-                        "chainId": CHAIN_ID,
-                    })
-                    signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-                    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-                    receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
+                    _, tx_hash, receipt = _send_tx(m.predict.functions.startNewRound(price_cents),
+                                                   "startNewRound", gas=500_000, urgent=True, replace=True,
+                                                   trace=(m.tracer, round_id, "start"),
+                                                   key=f"{m.asset}:{round_id}:startNewRound")
                     if receipt.status == 1:
-                        _sync_new_round()
+                        _sync_new_round(m, prev_round=round_id)
                     else:
-                        log.error("startNewRound failed after resolved round")
+                        log.error(f"{m.tag} startNewRound failed after resolved round")
 
             # ── Case 2: Round expired, needs resolving ──
             # Minimal 1s buffer (block.timestamp is close enough on OG devnet)
@@ -1062,17 +4794,21 @@ def auto_resolve():
 
                 # Retry logic: max 3 attempts per round
                 if resolve_attempts >= max_retries:
-                    log.error(f"Round #{round_id} failed {max_retries} times, waiting 30s before retry...")
+                    log.error(f"{m.tag} Round #{round_id} failed {max_retries} times, waiting 30s before retry...")
                     resolve_attempts = 0  # Reset — try again after pause
                     time.sleep(30)
                     continue
 
-                log.info(f"Round #{round_id} expired. Resolving (attempt {resolve_attempts + 1})...")
+                log.info(f"{m.tag} Round #{round_id} expired. Resolving (attempt {resolve_attempts + 1})...")
+                m.tracer.mark(round_id, "expiry_detected", end_time=end_time, attempt=resolve_attempts + 1)
 
                 # Use pre-fetched price (already loaded in pre-fetch phase)
-                price = _get_best_price()
+                prefetched = prices.age(m.asset) < PREFETCH_MAX_AGE_SEC
+                price = prices.get(m.asset, max_age=PREFETCH_MAX_AGE_SEC)
+                m.tracer.mark(round_id, "price_obtained" if price else "price_unavailable",
+                              price=price, source="prefetch" if prefetched else "fresh")
                 if price == 0:
-                    log.error("Cannot resolve: BTC price unavailable")
+                    log.error(f"{m.tag} Cannot resolve: price unavailable")
                     resolve_attempts += 1
                     time.sleep(2)
                     continue
@@ -1080,107 +4816,185 @@ def auto_resolve():
                 price_cents = int(price * 100)
                 proof = f"binance-{now}"
 
-                nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-                gas_price = w3.eth.gas_price
-
-                # ── Resolve round ──
-                # ── Resolve round ──
-                tx = predict_contract.functions.resolveRound(price_cents, proof).build_transaction({
-                    "from": acct.address,
-                    "nonce": nonce,
-                    "gas": 2_000_000,
-                    "gasPrice": int(gas_price * 1.2),
-                    "chainId": CHAIN_ID,
-                })
-                signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-                tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-                receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
+                # ── Resolve round ── (payouts loop over the round's bets, so size the gas by them)
+                with profiler.watch(f"round:{m.asset} resolve", SLOW_ROUND_MS):
+                    tx, tx_hash, receipt = _send_tx(m.predict.functions.resolveRound(price_cents, proof),
+                                                    "resolveRound", gas=2_000_000, urgent=True, replace=True,
+                                                    units=rinfo[9] if rinfo is not None else 1,
+                                                    trace=(m.tracer, round_id, "resolve"),
+                                                    key=f"{m.asset}:{round_id}:resolveRound",
+                                                    prepared=rollover.take(round_id, "resolveRound", price_cents),
+                                                    since=end_time)
 
                 if receipt.status == 1:
                     last_resolved_round = round_id
                     resolve_attempts = 0
-                    log.info(f"Round #{round_id} resolved! BTC=${price:.2f}")
-
-                    # ── Start new round immediately — reuse price, increment nonce ──
+                    journal.phase(m.asset, resolved=round_id, attempts=0)
+                    log.info(f"{m.tag} Round #{round_id} resolved! {m.asset.upper()}=${price:.2f}")
+                    strike_cents = rinfo[2] if rinfo is not None else int(round(m.state["strike_price"] * 100))
+                    events.publish("round", {"type": "resolved", "market": m.asset, "round_id": round_id,
+                                             "closing_price": price, "up_won": price_cents > strike_cents,
+                                             "tx_hash": tx_hash.hex()})
+                    _settle_async(m, round_id)
+
+                    # ── Start new round immediately — reuse price, next nonce comes from the local manager ──
                     new_price_cents = int(price * 100)
-                    nonce2 = nonce + 1  # Fast nonce — no extra RPC call
-                    tx2 = predict_contract.functions.startNewRound(new_price_cents).build_transaction({
-                        "from": acct.address,
-                        "nonce": nonce2,
-                        "gas": 500_000,
-                        "gasPrice": int(gas_price * 1.2),
-                        "chainId": CHAIN_ID,
-                    })
-                    signed2 = w3.eth.account.sign_transaction(tx2, PRIVATE_KEY)
-                    tx_hash2 = w3.eth.send_raw_transaction(signed2.raw_transaction)
-                    receipt2 = w3.eth.wait_for_transaction_receipt(tx_hash2, timeout=30)
+                    with profiler.watch(f"round:{m.asset} start", SLOW_ROUND_MS):
+                        _, tx_hash2, receipt2 = _send_tx(m.predict.functions.startNewRound(new_price_cents),
+                                                         "startNewRound", gas=500_000, urgent=True, replace=True,
+                                                         trace=(m.tracer, round_id, "start"),
+                                                         key=f"{m.asset}:{round_id}:startNewRound",
+                                                         prepared=rollover.take(round_id, "startNewRound",
+                                                                                new_price_cents))
+                    rollover.clear()
 
                     if receipt2.status == 1:
-                        _sync_new_round()
+                        _sync_new_round(m, prev_round=round_id)
                     else:
-                        log.error("startNewRound tx failed")
+                        log.error(f"{m.tag} startNewRound tx failed")
                 else:
                     resolve_attempts += 1
-                    log.error(f"resolveRound tx failed (attempt {resolve_attempts}/{max_retries}). TX: {tx_hash.hex()[:16]}")
+                    journal.phase(m.asset, failed=round_id, attempts=resolve_attempts)
+                    log.error(f"{m.tag} resolveRound tx failed (attempt {resolve_attempts}/{max_retries}). TX: {tx_hash.hex()[:16]}")
                     # Try to get revert reason
                     try:
                         w3.eth.call({
-                            'to': CONTRACT_ADDRESS,
+                            'to': m.address,
                             'data': tx['data'],
-                            'from': acct.address,
+                            'from': _keeper_address(),
                         })
                     except Exception as call_err:
-                        log.error(f"Revert reason: {call_err}")
+                        log.error(f"{m.tag} Revert reason: {call_err}")
                     time.sleep(3 + resolve_attempts)  # Backoff
                     continue
 
             # ── Case 3: No rounds yet ──
             elif round_id == 0:
-                price = get_btc_price_usd()
+                price = prices.get(m.asset)
                 if price > 0:
                     price_cents = int(price * 100)
-                    nonce = w3.eth.get_transaction_count(acct.address, 'pending')
-                    tx = predict_contract.functions.startFirstRound(price_cents).build_transaction({
-                        "from": acct.address,
-                        "nonce": nonce,
-                        "gas": 300_000,
-                        "gasPrice": w3.eth.gas_price,
-                        "chainId": CHAIN_ID,
-                    })
-                    signed = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-                    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-                    receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
+                    _, tx_hash, receipt = _send_tx(m.predict.functions.startFirstRound(price_cents),
+                                                   "startFirstRound", gas=300_000, urgent=True, replace=True,
+                                                   key=f"{m.asset}:0:startFirstRound")
                     if receipt.status == 1:
-                        _sync_new_round()
+                        _sync_new_round(m)
                     else:
-                        log.error("startFirstRound failed")
+                        log.error(f"{m.tag} startFirstRound failed")
 
         except Exception as e:
-            log.error(f"Auto-resolve error: {e}")
+            log.error(f"{m.tag} Auto-resolve error: {e}")
             log.error(traceback.format_exc())
 
-        time.sleep(1)  # Fast 1s polling for snappy transitions
+        _shutdown.wait(rollover.next_wake(1))  # Fast 1s polling; wakes exactly at expiry once pre-signed
+    log.info(f"{m.tag} Auto-resolver stopped")
 
 
-def _sync_new_round():
-    """Sync MARKET_STATE from on-chain data after a new round starts, trigger bot."""
-    new_round = predict_contract.functions.currentRoundId().call()
-    new_end = predict_contract.functions.roundEndTime().call()
-    strike_cents = predict_contract.functions.getStrikePrice().call()
+def _sync_new_round(m: Market, prev_round: int | None = None):
+    """Sync the market's state from on-chain data after a new round starts, trigger bot."""
+    with rpc_pool.hedged():
+        new_round = m.predict.functions.currentRoundId().call()
+        new_end = m.predict.functions.roundEndTime().call()
+        strike_cents = m.predict.functions.getStrikePrice().call()
     strike_usd = strike_cents / 100.0
 
-    with _market_lock:
-        MARKET_STATE["round_id"] = new_round
-        MARKET_STATE["end_time"] = new_end
-        MARKET_STATE["strike_price"] = strike_usd
-        MARKET_STATE["up_pool"] = 0
-        MARKET_STATE["down_pool"] = 0
-    log.info(f"New Round #{new_round} started @ ${strike_usd:.2f}")
+    m.advance(new_round, end_time=new_end, strike_price=strike_usd, up_pool=0, down_pool=0)
+    journal.phase(m.asset, started=new_round)
+    events.publish("round", {"type": "started", "market": m.asset, "round_id": new_round,
+                             "strike_price": strike_usd, "end_time": new_end})
+    log.info(f"{m.tag} New Round #{new_round} started @ ${strike_usd:.2f}")
+
+    trace_round = prev_round if prev_round is not None else new_round - 1
+    m.tracer.set_next_round(trace_round, new_round)
+
+    def _bet_and_close_trace():
+        try:
+            with admission.critical(), profiler.watch(f"round:{m.asset} bets", SLOW_ROUND_MS):
+                _process_batch_bets(m, trace_round=trace_round)
+        finally:
+            journal.phase(m.asset, bets=new_round)
+            m.tracer.finish(trace_round)
 
     # Auto-bot: place bets for ALL active players
     # Auto-bot: place bets for ALL active players via BATCH
     time.sleep(2) # Wait a bit for things to settle
-    threading.Thread(target=_process_batch_bets, daemon=True).start()
+    threading.Thread(target=_bet_and_close_trace, daemon=True).start()
+
+def _recover_market(m: Market) -> tuple[int, int]:
+    """Finish what the journal says was in flight for `m`, then hand back the resolver's counters.
+
+    Round txs are awaited here, so the first tick sees their effect; bet
+    batches are awaited in the background. A round that started but never
+    got its batch gets it now if there is still time. Returns
+    (last_resolved_round, resolve_attempts).
+    """
+    started = time.perf_counter()
+    inflight = journal.inflight(m.asset)
+    for entry in inflight:
+        label, round_id = entry["label"], entry["round_id"]
+        if label == "placeBetBatch":
+            threading.Thread(target=_recover_batch, args=(m, entry), daemon=True).start()
+            continue
+        try:
+            result = _reattach(entry, timeout=30, trace=None, replace=label != "distributeDevFee")
+        except Exception as e:
+            log.error(f"[JOURNAL] {entry['key']}: still unconfirmed ({e}); the resolver will keep waiting on it")
+            continue
+        if result is not None and result[2].status == 1 and label in ("startNewRound", "startFirstRound"):
+            _sync_new_round(m, prev_round=round_id if label == "startNewRound" else None)
+
+    ph = journal.phases_of(m.asset)
+    if ph.get("started", 0) > ph.get("bets", 0) and not any(e["label"] == "placeBetBatch" for e in inflight):
+        try:
+            round_id = m.predict.functions.currentRoundId().call()
+            if round_id == ph["started"]:
+                rinfo = m.predict.functions.getRoundInfo(round_id).call()
+                m.advance(round_id, end_time=rinfo[1], strike_price=rinfo[2] / 100.0)
+                log.info(f"[JOURNAL] {m.tag} Round #{round_id} started without its bot batch, placing it now")
+                threading.Thread(target=_resume_bets, args=(m, round_id), daemon=True).start()
+        except Exception as e:
+            log.error(f"[JOURNAL] {m.tag} Could not check pending bets: {e}")
+
+    last_resolved = ph.get("resolved", 0)
+    attempts = ph.get("attempts", 0) if ph.get("failed", 0) > last_resolved else 0
+    if inflight or last_resolved:
+        log.info(f"[JOURNAL] {m.tag} Recovered in {(time.perf_counter() - started) * 1000:.0f}ms: "
+                 f"{len(inflight)} tx(s) in flight, last resolved #{last_resolved}, {attempts} failed attempt(s)")
+    return last_resolved, attempts
+
+def _recover_batch(m: Market, entry: dict):
+    try:
+        result = _reattach(entry, timeout=45, trace=None, replace=False, finish=False)
+    except Exception as e:
+        log.error(f"[JOURNAL] {entry['key']}: {e}")
+        return
+    if result is None:
+        _resume_bets(m, entry["round_id"])   # never landed: bet again if the round still allows it
+        return
+    _, tx_hash, receipt = result
+    if receipt.status == 1:
+        try:
+            _record_batch(m, entry["round_id"], entry["meta"], tx_hash)
+        except Exception as e:
+            log.warning(f"[JOURNAL] {entry['key']}: mined, bookkeeping left in the journal ({e})")
+            return
+        journal.done(entry["key"], "mined")
+    journal.phase(m.asset, bets=entry["round_id"])
+
+def _resume_bets(m: Market, round_id: int):
+    """Place the bot batch `round_id` never got, unless the market has moved on to a newer round."""
+    try:
+        current = m.predict.functions.currentRoundId().call()
+        if current != round_id:
+            log.info(f"[JOURNAL] {m.tag} Dropping bot batch of round #{round_id}: market is on #{current}")
+            return
+        if m.state["round_id"] != round_id:
+            rinfo = m.predict.functions.getRoundInfo(round_id).call()
+            m.advance(round_id, end_time=rinfo[1], strike_price=rinfo[2] / 100.0)
+        _process_batch_bets(m)
+    except Exception as e:
+        log.error(f"[JOURNAL] {m.tag} Could not resume bets of round #{round_id}: {e}")
+    finally:
+        journal.phase(m.asset, bets=round_id)
 
 # ═══════════════════════════════════════════════════
 #  AI Workflows Deployment
@@ -1190,12 +5004,13 @@ def deploy_ai_workflows():
     if not ai_oracle:
         log.warning("[AI] Oracle not initialized, skipping workflow deployment")
         return
-    log.info("[AI] Starting workflow deployment...")
-    time.sleep(5)
+    while not _is_keeper():
+        time.sleep(1)
+    log.info("[AI] Starting workflow lifecycle and prediction loop...")
     try:
-        ai_oracle.deploy_all()
-        log.info("[AI] All workflows deployed! Starting prediction loop...")
-        ai_oracle.prediction_loop()
+        # Missing or expiring workflows deploy in the background; models that have one predict right away
+        threading.Thread(target=ai_oracle.lifecycle_loop, kwargs={"active": _is_keeper}, daemon=True).start()
+        ai_oracle.prediction_loop(active=_is_keeper)
     except Exception as e:
         log.error(f"[AI] Deployment error: {e}")
         log.error(traceback.format_exc())
@@ -1205,28 +5020,271 @@ def _heartbeat():
     while True:
         time.sleep(60)
         active_count = len(_get_active_players())
-        log.info(f"[HEARTBEAT] alive | Round #{MARKET_STATE['round_id']} | "
-                 f"strike=${MARKET_STATE['strike_price']:.2f} | "
-                 f"bots={active_count} active")
+        role = ROLE if ROLE != "keeper" else f"keeper ({'leader' if _is_keeper() else 'standby'})"
+        rounds = " | ".join(f"{m.asset.upper()} #{m.state['round_id']} strike=${m.state['strike_price']:.2f}"
+                            for m in markets.values()) or "no markets"
+        log.info(f"[HEARTBEAT] alive | {role} | {rounds} | bots={active_count} active")
 
+def _warmup():
+    """Open RPC connections and fill the price, gas and AI client caches in parallel.
 
-if __name__ == "__main__":
-    import sys
+    Runs beside the resolver and the HTTP server, so the first requests and
+    round transitions find warm keep-alive connections instead of paying
+    for them. Failures are logged and left to the normal code paths.
+    """
+    tasks = {f"rpc:{e.name}": functools.partial(rpc_pool.probe, e) for e in rpc_pool.endpoints}
+    tasks.update({f"price:{asset}": functools.partial(prices.get, asset) for asset in markets})
+    if ROLE in ("all", "keeper") and PRIVATE_KEY:
+        tasks["gas"] = gas_oracle.fees
+    if ai_oracle:
+        tasks["og_client"] = lambda: ai_oracle.client
+
+    def _timed(name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+            return name, time.perf_counter() - start, None
+        except Exception as e:
+            return name, time.perf_counter() - start, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warmup") as pool:
+        results = list(pool.map(lambda item: _timed(*item), tasks.items()))
+    for name, seconds, err in results:
+        startup.task(name, seconds)
+        if err is not None:
+            log.warning(f"[STARTUP] warmup {name} failed after {seconds * 1000:.0f}ms: {err}")
+    log.info(f"[STARTUP] warm in {(time.perf_counter() - started) * 1000:.0f}ms: "
+             + " | ".join(f"{n} {sec * 1000:.0f}ms" for n, sec, err in results if err is None))
 
+
+# ═══════════════════════════════════════════════════
+#  Keeper Election + Shared State Followers
+# ═══════════════════════════════════════════════════
+
+def _keeper_election():
+    """Hold the keeper lease: renew every third of its TTL, give it up on shutdown."""
+    global _keeper_lease_until, _keeper_token
+    leader = False
+    while not _shutdown.is_set():
+        started = time.monotonic()
+        try:
+            token = shared.try_lease("keeper", KEEPER_LEASE_SEC)
+        except Exception as e:
+            log.error(f"[KEEPER] Lease renewal failed: {e}")
+            token = None
+        if token is not None:
+            if not leader:
+                log.info(f"[KEEPER] Acquired keeper lease (token {token}) as {NODE_ID}")
+                nonces.reset()   # the previous keeper may have sent since we last did
+                inflight = journal.replay()   # ...and may have left transactions in flight
+                if inflight:
+                    log.info(f"[KEEPER] {inflight} transaction(s) in flight in the journal")
+                metrics.inc("keeper_lease_changes_total", change="acquired")
+            _keeper_token = token
+            _keeper_lease_until = started + KEEPER_LEASE_SEC - 1
+            leader = True
+        elif leader and time.monotonic() >= _keeper_lease_until:
+            log.warning(f"[KEEPER] Lost keeper lease to {(shared.lease_info('keeper') or {}).get('holder')}")
+            metrics.inc("keeper_lease_changes_total", change="lost")
+            _keeper_token = None
+            leader = False
+        _shutdown.wait(KEEPER_LEASE_SEC / 3)
+    if leader:
+        _keeper_lease_until = 0.0
+        _keeper_token = None
+        shared.release_lease("keeper")
+        log.info("[KEEPER] Released keeper lease")
+
+def _keeper_jobs():
+    """Run work queued by API workers (manual bot bets) and prune the shared event log."""
+    last_prune = 0.0
+    while not _shutdown.is_set():
+        _shutdown.wait(SHARED_POLL_SEC)
+        if not _is_keeper():
+            continue
+        try:
+            by_market: dict[str, set[str]] = collections.defaultdict(set)
+            for job in shared.take_jobs("bet"):
+                by_market[job.get("market", DEFAULT_MARKET)].add(job["player"])
+            for asset, players in by_market.items():
+                if asset in markets:
+                    log.info(f"[KEEPER] Running queued {asset.upper()} bets for {len(players)} player(s)")
+                    _process_batch_bets(markets[asset], sorted(players))
+            if time.time() - last_prune > 60:
+                last_prune = time.time()
+                shared.prune_events()
+        except Exception as e:
+            log.error(f"[KEEPER] Job error: {e}")
+
+def _follow_shared_state():
+    """Mirror the shared store into this process: snapshots, bot states and SSE events.
+
+    The keeper writes market/AI/workflow snapshots; any process may write bots
+    and events. Remote events are re-published to local subscribers only.
+    """
+    kv_seq = 0
+    bots_seq = 0
+    event_id = shared.last_event_id()
+    while not _shutdown.is_set():
+        try:
+            for key, value, kv_seq in shared.kv_since(kv_seq):
+                if key.startswith("market:") and (m := markets.get(key[7:])):
+                    m.adopt(value)
+                elif key == "workflows" and ai_oracle:
+                    ai_oracle.workflows = value
+                elif key.startswith("ai:") and ai_oracle:
+                    with ai_oracle._lock:
+                        ai_oracle.last_predictions[key[3:]] = value
+            for player, bot, bots_seq in shared.bots_since(bots_seq):
+                with _bot_stripe(player), _bots_lock:
+                    old, BOTS[player] = BOTS.get(player) or {}, {**_default_bot_state(), **bot}
+                if any(old.get(f) != bot.get(f) for f in STRATEGY_FIELDS):
+                    _bump_strategies()
+            for event_id, origin, event, player, data in shared.events_since(event_id):
+                if origin == NODE_ID:
+                    continue
+                if event == "balances_dirty":
+                    user_mgr.invalidate(json.loads(data)["wallets"])
+                else:
+                    events.publish(event, json.loads(data), player, relay=False)
+        except Exception as e:
+            log.error(f"[SHARED] Follow error: {e}")
+        _shutdown.wait(SHARED_POLL_SEC)
+
+
+# ═══════════════════════════════════════════════════
+#  Production Server (SERVER_MODE=gevent)
+# ═══════════════════════════════════════════════════
+
+# Per-route request deadlines; None = no deadline. /api/bot/bet waits on its
+# own tx receipt and must not be cut off after the tx is already sent.
+ROUTE_TIMEOUTS = {
+    "/api/stream": None,
+    "/api/bot/bet": None,
+    "/api/admin/profile": None,
+    "/api/predict": 60,
+}
+
+class _RequestTimeout:
+    """WSGI middleware: answer 504 when a request runs past its deadline.
+
+    Relies on gevent: the deadline fires at the handler's next I/O wait and
+    unwinds it with gevent.Timeout (a BaseException, so `except Exception`
+    in views does not swallow it).
+    """
+
+    def __init__(self, wsgi_app, default: float, routes: dict):
+        self.wsgi_app = wsgi_app
+        self.default = default
+        self.routes = routes
+
+    def __call__(self, environ, start_response):
+        from gevent import Timeout
+        path = environ.get("PATH_INFO", "")
+        seconds = self.routes.get(path, self.default)
+        if not seconds:
+            return self.wsgi_app(environ, start_response)
+        timer = Timeout(seconds)
+        timer.start()
+        try:
+            return self.wsgi_app(environ, start_response)
+        except Timeout as t:
+            if t is not timer:
+                raise
+            metrics.inc("http_request_timeouts_total", path=path)
+            log.warning(f"[HTTP] {path} timed out after {seconds:g}s")
+            body = json.dumps({"error": f"Request timed out after {seconds:g}s"}).encode()
+            start_response("504 Gateway Timeout", [("Content-Type", "application/json"),
+                                                   ("Content-Length", str(len(body)))])
+            return [body]
+        finally:
+            timer.cancel()
+
+def _serve_gevent(keeper: threading.Thread | None):
+    """Serve the API from gevent's WSGI server; SIGTERM/SIGINT drain gracefully.
+
+    One process, one keeper: concurrency comes from greenlets parked on
+    (monkey-patched) upstream I/O, not from OS threads. On shutdown the
+    listener closes, in-flight requests get SHUTDOWN_GRACE_SEC to finish and
+    the resolver completes its current tick before the process exits.
+    """
+    import gevent
+    from gevent.pywsgi import WSGIServer
+
+    app.wsgi_app = _RequestTimeout(app.wsgi_app, REQUEST_TIMEOUT_SEC, ROUTE_TIMEOUTS)
+    server = WSGIServer((API_HOST, API_PORT), app, log=None, error_log=log)
+
+    def _stop():
+        if _shutdown.is_set():
+            return
+        log.info(f"Shutdown: draining requests (up to {SHUTDOWN_GRACE_SEC:g}s), stopping resolver...")
+        _shutdown.set()
+        server.stop(timeout=SHUTDOWN_GRACE_SEC)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(sig, _stop)
+
+    log.info(f"Agent running on {API_HOST}:{API_PORT} (gevent, request timeout {REQUEST_TIMEOUT_SEC:g}s)")
+    server.serve_forever()
+    if keeper is not None:
+        keeper.join(timeout=SHUTDOWN_GRACE_SEC)
+    log.info("Shutdown complete")
+
+
+startup.mark("routes")
+
+
+def main():
+    """Start the background threads for this ROLE, then serve the API."""
     # Log unhandled exceptions
     def _excepthook(exc_type, exc_value, exc_tb):
         log.critical(f"UNHANDLED EXCEPTION: {exc_type.__name__}: {exc_value}")
         log.critical("".join(traceback.format_tb(exc_tb)))
     sys.excepthook = _excepthook
 
-    t1 = threading.Thread(target=auto_resolve, daemon=True)
-    t1.start()
+    log.info(f"Role: {ROLE}" + (f" | shared state {SHARED_STATE_DB} | node {NODE_ID}" if shared else ""))
+    if ROLE == "all" and journal.replay():
+        log.info(f"[JOURNAL] {len(journal.pending)} transaction(s) in flight from the last run: "
+                 f"{', '.join(journal.pending)}")
+    threading.Thread(target=_warmup, daemon=True).start()
 
-    t2 = threading.Thread(target=deploy_ai_workflows, daemon=True)
-    t2.start()
+    t1 = None
+    if ROLE in ("all", "keeper"):
+        t1 = threading.Thread(target=auto_resolve, daemon=True)
+        t1.start()
+
+        t2 = threading.Thread(target=deploy_ai_workflows, daemon=True)
+        t2.start()
+
+        t4 = threading.Thread(target=_price_ticker, daemon=True)
+        t4.start()
+
+        if indexer:
+            t5 = threading.Thread(target=indexer.run, kwargs={"active": _is_keeper}, daemon=True)
+            t5.start()
+
+        # API workers get invalidations from the keeper through the shared store
+        threading.Thread(target=user_mgr.follow_blocks, kwargs={"active": _is_keeper}, daemon=True).start()
+
+    if ROLE == "keeper":
+        threading.Thread(target=_keeper_election, daemon=True).start()
+        threading.Thread(target=_keeper_jobs, daemon=True).start()
+
+    if shared is not None:
+        threading.Thread(target=_follow_shared_state, daemon=True).start()
 
     t3 = threading.Thread(target=_heartbeat, daemon=True)
     t3.start()
+    startup.mark("threads")
+    log.info(f"[STARTUP] serving after {startup.elapsed() * 1000:.0f}ms: {startup.report()}")
+
+    if SERVER_MODE == "gevent":
+        _serve_gevent(keeper=t1)
+    else:
+        log.info(f"Agent running on port {API_PORT}")
+        app.run(host=API_HOST, port=API_PORT)
 
-    log.info(f"Agent running on port {API_PORT}")
-    app.run(host="127.0.0.1", port=API_PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,612 @@
+"""
+Predict 402 — HTTP load test with record/replay upstream tapes
+
+Finds the request rate at which the API saturates, and whether the 1 s
+auto_resolve loop starts slipping before it does.
+
+  record  Import the agent against its real upstreams (.env config) and
+          exercise the scenario endpoints plus the resolver's read path for
+          --duration seconds. Every JSON-RPC call, Binance ticker request and
+          OpenGradient workflow result is written to a tape with its latency.
+          The keeper is NOT started: recording never sends transactions.
+
+  run     Start the agent in a child process (`serve`) with every upstream
+          replayed from the tape — responses as of the same offset into the
+          recording, latency as recorded × --latency-scale — and the keeper
+          running. Transactions are answered synthetically and mined after
+          --tx-latency-ms. Then drive an open-loop load at each rate in
+          --rates and report, per stage:
+            - achieved throughput and error rate
+            - p50 / p95 / p99 / max latency (from the scheduled send time,
+              so queueing in the generator counts against the server)
+            - resolver loop lag (period − 1 s; mean and p99 from /metrics)
+          The first stage breaching --slo-ms, 1% errors or --max-lag-ms is
+          reported as the saturation point.
+
+Usage:
+  python bench_api.py record --duration 600 --players 0xabc...,0xdef...
+  python bench_api.py run --scenario dashboard --rates 10,25,50,100,200 --stage-sec 30
+  python bench_api.py run --scenario ai-fresh --rates 1,2,5 --latency-scale 2
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import signal
+import logging
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+import collections
+from pathlib import Path
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from web3 import Web3
+
+from bench_rounds import DEV_KEY, BenchClock
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# name → [(weight, method, path, body)]; {player} is filled from the tape's players
+SCENARIOS = {
+    "dashboard": [
+        (60, "GET",  "/api/market/status", None),
+        (35, "GET",  "/api/bot/status?player={player}", None),
+        (5,  "POST", "/api/ai/predict", {"asset": "btc"}),
+    ],
+    "market":   [(1, "GET", "/api/market/status", None)],
+    "bot":      [(1, "GET", "/api/bot/status?player={player}", None)],
+    "ai":       [(1, "POST", "/api/ai/predict", {"asset": "btc"})],
+    "ai-fresh": [(1, "POST", "/api/ai/predict", {"asset": "btc", "fresh": True})],
+}
+
+# Writes never come from a tape: replay answers them itself
+_SYNTHETIC_RPC = {"eth_sendRawTransaction", "eth_getTransactionReceipt", "eth_getTransactionCount",
+                  "eth_estimateGas"}
+
+
+# ═══════════════════════════════════════════════════
+#  Tape (recorded upstream responses)
+# ═══════════════════════════════════════════════════
+
+class Tape:
+    """Upstream responses keyed by (kind, key), each with tape-relative time and latency.
+
+    File format is JSONL: a header ({"header": {...}}) followed by one
+    {"kind", "key", "t", "latency", "response"} line per recorded call.
+    """
+
+    def __init__(self, header: dict | None = None):
+        self.header = header or {}
+        self.t0 = self.header.get("t0", time.time())
+        self._entries: dict[tuple, list] = collections.defaultdict(list)   # (kind, key) → [(t, latency, response)]
+        self._fallback: dict[tuple, list] = collections.defaultdict(list)  # (kind, coarse key) → same
+        self._lock = threading.Lock()
+        self._out = None
+
+    @staticmethod
+    def _coarse(kind: str, key: str) -> str:
+        # eth_call keyed by (to, selector), so an unrecorded argument still gets a plausible answer
+        if kind == "rpc":
+            method, params = json.loads(key)
+            if method == "eth_call" and params and isinstance(params[0], dict):
+                return f"eth_call:{params[0].get('to', '')}:{(params[0].get('data') or '')[:10]}"
+            return method
+        return key
+
+    def _index(self, kind: str, key: str, entry: tuple):
+        self._entries[(kind, key)].append(entry)
+        self._fallback[(kind, self._coarse(kind, key))].append(entry)
+
+    def open_for_record(self, path: str):
+        self._out = open(path, "w")
+        self._out.write(json.dumps({"header": {**self.header, "t0": self.t0}}) + "\n")
+
+    def record(self, kind: str, key: str, response, latency: float):
+        t = time.time() - self.t0
+        with self._lock:
+            self._out.write(json.dumps({"kind": kind, "key": key, "t": round(t, 3),
+                                        "latency": round(latency, 4), "response": response}, default=str) + "\n")
+            self._index(kind, key, (t, latency, response))
+
+    def close(self):
+        if self._out:
+            self._out.close()
+
+    @classmethod
+    def load(cls, path: str) -> "Tape":
+        with open(path) as f:
+            tape = cls(json.loads(f.readline())["header"])
+            for line in f:
+                e = json.loads(line)
+                tape._index(e["kind"], e["key"], (e["t"], e["latency"], e["response"]))
+        for entries in itertools.chain(tape._entries.values(), tape._fallback.values()):
+            entries.sort(key=lambda e: e[0])
+        return tape
+
+    def lookup(self, kind: str, key: str, t: float) -> tuple | None:
+        """Latest entry recorded at or before tape time t (the first one if t precedes it)."""
+        entries = self._entries.get((kind, key)) or self._fallback.get((kind, self._coarse(kind, key)))
+        if not entries:
+            return None
+        i = bisect.bisect_right(entries, t, key=lambda e: e[0])
+        return entries[max(0, i - 1)]
+
+    @property
+    def duration(self) -> float:
+        return max((e[-1][0] for e in self._entries.values() if e), default=0.0)
+
+
+# ═══════════════════════════════════════════════════
+#  Upstream hooks (installed before `import agent`)
+# ═══════════════════════════════════════════════════
+
+class Upstreams:
+    """Routes the agent's RPC, HTTP and OpenGradient calls through a tape.
+
+    mode="record" calls the real upstream and appends to the tape;
+    mode="replay" answers from the tape after sleeping latency × scale.
+    """
+
+    def __init__(self, tape: Tape, mode: str, latency_scale: float = 1.0, tx_latency: float = 2.0,
+                 clock: BenchClock | None = None):
+        self.tape = tape
+        self.mode = mode
+        self.scale = latency_scale
+        self.tx_latency = tx_latency
+        self.clock = clock
+        self.misses = collections.Counter()
+        self._sent: dict[str, float] = {}     # synthetic tx hash → sent at
+        self._nonce = 0
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return (self.clock.time() if self.clock else time.time()) - self.tape.t0
+
+    def _replay(self, kind: str, key: str):
+        entry = self.tape.lookup(kind, key, self._now())
+        if entry is None:
+            self.misses[f"{kind}:{self.tape._coarse(kind, key)}"] += 1
+            return None
+        time.sleep(entry[1] * self.scale)
+        return entry[2]
+
+    # ── JSON-RPC (Web3.HTTPProvider.make_request) ──
+
+    def install_rpc(self):
+        upstream = self
+        original = Web3.HTTPProvider.make_request
+
+        def make_request(provider, method, params):
+            key = json.dumps([method, params], sort_keys=True, default=str)
+            if upstream.mode == "record":
+                start = time.perf_counter()
+                response = original(provider, method, params)
+                upstream.tape.record("rpc", key, {k: v for k, v in response.items() if k in ("result", "error")},
+                                     time.perf_counter() - start)
+                return response
+            body = upstream._synthetic_rpc(method, params) if method in _SYNTHETIC_RPC else upstream._replay("rpc", key)
+            if body is None:
+                body = {"error": {"code": -32000, "message": f"{method} not on tape"}}
+            return {"jsonrpc": "2.0", "id": next(provider.request_counter), **body}
+
+        Web3.HTTPProvider.make_request = make_request
+
+    def _synthetic_rpc(self, method: str, params: list) -> dict:
+        time.sleep(0.01 * self.scale)
+        with self._lock:
+            if method == "eth_sendRawTransaction":
+                tx_hash = Web3.to_hex(Web3.keccak(hexstr=params[0]))
+                self._sent[tx_hash] = time.time()
+                self._nonce += 1
+                return {"result": tx_hash}
+            if method == "eth_getTransactionCount":
+                return {"result": hex(self._nonce)}
+            if method == "eth_estimateGas":
+                return {"result": hex(300_000)}
+            sent_at = self._sent.get(params[0])
+        if sent_at is None or time.time() - sent_at < self.tx_latency:
+            return {"result": None}
+        return {"result": {
+            "transactionHash": params[0], "transactionIndex": "0x0", "blockHash": "0x" + "00" * 32,
+            "blockNumber": "0x1", "from": "0x" + "00" * 20, "to": "0x" + "00" * 20,
+            "cumulativeGasUsed": hex(250_000), "gasUsed": hex(250_000), "effectiveGasPrice": hex(10 ** 9),
+            "contractAddress": None, "logs": [], "logsBloom": "0x" + "00" * 256, "status": "0x1", "type": "0x0",
+        }}
+
+    # ── HTTP (the `requests` module as seen by agent.py) ──
+
+    def requests_proxy(self):
+        upstream = self
+
+        class TapeRequests:
+            def get(self, url, params=None, **kwargs):
+                key = f"{url}?{urlencode(params)}" if params else url
+                if upstream.mode == "record":
+                    start = time.perf_counter()
+                    try:
+                        resp = requests.get(url, params=params, **kwargs)
+                    except requests.RequestException as e:
+                        upstream.tape.record("http", key, {"error": str(e)}, time.perf_counter() - start)
+                        raise
+                    upstream.tape.record("http", key, {"status": resp.status_code, "body": resp.text},
+                                         time.perf_counter() - start)
+                    return resp
+                body = upstream._replay("http", key)
+                if body is None or "error" in body:
+                    raise requests.ConnectionError(body["error"] if body else f"{key} not on tape")
+                resp = requests.Response()
+                resp.status_code, resp._content, resp.url = body["status"], body["body"].encode(), key
+                return resp
+
+            def __getattr__(self, name):
+                return getattr(requests, name)
+
+        return TapeRequests()
+
+    # ── OpenGradient (og.Client: only client.alpha workflows are taped) ──
+
+    def og_client(self, real_client_cls):
+        upstream = self
+
+        class _Output:
+            def __init__(self, numbers: dict):
+                self.numbers = {k: np.array(v) for k, v in numbers.items()}
+
+        class TapeAlpha:
+            def __init__(self, real):
+                self._real = real
+
+            def _call(self, name, contract_address):
+                key = f"{name}:{contract_address}"
+                if upstream.mode == "record":
+                    start = time.perf_counter()
+                    try:
+                        out = getattr(self._real, name)(contract_address)
+                    except Exception as e:
+                        upstream.tape.record("og", key, {"error": str(e)}, time.perf_counter() - start)
+                        raise
+                    numbers = {k: np.asarray(v).tolist() for k, v in (getattr(out, "numbers", None) or {}).items()}
+                    upstream.tape.record("og", key, {"numbers": numbers}, time.perf_counter() - start)
+                    return out
+                body = upstream._replay("og", key)
+                if body is None or "error" in body:
+                    raise RuntimeError(body["error"] if body else f"{key} not on tape")
+                return _Output(body["numbers"])
+
+            def run_workflow(self, contract_address):
+                return self._call("run_workflow", contract_address)
+
+            def read_workflow_result(self, contract_address):
+                return self._call("read_workflow_result", contract_address)
+
+        class TapeClient:
+            def __init__(self, *args, **kwargs):
+                self._real = real_client_cls(*args, **kwargs) if upstream.mode == "record" else None
+                self.alpha = TapeAlpha(self._real.alpha if self._real else None)
+
+            def __getattr__(self, name):
+                if self._real is None:
+                    raise RuntimeError(f"og.Client.{name} is not taped")
+                return getattr(self._real, name)
+
+        return TapeClient
+
+
+def _import_agent(upstreams: Upstreams):
+    import opengradient as og
+    upstreams.install_rpc()
+    og.Client = upstreams.og_client(og.Client)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import agent
+    agent.requests = upstreams.requests_proxy()
+    if upstreams.clock:
+        agent.time = upstreams.clock
+    return agent
+
+
+# ═══════════════════════════════════════════════════
+#  record
+# ═══════════════════════════════════════════════════
+
+def cmd_record(args):
+    tape = Tape()
+    upstreams = Upstreams(tape, "record")
+    agent = _import_agent(upstreams)
+    agent.log.setLevel(logging.WARNING)
+    if not agent.predict_contract:
+        sys.exit("CONTRACT_ADDRESS is not configured; nothing to record")
+
+    players = [p for p in (args.players or "").split(",") if p] or list(agent._bots_snapshot())[:20]
+    tape.header = {
+        "contract": agent.CONTRACT_ADDRESS, "vault": agent.VAULT_ADDRESS, "chain_id": agent.CHAIN_ID,
+        "workflows": agent.ai_oracle.workflows if agent.ai_oracle else {}, "players": players,
+    }
+    tape.open_for_record(args.tape)
+    client = agent.app.test_client()
+    predict = agent.predict_contract
+    stop = threading.Event()
+
+    def resolver_reads():
+        # Same reads auto_resolve makes each tick, without its writes
+        while not stop.is_set():
+            try:
+                round_id = predict.functions.currentRoundId().call()
+                predict.functions.roundEndTime().call()
+                if round_id > 0:
+                    predict.functions.getRoundInfo(round_id).call()
+                    predict.functions.getStrikePrice().call()
+                # Fee market reads behind agent.gas_oracle
+                agent.w3.eth.gas_price
+                if agent.w3.eth.get_block("latest").get("baseFeePerGas") is not None:
+                    agent.w3.eth.max_priority_fee
+            except Exception as e:
+                print(f"[record] resolver read failed: {e}", file=sys.stderr)
+            stop.wait(1)
+
+    threading.Thread(target=resolver_reads, daemon=True).start()
+    threading.Thread(target=agent._price_ticker, daemon=True).start()
+
+    deadline = time.time() + args.duration
+    last_fresh = 0
+    while time.time() < deadline:
+        client.get("/api/market/status")
+        for p in players:
+            client.get(f"/api/bot/status?player={p}")
+        fresh = time.time() - last_fresh > args.ai_every
+        if fresh:
+            last_fresh = time.time()
+        client.post("/api/ai/predict", json={"asset": "btc", "fresh": fresh})
+        print(f"\r[record] {int(deadline - time.time())}s left", end="", flush=True)
+        time.sleep(1)
+    stop.set()
+    tape.close()
+    print(f"\n[record] tape → {args.tape}")
+
+
+# ═══════════════════════════════════════════════════
+#  serve (child process of `run`)
+# ═══════════════════════════════════════════════════
+
+def cmd_serve(args):
+    tape = Tape.load(args.tape)
+    h = tape.header
+    workdir = tempfile.mkdtemp(prefix="benchapi-")
+    os.environ.update({
+        "PRIVATE_KEY": DEV_KEY,
+        "CONTRACT_ADDRESS": h["contract"],
+        "VAULT_ADDRESS": h.get("vault") or "",
+        "CHAIN_ID": str(h["chain_id"]),
+        "BOT_STATE_FILE": os.path.join(workdir, "bot_state.json"),
+        "ROUND_TRACE_FILE": os.path.join(workdir, "round_traces.jsonl"),
+        "TX_JOURNAL_FILE": os.path.join(workdir, "tx_journal.jsonl"),
+        "INDEXER_DB": os.path.join(workdir, "indexer.db"),
+        "AI_WORKFLOWS_FILE": os.path.join(workdir, "workflows.json"),
+        "AI_PREDICTIONS_FILE": os.path.join(workdir, "ai_predictions.json"),
+    })
+    clock = BenchClock()
+    clock.offset = tape.t0 - time.time()      # agent lives at the recording's wall time
+    upstreams = Upstreams(tape, "replay", args.latency_scale, args.tx_latency_ms / 1000, clock)
+    agent = _import_agent(upstreams)
+    if not args.verbose:
+        agent.log.setLevel(logging.WARNING)
+    if agent.ai_oracle:
+        agent.ai_oracle.workflows = h.get("workflows", {})
+    for p in h.get("players", []):
+        agent._update_bot(p, lambda b: b.update(active=True))
+
+    for target in (agent.auto_resolve, agent._price_ticker):
+        threading.Thread(target=target, daemon=True).start()
+
+    @agent.app.route("/__bench/misses")
+    def _misses():
+        return agent.jsonify(dict(upstreams.misses))
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    agent.app.run(host="127.0.0.1", port=args.port)
+
+
+# ═══════════════════════════════════════════════════
+#  run (load generator)
+# ═══════════════════════════════════════════════════
+
+def _scrape_loop_hist(base: str) -> tuple[dict, float, int]:
+    """resolver_loop_period_seconds buckets {le: count}, sum, count from /metrics."""
+    buckets, total, count = {}, 0.0, 0
+    for line in requests.get(f"{base}/metrics", timeout=5).text.splitlines():
+        if line.startswith("resolver_loop_period_seconds_bucket"):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets[float("inf") if le == "+Inf" else float(le)] = int(line.rsplit(" ", 1)[1])
+        elif line.startswith("resolver_loop_period_seconds_sum"):
+            total = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("resolver_loop_period_seconds_count"):
+            count = int(line.rsplit(" ", 1)[1])
+    return buckets, total, count
+
+
+def _hist_quantile(q: float, buckets: dict) -> float | None:
+    """Prometheus histogram_quantile: linear interpolation inside the bucket holding rank q."""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] == 0:
+        return None
+    rank = q * buckets[bounds[-1]]
+    prev_bound, prev_count = 0.0, 0
+    for b in bounds:
+        if buckets[b] >= rank:
+            if b == float("inf"):
+                return prev_bound
+            return prev_bound + (b - prev_bound) * (rank - prev_count) / max(1, buckets[b] - prev_count)
+        prev_bound, prev_count = b, buckets[b]
+    return prev_bound
+
+
+def _run_stage(base: str, mix: list, players: list[str], rate: float, seconds: float,
+               pool: ThreadPoolExecutor, concurrency: int, rng: random.Random) -> dict:
+    weights = [m[0] for m in mix]
+    latencies, errors, statuses = [], collections.Counter(), collections.Counter()
+    lock = threading.Lock()
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+
+    def fire(scheduled: float, method: str, path: str, body):
+        try:
+            resp = session.request(method, base + path, json=body, timeout=30)
+            status = resp.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+            if status != 200:
+                errors[status] += 1
+
+    hist0 = _scrape_loop_hist(base)
+    start = time.perf_counter()
+    sent = 0
+    # Open loop: request i is due at start + i/rate regardless of how earlier ones fared
+    while True:
+        due = start + sent / rate
+        if due - start >= seconds:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        _, method, path, body = rng.choices(mix, weights)[0]
+        pool.submit(fire, due, method, path.format(player=rng.choice(players) if players else ""), body)
+        sent += 1
+    while True:
+        with lock:
+            if len(latencies) >= sent:
+                break
+        time.sleep(0.05)
+    wall = time.perf_counter() - start
+    hist1 = _scrape_loop_hist(base)
+
+    diff = {b: hist1[0].get(b, 0) - hist0[0].get(b, 0) for b in hist1[0]}
+    loops = hist1[2] - hist0[2]
+    p99_period = _hist_quantile(0.99, diff)
+    lat = np.array(latencies) * 1000
+    ok = sent - sum(errors.values())
+    return {
+        "rate": rate,
+        "sent": sent,
+        "throughput": round(ok / wall, 1),
+        "error_rate": round(sum(errors.values()) / max(1, sent), 4),
+        "errors": {str(k): v for k, v in errors.items()},
+        "latency_ms": {q: round(float(np.percentile(lat, p)), 1) for q, p in
+                       (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))} if len(lat) else {},
+        "resolver_loops": loops,
+        "resolver_lag_ms": {
+            "mean": round(((hist1[1] - hist0[1]) / loops - 1) * 1000, 1) if loops else None,
+            "p99": round((p99_period - 1) * 1000, 1) if p99_period is not None else None,
+        },
+    }
+
+
+def cmd_run(args):
+    tape = Tape.load(args.tape)
+    players = tape.header.get("players", [])
+    base = f"http://127.0.0.1:{args.port}"
+    serve_cmd = [sys.executable, __file__, "serve", "--tape", args.tape, "--port", str(args.port),
+                 "--latency-scale", str(args.latency_scale), "--tx-latency-ms", str(args.tx_latency_ms)]
+    server = subprocess.Popen(serve_cmd, start_new_session=True,
+                              stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    results = []
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if requests.get(f"{base}/api/market/status", timeout=5).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                sys.exit("Agent did not come up (rerun with --verbose)")
+            time.sleep(0.5)
+        time.sleep(args.warmup)
+
+        if tape.duration < len(args.rates) * args.stage_sec + args.warmup:
+            print(f"[run] note: tape covers {tape.duration:.0f}s, run is longer; "
+                  f"upstream state freezes at the tape's end", file=sys.stderr)
+        rng = random.Random(args.seed)
+        mix = SCENARIOS[args.scenario]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for rate in args.rates:
+                print(f"[run] {args.scenario} @ {rate:g} req/s for {args.stage_sec}s...", flush=True)
+                results.append(_run_stage(base, mix, players, rate, args.stage_sec, pool, args.concurrency, rng))
+        misses = requests.get(f"{base}/__bench/misses", timeout=5).json()
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+
+    saturation = None
+    for r in results:
+        lag = r["resolver_lag_ms"]["p99"]
+        if (r["latency_ms"].get("p99", 0) > args.slo_ms or r["error_rate"] > 0.01
+                or (lag is not None and lag > args.max_lag_ms)):
+            saturation = r["rate"]
+            break
+
+    head = f"{'rate':>7} {'thru/s':>7} {'err%':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>8} " \
+           f"{'lag mean':>9} {'lag p99':>8}"
+    print()
+    print(head)
+    print("─" * len(head))
+    for r in results:
+        l, g = r["latency_ms"], r["resolver_lag_ms"]
+        print(f"{r['rate']:>7g} {r['throughput']:>7} {r['error_rate'] * 100:>6.2f} {l.get('p50', '-')!s:>7} "
+              f"{l.get('p95', '-')!s:>7} {l.get('p99', '-')!s:>7} {l.get('max', '-')!s:>8} "
+              f"{g['mean']!s:>9} {g['p99']!s:>8}")
+    print(f"\nSaturation: {f'{saturation:g} req/s' if saturation else f'not reached (≤ {args.rates[-1]:g} req/s)'} "
+          f"[p99 > {args.slo_ms:g} ms, errors > 1% or resolver lag p99 > {args.max_lag_ms:g} ms]")
+    if misses:
+        print(f"Tape misses (answered with errors): {misses}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"scenario": args.scenario, "saturation_rate": saturation,
+                                              "stages": results, "tape_misses": misses}, indent=2))
+        print(f"Full results → {args.out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the agent API against recorded upstreams")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="record upstream responses to a tape")
+    rec.add_argument("--tape", default="upstream.tape.jsonl")
+    rec.add_argument("--duration", type=int, default=600, help="seconds (cover at least one round end)")
+    rec.add_argument("--players", help="comma-separated players for /api/bot/status (default: known bots)")
+    rec.add_argument("--ai-every", type=int, default=30, help="seconds between fresh AI inferences")
+
+    srv = sub.add_parser("serve")
+    run = sub.add_parser("run", help="replay a tape and drive load")
+    for p in (srv, run):
+        p.add_argument("--tape", default="upstream.tape.jsonl")
+        p.add_argument("--port", type=int, default=3499)
+        p.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded upstream latency")
+        p.add_argument("--tx-latency-ms", type=float, default=2000, help="synthetic tx confirmation time")
+        p.add_argument("--verbose", action="store_true")
+    run.add_argument("--scenario", choices=sorted(SCENARIOS), default="dashboard")
+    run.add_argument("--rates", type=lambda s: [float(x) for x in s.split(",")], default=[10, 25, 50, 100, 200],
+                     help="comma-separated offered load steps (req/s)")
+    run.add_argument("--stage-sec", type=float, default=20)
+    run.add_argument("--warmup", type=float, default=5, help="seconds before the first stage")
+    run.add_argument("--concurrency", type=int, default=256, help="max in-flight requests")
+    run.add_argument("--slo-ms", type=float, default=500, help="p99 latency budget")
+    run.add_argument("--max-lag-ms", type=float, default=500, help="resolver loop lag budget (p99)")
+    run.add_argument("--seed", type=int, default=402)
+    run.add_argument("--out", help="write full results as JSON")
+
+    args = parser.parse_args()
+    {"record": cmd_record, "serve": cmd_serve, "run": cmd_run}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
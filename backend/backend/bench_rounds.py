@@ -0,0 +1,439 @@
+"""
+Predict 402 — Round transition benchmark (local EVM + fake upstreams)
+
+Deploys Predict402 + Vault402Binary to a local dev chain, funds N simulated
+bot players straight into vault storage, and lets the real agent code
+(auto_resolve → resolveRound → startNewRound → _process_batch_bets) drive
+round transitions. Binance is replaced by a local HTTP fake and the
+OpenGradient client by an in-process fake, both with configurable latency,
+so results only depend on the agent, the contracts and the node.
+
+Per player count it reports:
+  - transition time p50/p99: on-chain round end → next round mined (rollover)
+    and → bot batch mined (bets), from the agent's own round traces
+  - RPC calls per transition, broken down by method
+  - gas: resolveRound / startNewRound per round, placeBetBatch per player
+
+Chain time is fast-forwarded (evm_increaseTime) to a few seconds before each
+round end and the agent's clock is shifted by the same amount, so a 5-minute
+round costs only the lead-in plus the transition itself.
+
+Usage:
+  cd contracts && npx hardhat compile          # artifacts/ for the deploy
+  python bench_rounds.py --node anvil --players 1,10,100,1000,5000
+  python bench_rounds.py --rpc http://127.0.0.1:8545 --players 50 --rounds 10
+
+--node anvil|hardhat spawns the node (anvil with --gas-limit, hardhat with
+HARDHAT_BLOCK_GAS_LIMIT); without it, --rpc must point at a running dev node
+that supports evm_increaseTime and hardhat_setStorageAt/setBalance.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from web3 import Web3
+from eth_account import Account
+
+BACKEND_DIR   = Path(__file__).resolve().parent
+CONTRACTS_DIR = BACKEND_DIR.parent.parent / "contracts"
+ARTIFACTS_DIR = CONTRACTS_DIR / "artifacts" / "src"
+
+# Account #0 of the default hardhat / anvil mnemonic (public, dev chains only)
+DEV_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+# Vault402Binary storage layout: owner, predictContract, aiAgent, balances, autoBetEnabled
+VAULT_BALANCES_SLOT = 3
+VAULT_AUTOBET_SLOT  = 4
+
+
+# ═══════════════════════════════════════════════════
+#  Local chain helpers
+# ═══════════════════════════════════════════════════
+
+def _rpc_batch(url: str, calls: list[tuple[str, list]], chunk: int = 500):
+    """Send raw JSON-RPC calls in batches (dev-node cheat codes are not in web3's API)."""
+    session = requests.Session()
+    for i in range(0, len(calls), chunk):
+        body = [{"jsonrpc": "2.0", "id": i + j, "method": m, "params": p}
+                for j, (m, p) in enumerate(calls[i:i + chunk])]
+        resp = session.post(url, json=body, timeout=60)
+        resp.raise_for_status()
+        errors = [r["error"] for r in resp.json() if "error" in r]
+        if errors:
+            raise RuntimeError(f"RPC batch failed: {errors[0]}")
+
+
+def _mapping_slot(key: str, slot: int) -> str:
+    """Storage slot of mapping(address => ...)[key] declared at `slot`, as an RPC quantity."""
+    raw = Web3.solidity_keccak(["uint256", "uint256"], [int(key, 16), slot])
+    return hex(int.from_bytes(raw, "big"))
+
+
+def _word(value: int) -> str:
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def _load_artifact(name: str) -> dict:
+    path = ARTIFACTS_DIR / f"{name}.sol" / f"{name}.json"
+    if not path.exists():
+        print(f"[bench] {path.relative_to(CONTRACTS_DIR)} missing, running hardhat compile...")
+        subprocess.run(["npx", "hardhat", "compile"], cwd=CONTRACTS_DIR, check=True)
+    return json.loads(path.read_text())
+
+
+def _transact(w3: Web3, acct, tx: dict) -> dict:
+    tx = {"gas": 8_000_000, "gasPrice": w3.eth.gas_price, **tx, "from": acct.address,
+          "nonce": w3.eth.get_transaction_count(acct.address, "pending"), "chainId": w3.eth.chain_id}
+    signed = acct.sign_transaction(tx)
+    receipt = w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(signed.raw_transaction))
+    if receipt.status != 1:
+        raise RuntimeError(f"Setup tx reverted: {tx.get('to') or 'deploy'}")
+    return receipt
+
+
+def deploy(w3: Web3, acct) -> tuple[str, str]:
+    """Deploy and wire Predict402 + Vault402Binary the way scripts/deploy-binary.js does."""
+    addrs = {}
+    for name in ("Predict402", "Vault402Binary"):
+        art = _load_artifact(name)
+        receipt = _transact(w3, acct, {"data": art["bytecode"]})
+        addrs[name] = (receipt.contractAddress, art["abi"])
+    predict = w3.eth.contract(address=addrs["Predict402"][0], abi=addrs["Predict402"][1])
+    vault = w3.eth.contract(address=addrs["Vault402Binary"][0], abi=addrs["Vault402Binary"][1])
+    for fn in (predict.functions.setVault(vault.address), vault.functions.setPredictContract(predict.address)):
+        _transact(w3, acct, fn.build_transaction({"from": acct.address, "gas": 200_000,
+                                                  "gasPrice": w3.eth.gas_price}))
+    return predict.address, vault.address
+
+
+def fund_players(rpc_url: str, w3: Web3, vault_address: str, players: list[str], balance_wei: int):
+    """Credit vault balances and enable auto-bet by writing storage (2 slots per player, no txs)."""
+    calls = []
+    for p in players:
+        calls.append(("hardhat_setStorageAt", [vault_address, _mapping_slot(p, VAULT_BALANCES_SLOT), _word(balance_wei)]))
+        calls.append(("hardhat_setStorageAt", [vault_address, _mapping_slot(p, VAULT_AUTOBET_SLOT), _word(1)]))
+    calls.append(("hardhat_setBalance", [vault_address, hex(balance_wei * len(players) + 10 ** 18)]))
+    _rpc_batch(rpc_url, calls)
+    vault = w3.eth.contract(address=vault_address, abi=_load_artifact("Vault402Binary")["abi"])
+    if vault.functions.getBalance(players[0]).call() != balance_wei:
+        raise RuntimeError("Vault storage layout changed: update VAULT_*_SLOT")
+
+
+def chain_now(w3: Web3) -> int:
+    return w3.eth.get_block("latest")["timestamp"]
+
+
+# ═══════════════════════════════════════════════════
+#  Fake upstreams (Binance ticker, OpenGradient client)
+# ═══════════════════════════════════════════════════
+
+class FakeBinance:
+    """Local /api/v3/ticker/price with a seeded random-walk price and fixed latency."""
+
+    def __init__(self, seed: int, latency_ms: float, start_price: float = 65_000.0):
+        self._rng = random.Random(seed)
+        self._price = start_price
+        self._lock = threading.Lock()
+        bench = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_ms / 1000)
+                with bench._lock:
+                    bench._price *= 1 + bench._rng.gauss(0, 0.0005)
+                    price = bench._price
+                body = json.dumps({"symbol": "BTCUSDT", "price": f"{price:.2f}"}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/api/v3/ticker/price?symbol=BTCUSDT"
+
+
+class _FakeModelOutput:
+    def __init__(self, value: float):
+        self.numbers = {"prediction": np.array([value])}
+        self.is_simulation_result = True
+
+
+class _FakeAlpha:
+    def __init__(self, seed: int, latency_ms: float):
+        self._rng = random.Random(seed)
+        self._latency = latency_ms / 1000
+
+    def run_workflow(self, contract_address):
+        time.sleep(self._latency)
+        return _FakeModelOutput(self._rng.uniform(-0.02, 0.02))
+
+    read_workflow_result = run_workflow
+
+
+def fake_og_client(seed: int, latency_ms: float):
+    """Factory standing in for og.Client: AIModelOracle only touches client.alpha.*."""
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.alpha = _FakeAlpha(seed, latency_ms)
+    return FakeClient
+
+
+class BenchClock:
+    """Stands in for the `time` module inside agent.py: time() follows chain time."""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+# ═══════════════════════════════════════════════════
+#  Single run: one player count, fresh contracts
+# ═══════════════════════════════════════════════════
+
+def _percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+def _mean(values: list[float]) -> float | None:
+    return round(float(np.mean(values)), 1) if values else None
+
+
+def _wait(predicate, timeout: float, poll: float = 0.05) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(poll)
+    return False
+
+
+def run_single(args) -> dict:
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    acct = Account.from_key(args.key)
+    predict_address, vault_address = deploy(w3, acct)
+
+    players = [Account.from_key(Web3.keccak(text=f"bench-{args.seed}-{i}")).address for i in range(args.players)]
+    fund_players(args.rpc, w3, vault_address, players, Web3.to_wei(args.player_balance_eth, "ether"))
+
+    workdir = tempfile.mkdtemp(prefix="bench402-")
+    os.environ.update({
+        "RPC_URL": args.rpc,
+        "CHAIN_ID": str(w3.eth.chain_id),
+        "PRIVATE_KEY": args.key,
+        "CONTRACT_ADDRESS": predict_address,
+        "VAULT_ADDRESS": vault_address,
+        "BOT_STATE_FILE": os.path.join(workdir, "bot_state.json"),
+        "ROUND_TRACE_FILE": os.path.join(workdir, "round_traces.jsonl"),
+        "TX_JOURNAL_FILE": os.path.join(workdir, "tx_journal.jsonl"),
+        "INDEXER_DB": os.path.join(workdir, "indexer.db"),
+        "AI_WORKFLOWS_FILE": os.path.join(workdir, "workflows.json"),
+        "AI_PREDICTIONS_FILE": os.path.join(workdir, "ai_predictions.json"),
+    })
+
+    import opengradient as og
+    og.Client = fake_og_client(args.seed, args.ai_latency_ms)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import agent
+
+    if not args.verbose:
+        agent.log.setLevel(logging.WARNING)
+    binance = FakeBinance(args.seed, args.price_latency_ms)
+    for asset in agent.PRICE_URLS_BINANCE:
+        agent.PRICE_URLS_BINANCE[asset] = binance.url
+    agent.ai_oracle.workflows = {"btc_xgboost": {"address": Web3.to_checksum_address("0x" + "b3" * 20)}}
+
+    clock = BenchClock()
+    clock.offset = chain_now(w3) - time.time()
+    agent.time = clock
+
+    for p in players:
+        agent._update_bot(p, lambda b: b.update(active=True, max_bet_eth=args.max_bet_eth))
+
+    predict = w3.eth.contract(address=predict_address, abi=agent.PREDICT_ABI)
+    threading.Thread(target=agent.auto_resolve, daemon=True).start()
+
+    # Round #1 comes from startFirstRound; its bets are traced under round 0
+    if not _wait(lambda: (agent.tracer.get(0) or {}).get("finished"), args.timeout):
+        raise RuntimeError("First round did not start (is the node up? see --verbose)")
+
+    transitions = []
+    for _ in range(args.rounds):
+        round_id = predict.functions.currentRoundId().call()
+        end_time = predict.functions.roundEndTime().call()
+
+        # Fast-forward to just before expiry; the rest of the round runs in real time
+        jump = end_time - args.lead_in - chain_now(w3)
+        if jump > 0:
+            _rpc_batch(args.rpc, [("evm_increaseTime", [jump])])
+            _rpc_batch(args.rpc, [("evm_mine", [])])
+        clock.offset = chain_now(w3) - time.time()
+
+        rpc_before = agent.metrics.count("rpc_request_seconds", by="method")
+        done = _wait(lambda: (agent.tracer.get(round_id) or {}).get("finished"), args.lead_in + args.timeout)
+        rpc_after = agent.metrics.count("rpc_request_seconds", by="method")
+
+        trace = agent.tracer.get(round_id) or {"spans": [], "summary": {}}
+        spans = {}
+        for s in trace["spans"]:
+            spans.setdefault(s["span"], s)
+        summary = trace.get("summary") or {}
+        batch_gas = spans.get("batch_mined", {}).get("gas_used")
+        batch_players = spans.get("prediction_done", {}).get("players")
+        transitions.append({
+            "round_id": round_id,
+            "finished": bool(done),
+            "rollover_ms": summary.get("rollover_ms"),
+            "bets_mined_ms": summary.get("bets_mined_ms"),
+            "resolve_attempts": summary.get("resolve_attempts"),
+            "rpc_calls": {m: int(n - rpc_before.get(m, 0)) for m, n in rpc_after.items() if n > rpc_before.get(m, 0)},
+            "resolve_gas": spans.get("resolve_mined", {}).get("gas_used"),
+            "start_gas": spans.get("start_mined", {}).get("gas_used"),
+            "batch_gas": batch_gas,
+            "batch_gas_per_player": round(batch_gas / batch_players) if batch_gas and batch_players else None,
+        })
+        if not done:
+            print(f"[bench] R#{round_id} did not finish within {args.timeout}s, stopping", file=sys.stderr)
+            break
+
+    ok = [t for t in transitions if t["finished"]]
+    rollover = [t["rollover_ms"] for t in ok if t["rollover_ms"] is not None]
+    bets = [t["bets_mined_ms"] for t in ok if t["bets_mined_ms"] is not None]
+    rpc_totals = [sum(t["rpc_calls"].values()) for t in ok]
+    by_method = {m: _mean([t["rpc_calls"].get(m, 0) for t in ok]) for m in
+                 sorted({m for t in ok for m in t["rpc_calls"]})}
+    return {
+        "players": args.players,
+        "rounds": len(transitions),
+        "failed_rounds": len(transitions) - len(ok),
+        "rollover_ms": {"p50": _percentile(rollover, 50), "p99": _percentile(rollover, 99)},
+        "bets_mined_ms": {"p50": _percentile(bets, 50), "p99": _percentile(bets, 99)},
+        "rpc_calls_per_round": _mean(rpc_totals),
+        "rpc_calls_by_method": by_method,
+        "gas": {
+            "resolve": _mean([t["resolve_gas"] for t in ok if t["resolve_gas"]]),
+            "start": _mean([t["start_gas"] for t in ok if t["start_gas"]]),
+            "batch": _mean([t["batch_gas"] for t in ok if t["batch_gas"]]),
+            "batch_per_player": _mean([t["batch_gas_per_player"] for t in ok if t["batch_gas_per_player"]]),
+        },
+        "transitions": transitions,
+    }
+
+
+# ═══════════════════════════════════════════════════
+#  Orchestration: one subprocess per player count
+# ═══════════════════════════════════════════════════
+
+def _spawn_node(kind: str, port: int, gas_limit: int) -> subprocess.Popen:
+    if kind == "anvil":
+        cmd, cwd, env = ["anvil", "--port", str(port), "--gas-limit", str(gas_limit), "--silent"], None, None
+    else:
+        cmd, cwd = ["npx", "hardhat", "node", "--port", str(port)], CONTRACTS_DIR
+        env = {**os.environ, "HARDHAT_BLOCK_GAS_LIMIT": str(gas_limit)}
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    w3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{port}"))
+    if not _wait(w3.is_connected, 60, poll=0.5):
+        proc.kill()
+        raise RuntimeError(f"{kind} node did not come up on port {port}")
+    return proc
+
+
+def _print_table(results: list[dict]):
+    head = f"{'players':>8} {'rounds':>6} {'fail':>4} {'rollover p50/p99 ms':>20} {'bets p50/p99 ms':>18} " \
+           f"{'rpc/round':>9} {'resolve gas':>11} {'gas/player':>10}"
+    print(head)
+    print("─" * len(head))
+    for r in results:
+        if "error" in r:
+            print(f"{r['players']:>8}  error: {r['error']}")
+            continue
+        fmt = lambda d: f"{d['p50']}/{d['p99']}"
+        print(f"{r['players']:>8} {r['rounds']:>6} {r['failed_rounds']:>4} {fmt(r['rollover_ms']):>20} "
+              f"{fmt(r['bets_mined_ms']):>18} {r['rpc_calls_per_round']!s:>9} {r['gas']['resolve']!s:>11} "
+              f"{r['gas']['batch_per_player']!s:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark round transitions against a local EVM")
+    parser.add_argument("--players", default="1,10,100", help="comma-separated bot player counts (1..5000)")
+    parser.add_argument("--rounds", type=int, default=5, help="measured transitions per player count")
+    parser.add_argument("--rpc", default="http://127.0.0.1:8545")
+    parser.add_argument("--node", choices=("anvil", "hardhat"), help="spawn a local node on --rpc's port")
+    parser.add_argument("--gas-limit", type=int, default=1_000_000_000, help="block gas limit for a spawned node")
+    parser.add_argument("--key", default=DEV_KEY, help="keeper / deployer key (default: dev account #0)")
+    parser.add_argument("--seed", type=int, default=402)
+    parser.add_argument("--price-latency-ms", type=float, default=50)
+    parser.add_argument("--ai-latency-ms", type=float, default=1500)
+    parser.add_argument("--max-bet-eth", type=float, default=0.01)
+    parser.add_argument("--player-balance-eth", type=float, default=1.0)
+    parser.add_argument("--lead-in", type=int, default=5, help="seconds of real time before each round end")
+    parser.add_argument("--timeout", type=float, default=120, help="per-transition timeout (s)")
+    parser.add_argument("--out", help="write full results (incl. per-round data) as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep agent INFO logs")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        args.players = int(args.players)
+        print(json.dumps(run_single(args)))
+        return
+
+    counts = [int(n) for n in args.players.split(",")]
+    if any(not 1 <= n <= 5000 for n in counts):
+        parser.error("player counts must be within 1..5000")
+
+    node = _spawn_node(args.node, int(args.rpc.rsplit(":", 1)[1]), args.gas_limit) if args.node else None
+    results = []
+    try:
+        for n in counts:
+            print(f"[bench] {n} players × {args.rounds} rounds...", flush=True)
+            child = {**vars(args), "players": n}
+            cmd = [sys.executable, __file__, "--single"]
+            for name, value in child.items():
+                if name in ("node", "gas_limit", "out", "single") or value in (None, False):
+                    continue
+                cmd += [f"--{name.replace('_', '-')}"] + ([] if value is True else [str(value)])
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            try:
+                results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            except (IndexError, json.JSONDecodeError):
+                results.append({"players": n, "error": (proc.stderr.strip().splitlines() or ["no output"])[-1]})
+    finally:
+        if node:
+            os.killpg(node.pid, signal.SIGTERM)
+
+    print()
+    _print_table(results)
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+        print(f"\nFull results → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
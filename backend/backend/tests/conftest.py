@@ -0,0 +1,35 @@
+"""Shared setup: import agent once (SERVER_MODE=dev) with every state file in a temp dir.
+
+The RPC URL points at a closed port, so nothing here touches a chain
+unless a test brings its own (see test_indexer.py).
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+STATE_DIR = Path(tempfile.mkdtemp(prefix="predict402-tests-"))
+
+os.environ.update({
+    "SERVER_MODE": "dev",
+    "ROLE": "all",
+    "RPC_URL": "http://127.0.0.1:9",
+    "CONTRACT_ADDRESS": "0x5FbDB2315678afecb367f032d93F642f64180aa3",
+    "BOT_STATE_FILE": str(STATE_DIR / "bot_state.json"),
+    "INDEXER_DB": str(STATE_DIR / "indexer.db"),
+    "TX_JOURNAL_FILE": str(STATE_DIR / "tx_journal.jsonl"),
+    "ROUND_TRACE_FILE": str(STATE_DIR / "round_traces.jsonl"),
+    "AI_WORKFLOWS_FILE": str(STATE_DIR / "workflows.json"),
+    "AI_PREDICTIONS_FILE": str(STATE_DIR / "ai_predictions.json"),
+})
+sys.path.insert(0, str(AGENT_DIR))
+
+
+@pytest.fixture(scope="session")
+def agent():
+    import agent as module
+    return module
@@ -0,0 +1,101 @@
+"""Admission control: per-IP token buckets, client keys behind ProxyFix, keeper priority."""
+
+import threading
+import time
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+
+@pytest.fixture
+def pool(agent, monkeypatch):
+    monkeypatch.setattr(agent, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(agent, "ADMISSION_QUEUE_WAIT_SEC", 0.3)
+    # workers, queue, priority workers, 6/min per IP, burst 2
+    return agent.AdmissionPool("test", 1, 1, 0, 6, 2)
+
+
+def _enter(pool, client):
+    with pool.admit(client):
+        pass
+
+
+def test_bucket_empties_then_refills(agent, pool):
+    _enter(pool, "1.2.3.4")
+    _enter(pool, "1.2.3.4")
+    with pytest.raises(agent.Overloaded) as e:
+        _enter(pool, "1.2.3.4")
+    assert (e.value.status, e.value.reason) == (429, "rate_limited")
+    assert e.value.retry_after == 10               # one token at 6/min
+    _enter(pool, "5.6.7.8")                        # other clients have their own bucket
+
+    # 10 seconds later one token is back, not the whole burst
+    pool._buckets["1.2.3.4"][1] -= 10
+    _enter(pool, "1.2.3.4")
+    with pytest.raises(agent.Overloaded):
+        _enter(pool, "1.2.3.4")
+
+    # A long idle period refills up to the burst and no further
+    pool._buckets["1.2.3.4"][1] -= 3600
+    _enter(pool, "1.2.3.4")
+    _enter(pool, "1.2.3.4")
+    with pytest.raises(agent.Overloaded):
+        _enter(pool, "1.2.3.4")
+
+
+def test_keeper_priority_shrinks_the_pool(agent, pool):
+    assert pool.limit() == 1
+    with agent.admission.critical():
+        assert agent.admission.keeper_priority()
+        assert pool.limit() == 0
+        with pytest.raises(agent.Overloaded) as e:   # waits out ADMISSION_QUEUE_WAIT_SEC
+            _enter(pool, "1.2.3.4")
+        assert (e.value.status, e.value.reason) == (503, "queue_timeout")
+    assert not agent.admission.keeper_priority()
+    _enter(pool, "1.2.3.4")
+
+
+def test_queued_request_runs_when_priority_ends(agent, pool, monkeypatch):
+    monkeypatch.setattr(agent, "ADMISSION_QUEUE_WAIT_SEC", 5)
+    entered = threading.Event()
+    with agent.admission.critical():
+        waiter = threading.Thread(target=lambda: (_enter(pool, "1.2.3.4"), entered.set()))
+        waiter.start()
+        while not pool.waiting:
+            time.sleep(0.01)
+        with pytest.raises(agent.Overloaded) as e:   # the one queue slot is taken
+            _enter(pool, "5.6.7.8")
+        assert e.value.reason == "queue_full"
+        assert not entered.is_set()
+    waiter.join(2)
+    assert entered.is_set()
+    assert (pool.active, pool.waiting) == (0, 0)
+
+
+@pytest.fixture
+def client(agent, monkeypatch):
+    monkeypatch.setattr(agent, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(agent.admission.pools["bot_bet"], "_buckets", {})
+    return agent.app.test_client()
+
+
+def _bot_bet(client, forwarded_for):
+    # No bot is running for this player, so an admitted request is a quick 400
+    return client.post("/api/bot/bet", json={"player": "0x" + "a1" * 20},
+                       headers={"X-Forwarded-For": forwarded_for}).status_code
+
+
+def test_clients_keyed_by_forwarded_for_behind_proxy(agent, client, monkeypatch):
+    monkeypatch.setattr(agent.app, "wsgi_app", ProxyFix(agent.app.wsgi_app, x_for=1))
+    assert [_bot_bet(client, "10.0.0.1") for _ in range(3)] == [400, 400, 429]
+    assert _bot_bet(client, "10.0.0.2") == 400
+    # Only the address the trusted proxy appended counts, not what the client sent before it
+    assert _bot_bet(client, "10.0.0.9, 10.0.0.1") == 429
+
+
+def test_forwarded_for_ignored_without_trusted_proxy(agent, client):
+    assert [_bot_bet(client, "10.0.0.1") for _ in range(2)] == [400, 400]
+    response = client.post("/api/bot/bet", json={"player": "0x" + "a1" * 20},
+                           headers={"X-Forwarded-For": "10.0.0.2"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
@@ -0,0 +1,26 @@
+"""Copy-on-write bot state: published snapshots never change under their readers."""
+
+PLAYER = "0x" + "d4" * 20
+
+
+def test_update_leaves_published_snapshot_untouched(agent):
+    agent._update_bot(PLAYER, lambda b: b.update({"strategy": {"min_confidence": 60}, "logs": ["started"],
+                                                   "last_prediction": {"direction": "UP"}}))
+    before = agent._get_bot(PLAYER)
+    version = agent._strategy_version
+
+    def mutate(bot):
+        bot["strategy"]["min_confidence"] = 75
+        bot["markets"].append("eth")
+        bot["last_prediction"]["direction"] = "DOWN"
+        bot["logs"].append("updated")
+
+    after = agent._update_bot(PLAYER, mutate)
+    assert before["strategy"] == {"min_confidence": 60}
+    assert before["markets"] == [agent.DEFAULT_MARKET]
+    assert before["last_prediction"] == {"direction": "UP"}
+    assert before["logs"] == ["started"]
+    assert (after["strategy"], after["markets"][-1]) == ({"min_confidence": 75}, "eth")
+    assert agent._get_bot(PLAYER) is after
+    # The in-place strategy change is seen as a change, so the StrategyTables rebuild
+    assert agent._strategy_version > version
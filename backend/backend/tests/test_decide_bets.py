@@ -0,0 +1,85 @@
+"""decide_bets: tiers, contrarian mode, min_confidence, missing signals, per-round gating."""
+
+import math
+
+import numpy as np
+import pytest
+
+
+def _bot(max_bet=0.01, **strategy):
+    return {"active": True, "max_bet_eth": max_bet, "strategy": strategy}
+
+
+@pytest.fixture
+def table(agent):
+    m = agent.default_market
+
+    def build(bots: dict[str, dict]):
+        return agent.StrategyTable.columns(m, sorted(bots), bots)
+    return m, build
+
+
+def _signal(direction="UP", confidence=80.0):
+    return {"direction": direction, "confidence": confidence, "predicted_return": 0.01}
+
+
+def test_tiers_scale_max_bet(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot(1.0), "0xb": _bot(1.0), "0xc": _bot(1.0)})
+    # time_factor=1: adjusted confidence == model confidence, size == max_bet * tier
+    for confidence, tier in ((80.0, 1.0), (65.0, 0.5), (40.0, 0.25)):
+        rows, size, up, adjusted = agent.decide_bets(cols, {m.model_key: _signal(confidence=confidence)}, 1.0, 7)
+        assert list(rows) == [0, 1, 2]
+        assert np.allclose(size, tier)
+        assert up.all()
+        assert np.allclose(adjusted, confidence)
+
+
+def test_contrarian_flips_direction(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot(), "0xb": _bot(mode="contrarian")})
+    rows, _, up, _ = agent.decide_bets(cols, {m.model_key: _signal("UP")}, 1.0, 7)
+    assert list(up) == [True, False]
+    rows, _, up, _ = agent.decide_bets(cols, {m.model_key: _signal("DOWN")}, 1.0, 7)
+    assert list(up) == [False, True]
+
+
+def test_min_confidence_and_zero_tier_sit_out(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot(min_confidence=70.0), "0xb": _bot(bet_scaling={"high": 100, "mid": 50, "low": 0}),
+                  "0xc": _bot()})
+    rows, *_ = agent.decide_bets(cols, {m.model_key: _signal(confidence=50.0)}, 1.0, 7)
+    assert list(rows) == [2]
+
+
+def test_missing_signal_means_no_bet(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot()})
+    rows, *_ = agent.decide_bets(cols, {}, 1.0, 7)
+    assert len(rows) == 0
+
+
+def test_last_bet_gates_unless_forced(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot(), "0xb": _bot()})
+    cols["last_bet"][0] = 7
+    signals = {m.model_key: _signal()}
+    assert list(agent.decide_bets(cols, signals, 1.0, 7)[0]) == [1]
+    assert list(agent.decide_bets(cols, signals, 1.0, 8)[0]) == [0, 1]
+    assert list(agent.decide_bets(cols, signals, 1.0, 7, force=True)[0]) == [0, 1]
+
+
+def test_non_finite_max_bet_skips_only_that_bot(agent, table):
+    m, build = table
+    cols = build({"0xa": _bot(math.nan), "0xb": _bot(math.inf), "0xc": _bot(0.02)})
+    rows, size, *_ = agent.decide_bets(cols, {m.model_key: _signal()}, 1.0, 7)
+    assert list(rows) == [2]
+    assert np.isfinite(size).all()
+
+
+@pytest.mark.parametrize("literal", ["NaN", "Infinity", '"NaN"', '"Infinity"', "-1", "0", '"abc"', "null"])
+def test_bot_start_rejects_bad_max_bet(agent, literal):
+    body = '{"player": "0x%s", "max_bet_eth": %s}' % ("1" * 40, literal)
+    r = agent.app.test_client().post("/api/bot/start", data=body, content_type="application/json")
+    assert r.status_code == 400
+    assert "max_bet_eth" in r.get_json()["error"]
@@ -0,0 +1,42 @@
+"""X402Oracle.get_ensemble answer: direction by vote, confidence = mean of the agreeing models."""
+
+import time
+
+import pytest
+
+
+@pytest.fixture
+def oracle(agent):
+    def make(replies: dict[str, tuple[str, float, float]]):
+        oracle = object.__new__(agent.X402Oracle)
+
+        def complete(label):
+            direction, confidence, delay = replies[label]
+            time.sleep(delay)
+            return {"model": label, "direction": direction, "confidence": confidence, "reason": "",
+                    "payment_hash": f"0x{label}", "raw_output": ""}
+        oracle._complete = complete
+        return oracle
+    return make
+
+
+def test_single_answer_keeps_its_confidence(agent, oracle):
+    result = oracle({"gpt-4o": ("UP", 55.0, 0)}).get_ensemble(["gpt-4o"], mode="vote", deadline=2)
+    assert result["direction"] == "UP"
+    assert result["confidence"] == 55.0
+    assert result["ensemble"]["agreement"] == 1.0
+
+
+def test_vote_reports_mean_of_agreeing_models(agent, oracle):
+    replies = {"gpt-4o": ("UP", 60.0, 0.05), "gpt-4-1": ("UP", 80.0, 0.1), "claude-sonnet": ("DOWN", 90.0, 0)}
+    result = oracle(replies).get_ensemble(list(replies), mode="vote", deadline=2)
+    assert result["direction"] == "UP"            # 140 vs 90
+    assert result["confidence"] == 70.0
+    assert result["ensemble"]["agreement"] == pytest.approx(0.67, abs=0.01)
+
+
+def test_first_mode_is_the_first_reply(agent, oracle):
+    replies = {"gpt-4o": ("DOWN", 58.0, 0), "gpt-4-1": ("UP", 90.0, 0.3)}
+    result = oracle(replies).get_ensemble(list(replies), mode="first", deadline=2)
+    assert result["direction"] == "DOWN"
+    assert result["confidence"] == 58.0
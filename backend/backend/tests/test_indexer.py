@@ -0,0 +1,173 @@
+"""ChainIndexer against a local eth-tester chain: history, leaderboard and a forced reorg.
+
+There is no solc here, so Predict402 is stood in for by a tiny hand-assembled
+contract that emits whatever logs its calldata describes. Its address
+is what the indexer follows, and the logs are encoded from PREDICT_ABI,
+so the indexer decodes them exactly as it would the real contract's.
+"""
+
+import pytest
+
+eth_abi = pytest.importorskip("eth_abi")
+pytest.importorskip("eth_tester")
+
+from web3 import EthereumTesterProvider, Web3
+
+OPS = {"STOP": 0x00, "ADD": 0x01, "LT": 0x10, "EQ": 0x14, "ISZERO": 0x15, "SHL": 0x1B, "CALLDATALOAD": 0x35,
+       "CALLDATASIZE": 0x36, "CALLDATACOPY": 0x37, "CODECOPY": 0x39, "POP": 0x50, "MLOAD": 0x51,
+       "MSTORE": 0x52, "JUMP": 0x56, "JUMPI": 0x57, "JUMPDEST": 0x5B, "RETURN": 0xF3}
+
+
+def _assemble(program: list) -> bytes:
+    """Ops by name, ("PUSH1", n), ("PUSH2", label), ("DUP", n), ("LOG", n) and ("LABEL", name)."""
+    labels, size = {}, 0
+    for item in program:
+        if isinstance(item, tuple) and item[0] == "LABEL":
+            labels[item[1]] = size
+        size += {"PUSH1": 2, "PUSH2": 3}.get(item[0], 1) if isinstance(item, tuple) else 1
+    code = bytearray()
+    for item in program:
+        if not isinstance(item, tuple):
+            code.append(OPS[item])
+        elif item[0] == "LABEL":
+            code.append(OPS["JUMPDEST"])
+        elif item[0] == "PUSH1":
+            code += bytes([0x60, item[1]])
+        elif item[0] == "PUSH2":
+            code += bytes([0x61]) + labels[item[1]].to_bytes(2, "big")
+        elif item[0] == "DUP":
+            code.append(0x7F + item[1])
+        elif item[0] == "LOG":
+            code.append(0xA0 + item[1])
+    return bytes(code)
+
+
+def _emitter_code() -> bytes:
+    """Init code of a contract that emits the logs in its calldata.
+
+    Calldata is a list of records [n topics][data length][topic]*n[data];
+    memory word 0 holds the read offset, data is staged from 0x20.
+    """
+    body = [
+        ("LABEL", "loop"),
+        "CALLDATASIZE", ("PUSH1", 0), "MLOAD", "LT", "ISZERO", ("PUSH2", "end"), "JUMPI",
+        ("PUSH1", 0), "MLOAD",                                                  # p
+        ("DUP", 1), "CALLDATALOAD",                                             # p n
+        ("DUP", 2), ("PUSH1", 32), "ADD", "CALLDATALOAD",                       # p n len
+        ("DUP", 2), ("PUSH1", 5), "SHL", ("PUSH1", 64), "ADD", ("DUP", 4), "ADD",  # p n len data
+        ("DUP", 2), ("DUP", 2), ("PUSH1", 0x20), "CALLDATACOPY",
+        ("DUP", 2), "ADD", ("PUSH1", 0), "MSTORE",                              # next record; p n len
+    ]
+    for k in (1, 2, 3):
+        body += [("DUP", 2), ("PUSH1", k), "EQ", ("PUSH2", f"log{k}"), "JUMPI"]
+    body += [("PUSH2", "log4"), "JUMP"]
+    for k in (1, 2, 3, 4):
+        body.append(("LABEL", f"log{k}"))
+        for j, i in enumerate(range(k - 1, -1, -1)):
+            body += [("DUP", 3 + j), ("PUSH1", 64 + 32 * i), "ADD", "CALLDATALOAD"]
+        body += [("DUP", k + 1), ("PUSH1", 0x20), ("LOG", k), "POP", "POP", "POP", ("PUSH2", "loop"), "JUMP"]
+    body += [("LABEL", "end"), "STOP"]
+    runtime = _assemble(body)
+    size = len(runtime).to_bytes(2, "big")
+    # codecopy(0, 15, size); return(0, size) — 15 is the length of this init code
+    init = b"\x61" + size + b"\x61\x00\x0f\x60\x00\x39" + b"\x61" + size + b"\x60\x00\xf3"
+    return init + runtime
+
+
+class Chain:
+    def __init__(self, agent):
+        self.agent = agent
+        self.w3 = Web3(EthereumTesterProvider())
+        self.account = self.w3.eth.accounts[0]
+        tx = self.w3.eth.send_transaction({"from": self.account, "data": _emitter_code(), "gas": 1_000_000})
+        self.address = self.w3.eth.get_transaction_receipt(tx)["contractAddress"]
+        self.abi = {e["name"]: e for e in agent.PREDICT_ABI if e.get("type") == "event"}
+
+    def record(self, name: str, **args) -> bytes:
+        event = self.abi[name]
+        types = [i["type"] for i in event["inputs"]]
+        topics = [Web3.keccak(text=f"{name}({','.join(types)})")]
+        topics += [eth_abi.encode([i["type"]], [args[i["name"]]]) for i in event["inputs"] if i["indexed"]]
+        plain = [i for i in event["inputs"] if not i["indexed"]]
+        data = eth_abi.encode([i["type"] for i in plain], [args[i["name"]] for i in plain])
+        return (len(topics).to_bytes(32, "big") + len(data).to_bytes(32, "big") + b"".join(topics) + data)
+
+    def emit(self, *records: bytes):
+        """One transaction (one block) emitting `records` in order."""
+        tx = self.w3.eth.send_transaction({"from": self.account, "to": self.address, "data": b"".join(records),
+                                           "gas": 1_000_000})
+        assert self.w3.eth.get_transaction_receipt(tx)["status"] == 1
+
+
+ALICE = "0x" + "a1" * 20
+BOB = "0x" + "b0" * 20
+ETH = 10 ** 18
+
+
+def _round(chain, round_id, bets, up_won, payouts):
+    chain.emit(chain.record("RoundStarted", roundId=round_id, strikePrice=100_00, startTime=0, endTime=300))
+    chain.emit(*[chain.record("BetPlaced", player=p, roundId=round_id, isUp=up, amount=amount, nickname="",
+                              usedAi=False) for p, up, amount in bets])
+    up_pool = sum(a for _, up, a in bets if up)
+    down_pool = sum(a for _, up, a in bets if not up)
+    chain.emit(*[chain.record("Payout", player=p, amount=a) for p, a in payouts],
+               chain.record("RoundResolved", roundId=round_id, upWon=up_won, closingPrice=101_00, upPool=up_pool,
+                            downPool=down_pool, totalPool=up_pool + down_pool))
+
+
+@pytest.fixture
+def chain(agent):
+    return Chain(agent)
+
+
+@pytest.fixture
+def indexer(agent, chain, tmp_path):
+    return agent.ChainIndexer(chain.w3, chain.address, None, str(tmp_path / "indexer.db"), confirmations=0)
+
+
+def test_history_and_leaderboard(agent, chain, indexer):
+    chain.emit(chain.record("NicknameRegistered", player=BOB, nickname="bob"))
+    chain.emit(chain.record("NicknameRegistered", player="0x" + "c3" * 20, nickname="no bets yet"))
+    _round(chain, 1, [(ALICE, True, ETH), (BOB, False, ETH)], up_won=True, payouts=[(ALICE, 19 * ETH // 10)])
+
+    assert indexer.sync_once() > 0
+    assert indexer.complete()      # scanned from the deployment block
+
+    board = indexer.leaderboard()
+    assert board["total_players"] == 2            # the nickname-only player is not ranked
+    alice, bob = board["entries"]
+    assert (alice["player"], alice["total_wins"], alice["total_bets"]) == (ALICE, 1, 1)
+    assert alice["pnl_eth"] == pytest.approx(0.9)
+    assert (bob["player"], bob["nickname"], bob["total_wins"], bob["pnl_eth"]) == (BOB, "bob", 0, -1.0)
+    assert indexer.nickname("0x" + "c3" * 20) == "no bets yet"
+
+    [bet] = indexer.bet_history(ALICE)
+    assert (bet["round_id"], bet["direction"], bet["status"]) == (1, "UP", "won")
+    assert bet["round_payout_eth"] == pytest.approx(1.9)
+    [result] = indexer.round_results()
+    assert (result["round_id"], result["result"], result["bets"]) == (1, "UP", 2)
+
+
+def test_reorg_rewinds_and_reindexes(agent, chain, indexer):
+    _round(chain, 1, [(ALICE, True, ETH), (BOB, False, ETH)], up_won=True, payouts=[(ALICE, 19 * ETH // 10)])
+    fork = chain.w3.testing.snapshot()
+    _round(chain, 2, [(ALICE, True, ETH), (BOB, False, ETH)], up_won=True, payouts=[(ALICE, 19 * ETH // 10)])
+    indexer.sync_once()
+    assert indexer.leaderboard()["entries"][0]["total_wins"] == 2
+    assert indexer.leaderboard_version()[0] == 2
+
+    # Replace round 2 with a longer branch where Bob wins
+    chain.w3.testing.revert(fork)
+    _round(chain, 2, [(ALICE, True, ETH), (BOB, False, 2 * ETH)], up_won=False, payouts=[(BOB, 28 * ETH // 10)])
+    chain.w3.testing.mine(2)
+
+    assert indexer.sync_once() == 0               # detects the reorg and rewinds
+    assert indexer.checkpoint()[0] is None or indexer.checkpoint()[0] < chain.w3.eth.block_number
+    indexer.sync_once()
+
+    board = {e["player"]: e for e in indexer.leaderboard()["entries"]}
+    assert (board[ALICE]["total_wins"], board[ALICE]["total_bets"]) == (1, 2)
+    assert (board[BOB]["total_wins"], board[BOB]["total_bets"]) == (1, 2)
+    assert board[BOB]["pnl_eth"] == pytest.approx(2.8 - 3.0)
+    assert [b["status"] for b in indexer.bet_history(BOB)] == ["won", "lost"]
+    assert indexer.round_results()[0]["result"] == "DOWN"
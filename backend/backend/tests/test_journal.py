@@ -0,0 +1,133 @@
+"""TxJournal replay/compaction and reattaching to journaled transactions on an eth-tester chain."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("eth_tester")
+
+from web3 import EthereumTesterProvider, Web3
+
+BOB = Web3.to_checksum_address("0x" + "b0" * 20)
+
+
+def _lines(path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_replay_folds_and_compacts(agent, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    records = [
+        {"t": "sent", "key": "btc:7:startNewRound", "label": "startNewRound", "hash": "0x01", "tx": {"nonce": 1}},
+        {"t": "sent", "key": "btc:7:placeBetBatch:ab", "label": "placeBetBatch", "hash": "0x02", "tx": {"nonce": 2},
+         "meta": {"players": ["0xa1"]}},
+        {"t": "sent", "key": "btc:7:placeBetBatch:ab", "label": "placeBetBatch", "hash": "0x03", "tx": {"nonce": 2}},
+        {"t": "done", "key": "btc:7:startNewRound", "outcome": "mined"},
+        {"t": "phase", "market": "btc", "set": {"started": 7}},
+        {"t": "phase", "market": "btc", "set": {"resolved": 6, "attempts": 0}},
+    ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + '{"t": "sent", "key": "bt')   # torn write
+
+    journal = agent.TxJournal(str(path))
+    assert journal.replay() == 1
+    entry = journal.get("btc:7:placeBetBatch:ab")
+    assert (entry["market"], entry["round_id"], entry["label"]) == ("btc", 7, "placeBetBatch")
+    assert [v["hash"] for v in entry["versions"]] == ["0x02", "0x03"]
+    assert entry["meta"] == {"players": ["0xa1"]}
+    assert journal.phases_of("btc") == {"started": 7, "resolved": 6, "attempts": 0}
+    assert journal.get("btc:7:startNewRound") is None
+
+    # Rewritten to just what is still open, and appendable afterwards
+    assert [r["t"] for r in _lines(path)] == ["sent", "sent", "phase"]
+    journal.done("btc:7:placeBetBatch:ab", "mined")
+    again = agent.TxJournal(str(path))
+    assert again.replay() == 0
+    assert again.phases_of("btc") == {"started": 7, "resolved": 6, "attempts": 0}
+    journal._file.close()
+    again._file.close()
+
+
+class Chain:
+    def __init__(self, agent, monkeypatch, tmp_path):
+        provider = EthereumTesterProvider()
+        self.w3 = Web3(provider)
+        self.key = provider.ethereum_tester.backend.account_keys[0]
+        self.address = self.w3.eth.accounts[0]
+        self.journal = agent.TxJournal(str(tmp_path / "journal.jsonl"))
+        monkeypatch.setattr(agent, "w3", self.w3)
+        monkeypatch.setattr(agent, "PRIVATE_KEY", self.key)
+        monkeypatch.setattr(agent, "journal", self.journal)
+
+    def tx(self, nonce: int, value: int = 1) -> dict:
+        return {"from": self.address, "to": BOB, "value": value, "nonce": nonce, "gas": 21000,
+                "maxFeePerGas": 10 ** 10, "maxPriorityFeePerGas": 10 ** 9, "chainId": self.w3.eth.chain_id}
+
+    def send(self, tx: dict):
+        return self.w3.eth.send_raw_transaction(self.w3.eth.account.sign_transaction(tx, self.key).raw_transaction)
+
+    def journaled(self, key: str, tx: dict, tx_hash=None, meta=None) -> dict:
+        """Journal `tx` as sent; without tx_hash it never reached the node (crash right after signing)."""
+        if tx_hash is None:
+            tx_hash = self.w3.eth.account.sign_transaction(tx, self.key).hash
+        self.journal.sent(key, key.split(":")[2], tx_hash, tx, meta)
+        return self.journal.get(key)
+
+
+@pytest.fixture
+def chain(agent, monkeypatch, tmp_path):
+    chain = Chain(agent, monkeypatch, tmp_path)
+    yield chain
+    chain.journal._file.close()
+
+
+def test_reattach_finds_the_mined_version(agent, chain):
+    tx = chain.tx(chain.w3.eth.get_transaction_count(chain.address))
+    tx_hash = chain.send(tx)
+    entry = chain.journaled("btc:3:resolveRound", tx, tx_hash)
+
+    _, got_hash, receipt = agent._reattach(entry, timeout=5, trace=None, replace=False)
+    assert (got_hash, receipt.status) == (tx_hash, 1)
+    assert chain.journal.get("btc:3:resolveRound") is None
+
+
+def test_reattach_resends_a_version_the_node_never_got(agent, chain):
+    tx = chain.tx(chain.w3.eth.get_transaction_count(chain.address))
+    entry = chain.journaled("btc:3:resolveRound", tx)
+
+    _, tx_hash, receipt = agent._reattach(entry, timeout=5, trace=None, replace=False)
+    assert receipt.status == 1
+    assert chain.w3.eth.get_transaction(tx_hash)["nonce"] == tx["nonce"]
+
+
+def test_reattach_gives_up_when_the_nonce_went_elsewhere(agent, chain):
+    nonce = chain.w3.eth.get_transaction_count(chain.address)
+    entry = chain.journaled("btc:3:resolveRound", chain.tx(nonce))
+    chain.send(chain.tx(nonce, value=2))           # another tx took the nonce
+
+    assert agent._reattach(entry, timeout=0.5, trace=None, replace=False) is None
+    assert chain.journal.get("btc:3:resolveRound") is None     # done as "dropped": the caller sends afresh
+
+
+def test_recovered_batch_stays_journaled_until_recorded(agent, chain, monkeypatch):
+    tx = chain.tx(chain.w3.eth.get_transaction_count(chain.address))
+    key = "btc:4:placeBetBatch:ab"
+    entry = chain.journaled(key, tx, chain.send(tx), meta={"players": ["0xa1"]})
+    market = SimpleNamespace(asset="btc", tag="[BTC]")
+
+    def lost(*args):
+        raise agent.LeaseLost("fencing token 3 is stale")
+
+    # Mined, but the bookkeeping was fenced off: the next keeper still finds it in the journal
+    monkeypatch.setattr(agent, "_record_batch", lost)
+    agent._recover_batch(market, entry)
+    assert chain.journal.get(key) is not None
+    assert "bets" not in chain.journal.phases_of("btc")
+
+    recorded = []
+    monkeypatch.setattr(agent, "_record_batch", lambda m, round_id, meta, tx_hash: recorded.append(round_id))
+    agent._recover_batch(market, chain.journal.get(key))
+    assert recorded == [4]
+    assert chain.journal.get(key) is None
+    assert chain.journal.phases_of("btc") == {"bets": 4}
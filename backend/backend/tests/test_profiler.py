@@ -0,0 +1,115 @@
+"""Profiler under both server modes.
+
+Each case imports agent in a fresh interpreter (SERVER_MODE is read, and
+gevent patches, at import time) with every state file under tmp_path and
+an RPC URL nothing listens on.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+
+SCRIPT = textwrap.dedent("""
+    import json, sys, time
+    import agent
+    profiler = agent.profiler
+
+    def busy_spin(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def idle_wait(seconds):
+        time.sleep(seconds)          # a gevent sleep once patched
+
+    def late_wait(seconds):
+        time.sleep(seconds)
+
+    def spawner():
+        # Under gevent this first runs once profile() has listed the greenlets: found by following switches
+        spawn(late_wait, 0.5)
+
+    def watched():
+        time.sleep(0.02)             # let the greenlets above start before the hub is blocked
+        with profiler.watch("test busy", 50):
+            busy_spin(0.4)
+
+    if agent.SERVER_MODE == "gevent":
+        import gevent
+        spawn = lambda fn, *args: gevent.spawn(fn, *args)
+        join = lambda task: task.join()
+    else:
+        import threading
+        def spawn(fn, *args):
+            t = threading.Thread(target=fn, args=args, name="test-" + fn.__name__)
+            t.start()
+            return t
+        join = lambda task: task.join()
+
+    idler = spawn(idle_wait, 1.0)
+    spawn(spawner)
+    worker = spawn(watched)
+    folded, samples = profiler.profile(0.3, 0.01)
+    join(worker)
+
+    # Profiler failures stay inside the profiler; the block's own errors still propagate
+    profiler._capture = lambda *args: 1 / 0
+    with profiler.watch("test broken capture", 1):
+        busy_spin(0.05)
+    try:
+        with profiler.watch("test raising body", 1):
+            raise KeyError("body")
+    except KeyError:
+        body_error = True
+    else:
+        body_error = False
+    join(idler)
+
+    capture = next(c for c in profiler.captures if c["label"] == "test busy")
+    json.dump({"greenlets": profiler.greenlets, "folded": folded, "samples": samples,
+               "capture": capture, "body_error": body_error}, sys.stdout)
+""")
+
+
+def run_profiler(tmp_path: Path, server_mode: str) -> dict:
+    env = {
+        **os.environ,
+        "SERVER_MODE": server_mode,
+        "RPC_URL": "http://127.0.0.1:9",
+        "CONTRACT_ADDRESS": "0x5FbDB2315678afecb367f032d93F642f64180aa3",
+        "BOT_STATE_FILE": str(tmp_path / "bot_state.json"),
+        "INDEXER_DB": str(tmp_path / "indexer.db"),
+        "TX_JOURNAL_FILE": str(tmp_path / "tx_journal.jsonl"),
+        "ROUND_TRACE_FILE": str(tmp_path / "round_traces.jsonl"),
+        "AI_WORKFLOWS_FILE": str(tmp_path / "workflows.json"),
+        "AI_PREDICTIONS_FILE": str(tmp_path / "ai_predictions.json"),
+        "SLOW_SAMPLE_MS": "5",
+    }
+    proc = subprocess.run([sys.executable, "-c", SCRIPT], cwd=AGENT_DIR, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-4000:]
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("server_mode", ["dev", "gevent"])
+def test_profile_and_slow_capture(tmp_path, server_mode):
+    if server_mode == "gevent":
+        pytest.importorskip("gevent")
+    result = run_profiler(tmp_path, server_mode)
+    assert result["greenlets"] == (server_mode == "gevent")
+    assert result["samples"] > 0
+    # The CPU-bound worker is seen while it runs, the sleeping one while it waits
+    assert "busy_spin" in result["folded"]
+    assert "idle_wait" in result["folded"]
+    assert "late_wait" in result["folded"]
+    capture = result["capture"]
+    assert capture["samples"] > 0
+    assert any("busy_spin" in stack for stack in capture["stacks"])
+    assert result["body_error"]
@@ -0,0 +1,48 @@
+"""_round_payouts mirrors Predict402.resolveRound (contracts/src): stake back + share of 96% of the losing pool."""
+
+ETH = 10 ** 18
+
+
+def _rinfo(bets, up_won):
+    up = [b for b in bets if b[1]]
+    down = [b for b in bets if not b[1]]
+    up_pool, down_pool = sum(b[2] for b in up), sum(b[2] for b in down)
+    return (0, 300, 100_00, 101_00, up_pool, down_pool, up_pool + down_pool,
+            sum(b[3] for b in up), sum(b[3] for b in down), len(bets), True, up_won, "")
+
+
+def _bet(player, is_up, amount, shares=None, from_vault=True):
+    return (player, is_up, amount, amount if shares is None else shares, "", False, from_vault)
+
+
+def test_winners_split_loser_pool_net_of_fee(agent):
+    # Same stake, but A bet earlier (more time-weighted shares)
+    bets = [_bet("0xA", True, ETH, shares=3 * ETH), _bet("0xB", True, ETH, shares=ETH),
+            _bet("0xC", False, 2 * ETH)]
+    results = agent._round_payouts(_rinfo(bets, up_won=True), bets)
+    profit_pool = 2 * ETH * 96 // 100
+    assert results["0xa"] == [1, 0, ETH, ETH + profit_pool * 3 // 4]
+    assert results["0xb"] == [1, 0, ETH, ETH + profit_pool // 4]
+    assert results["0xc"] == [0, 1, 2 * ETH, 0]
+
+
+def test_one_sided_round_returns_stakes(agent):
+    bets = [_bet("0xA", True, ETH), _bet("0xB", True, 2 * ETH)]
+    results = agent._round_payouts(_rinfo(bets, up_won=True), bets)
+    assert results["0xa"] == [1, 0, ETH, ETH]
+    assert results["0xb"] == [1, 0, 2 * ETH, 2 * ETH]
+
+
+def test_no_winner_pays_nobody(agent):
+    # Everyone on the losing side: the contract keeps the pool as fees, no refund
+    bets = [_bet("0xA", True, ETH), _bet("0xB", True, ETH)]
+    results = agent._round_payouts(_rinfo(bets, up_won=False), bets)
+    assert results == {"0xa": [0, 1, ETH, 0], "0xb": [0, 1, ETH, 0]}
+
+
+def test_only_vault_bets_count(agent):
+    bets = [_bet("0xA", True, ETH), _bet("0xA", False, ETH, from_vault=False), _bet("0xB", False, ETH)]
+    results = agent._round_payouts(_rinfo(bets, up_won=True), bets)
+    profit_pool = 2 * ETH * 96 // 100
+    assert results["0xa"] == [1, 0, ETH, ETH + profit_pool]
+    assert results["0xb"] == [0, 1, ETH, 0]
@@ -13,6 +13,10 @@ module.exports = {
         },
     },
     networks: {
+        hardhat: {
+            // backend/backend/bench_rounds.py batches up to 5000 bets into one tx
+            blockGasLimit: Number(process.env.HARDHAT_BLOCK_GAS_LIMIT || 30_000_000),
+        },
         opengradient: {
             url: process.env.API_URL || "https://ogevmdevnet.opengradient.ai",
             chainId: Number(process.env.CHAIN_ID || 10740),
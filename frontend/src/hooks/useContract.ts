@@ -3,6 +3,7 @@ import { parseEther } from 'viem';
 import { useState, useCallback, useEffect } from 'react';
 import { PREDICT402_ABI, ROUND_DURATION } from '../config/contracts';
 import { PREDICT402_ADDRESS } from '../config/contracts';
+import { ORACLE_API } from '../context/DepositContext';
 
 const IS_DEMO = false;
 
@@ -145,14 +146,53 @@ export function useCurrentRoundBets() {
     return { bets: [] as any[], isLoading: false, refetch: () => { } };
 }
 
+// Served by the agent from its materialized ranking (no RPC per viewer).
+// Entries keep the on-chain PlayerStats shape the leaderboard page expects.
+// Until the agent's index covers the contract from its deployment block
+// (`complete: false`), or when the agent is unreachable, read getLeaderboard() on-chain.
 export function useLeaderboard() {
-    const { data, isLoading } = useReadContract({
+    const [leaderboard, setLeaderboard] = useState<any[]>([]);
+    const [isLoading, setIsLoading] = useState(true);
+    const [onChain, setOnChain] = useState(false);
+
+    const { data: chainData, isLoading: chainLoading } = useReadContract({
         address: PREDICT402_ADDRESS,
         abi: PREDICT402_ABI,
         functionName: 'getLeaderboard',
-        query: { enabled: !IS_DEMO, refetchInterval: 60_000 },
+        query: { enabled: !IS_DEMO && onChain, refetchInterval: 60_000 },
     });
-    return { leaderboard: (data as any[]) || [], isLoading };
+
+    useEffect(() => {
+        if (IS_DEMO) return;
+        let cancelled = false;
+        const load = async () => {
+            try {
+                const res = await fetch(`${ORACLE_API}/api/leaderboard?top=100`);
+                if (!res.ok) throw new Error(`leaderboard ${res.status}`);
+                const data = await res.json();
+                if (cancelled) return;
+                setOnChain(!data.complete);
+                setLeaderboard(data.entries.map((e: any) => ({
+                    player: e.player,
+                    nickname: e.nickname,
+                    totalWins: BigInt(e.total_wins),
+                    totalBets: BigInt(e.total_bets),
+                    totalEarnings: BigInt(e.total_earnings_wei),
+                    winRate: BigInt(e.win_rate),
+                })));
+            } catch {
+                if (!cancelled) setOnChain(true);
+            } finally {
+                if (!cancelled) setIsLoading(false);
+            }
+        };
+        load();
+        const interval = setInterval(load, 60_000);
+        return () => { cancelled = true; clearInterval(interval); };
+    }, []);
+
+    if (onChain) return { leaderboard: (chainData as any[]) || [], isLoading: chainLoading };
+    return { leaderboard, isLoading };
 }
 
 export function useRegisterNickname() {